@@ -0,0 +1,151 @@
+"""
+Microbenchmark: request-thread cost of logging in the comment analysis hot path.
+
+Runs SentimentChecker._analyze against in-process stubs (no network) with
+logging configured three ways and reports per-comment time on the calling
+thread:
+
+    off     root logger at CRITICAL, nothing is formatted or written
+    sync    the old setup: stdout and rotating-file handlers on the request thread
+    queue   config.logging_config's QueueHandler/QueueListener pipeline
+
+Usage:
+    python backend/benchmarks/bench_logging.py [--comments 2000] [--level DEBUG] [--sample-rate 1.0] [--repeat 3]
+"""
+import argparse
+import logging
+import os
+import queue
+import sys
+import tempfile
+import time
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from api.views import SentimentChecker
+from config.logging_config import COMMENT_LOGGER_NAME, LOG_FORMAT, SamplingFilter
+from models import TicketInput, CommentInput, emotions
+
+EMOTION_NAMES = [name for name in emotions if name != 'example_very_unclear']
+
+
+class _StubPineconeService:
+    namespace = 'bench'
+    emotions_namespace = 'emotions'
+
+    def fetch_vector(self, vector_id, namespace=None):
+        raise KeyError(vector_id)
+
+    def get_embedding(self, text):
+        return [0.01] * 16
+
+    def get_chunked_embedding(self, text):
+        return [0.01] * 16, 1
+
+    def query_vectors(self, vector, top_k=10, namespace=None, include_metadata=False, include_values=False):
+        return [
+            {'score': 0.5, 'metadata': {'text': 'example', EMOTION_NAMES[i % len(EMOTION_NAMES)]: True}}
+            for i in range(top_k)
+        ]
+
+    def upsert_vector(self, id, vector, metadata):
+        return {'upserted_count': 1}
+
+
+def _make_checker():
+    checker = SentimentChecker()
+    checker.pinecone_service = _StubPineconeService()
+    checker.remote_addr = '127.0.0.1'
+    checker.subdomain = 'bench'
+    checker.redis = None
+    return checker
+
+
+def _reset_logging():
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    for name in ('sentiment_checker', COMMENT_LOGGER_NAME, 'sentiment-checker'):
+        logger = logging.getLogger(name)
+        logger.filters.clear()
+        logger.setLevel(logging.NOTSET)
+
+
+def _sink_handlers(tmp_dir, level):
+    stream = logging.StreamHandler(open(os.path.join(tmp_dir, 'stdout.log'), 'a'))
+    stream.setFormatter(logging.Formatter(LOG_FORMAT))
+    file_handler = TimedRotatingFileHandler(os.path.join(tmp_dir, 'app.log'), when='midnight', backupCount=1)
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    for handler in (stream, file_handler):
+        handler.setLevel(level)
+    return [stream, file_handler]
+
+
+def _configure(mode, tmp_dir, level, sample_rate):
+    _reset_logging()
+    root = logging.getLogger()
+    listener = None
+    if mode == 'off':
+        root.setLevel(logging.CRITICAL)
+        return None
+    root.setLevel(level)
+    handlers = _sink_handlers(tmp_dir, level)
+    if mode == 'sync':
+        for handler in handlers:
+            root.addHandler(handler)
+    else:
+        queue_handler = QueueHandler(queue.SimpleQueue())
+        root.addHandler(queue_handler)
+        logging.getLogger(COMMENT_LOGGER_NAME).addFilter(SamplingFilter(sample_rate))
+        listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+        listener.start()
+    return listener
+
+
+def _run(checker, ticket, comments):
+    start = time.perf_counter()
+    for comment in comments:
+        checker._analyze(ticket, comment)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--comments', type=int, default=2000)
+    parser.add_argument('--level', default='DEBUG')
+    parser.add_argument('--sample-rate', type=float, default=1.0)
+    parser.add_argument('--repeat', type=int, default=3, help='report the best of N runs per mode')
+    args = parser.parse_args()
+
+    ticket = TicketInput(id='1')
+    comments = [
+        CommentInput(id=str(i), body=f'<p>Comment number {i} with <b>some</b> html</p>', created_at=1700000000 + i, author_id=1)
+        for i in range(args.comments)
+    ]
+    checker = _make_checker()
+    _run(checker, ticket, comments[:100])  # warm up
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for mode in ('off', 'sync', 'queue'):
+            timings = []
+            for _ in range(args.repeat):
+                listener = _configure(mode, tmp_dir, args.level, args.sample_rate)
+                timings.append(_run(checker, ticket, comments))
+                if listener:
+                    listener.stop()
+            results[mode] = min(timings)
+        _reset_logging()
+
+    baseline = results['off']
+    print(f"{'mode':<8}{'total (s)':>12}{'per comment (us)':>20}{'overhead vs off':>18}")
+    for mode, elapsed in results.items():
+        per_comment = elapsed / len(comments) * 1e6
+        overhead = (elapsed - baseline) / len(comments) * 1e6
+        print(f"{mode:<8}{elapsed:>12.3f}{per_comment:>20.1f}{overhead:>16.1f}us")
+
+
+if __name__ == '__main__':
+    main()
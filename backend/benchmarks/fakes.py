@@ -0,0 +1,360 @@
+"""
+Deterministic in-process stand-ins for OpenAI, Pinecone and Redis.
+
+Nothing here touches the network. Embeddings are seeded from a hash of the
+input text, so the same text always maps to the same unit vector, and the
+in-memory index implements the subset of the Pinecone data-plane API that
+PineconeService uses. Every fake operation can be given an artificial
+latency to model network round trips, a provider quota past which it
+fails with a 429 like the real services, and a simulated provider outage.
+"""
+import hashlib
+import threading
+import time
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from models import emotions
+from services.embedding_service import EmbeddingBackend, LocalEmbeddingBackend, OpenAIEmbeddingBackend
+from services.pinecone_service import PineconeService
+from services.rate_limiter import GuardedIndex
+from services.tenant_router import PINECONE_INDEX_NAME, tenant_index
+
+DIMENSION = 1536
+
+# Operations that accept injected latency, in seconds
+DEFAULT_LATENCY = {
+    'embedding': 0.0,
+    'upsert': 0.0,
+    'query': 0.0,
+    'fetch': 0.0,
+    'list': 0.0,
+    'describe': 0.0,
+}
+
+
+class Record(dict):
+    """Dict that also allows attribute access, like the Pinecone response models"""
+
+    def __getattribute__(self, name):
+        # A vector's `.values` is its data, not dict.values
+        if name == 'values' and dict.__contains__(self, 'values'):
+            return dict.__getitem__(self, 'values')
+        return dict.__getattribute__(self, name)
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class ThrottledError(Exception):
+    """Raised by the fakes past their provider quota; carries a status_code like the SDK errors"""
+    status_code = 429
+
+
+class UnavailableError(Exception):
+    """Raised by the fakes while their provider is in a simulated outage"""
+    status_code = 503
+
+
+class ProviderQuota:
+    """A provider-side limit of `per_second` calls in each one-second window"""
+
+    def __init__(self, per_second: float):
+        self.per_second = per_second
+        self.rejected = 0
+        self._window = None
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def check(self, operation: str) -> None:
+        with self._lock:
+            window = int(time.monotonic())
+            if window != self._window:
+                self._window, self._count = window, 0
+            self._count += 1
+            if self._count > self.per_second:
+                self.rejected += 1
+                raise ThrottledError(f"Too Many Requests: {operation} over {self.per_second}/s")
+
+
+class LatencyProfile:
+    """Per-operation sleep applied by the fakes, plus optional provider quotas and outages"""
+
+    def __init__(self, **latency: float):
+        self.latency = dict(DEFAULT_LATENCY)
+        self.latency.update(latency)
+        self.quotas: Dict[str, ProviderQuota] = {}
+        # provider -> seconds each call hangs before failing
+        self.outages: Dict[str, float] = {}
+
+    def wait(self, operation: str) -> None:
+        provider = 'openai' if operation == 'embedding' else 'pinecone'
+        if provider in self.outages:
+            time.sleep(self.outages[provider])
+            raise UnavailableError(f"Service Unavailable: {operation}")
+        quota = self.quotas.get(provider)
+        if quota:
+            quota.check(operation)
+        delay = self.latency.get(operation, 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def set_quotas(self, spec: Optional[str]) -> 'LatencyProfile':
+        """Throttle the fakes from 'openai=calls_per_second,pinecone=calls_per_second'"""
+        for item in filter(None, (spec or '').split(',')):
+            provider, _, per_second = item.partition('=')
+            self.quotas[provider.strip()] = ProviderQuota(float(per_second))
+        return self
+
+    @classmethod
+    def parse(cls, spec: Optional[str]) -> 'LatencyProfile':
+        """Build a profile from 'op=seconds,op=seconds'"""
+        latency = {}
+        for item in filter(None, (spec or '').split(',')):
+            operation, _, seconds = item.partition('=')
+            latency[operation.strip()] = float(seconds)
+        return cls(**latency)
+
+
+def seeded_vector(text: str, dimension: int = DIMENSION) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+    vector = np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class FakeEmbeddingClient:
+    """Mimics openai.OpenAI().embeddings.create with seeded vectors"""
+
+    def __init__(self, latency: Optional[LatencyProfile] = None, dimension: int = DIMENSION):
+        self.latency = latency or LatencyProfile()
+        self.dimension = dimension
+        self.embeddings = self
+        self.calls = 0
+
+    def create(self, model: str, input, dimensions: Optional[int] = None, **kwargs):
+        self.latency.wait('embedding')
+        self.calls += 1
+        texts = [input] if isinstance(input, str) else list(input)
+        size = dimensions or self.dimension
+        data = [SimpleNamespace(index=i, embedding=seeded_vector(text, size).tolist()) for i, text in enumerate(texts)]
+        usage = SimpleNamespace(prompt_tokens=sum(len(text.split()) for text in texts))
+        return SimpleNamespace(data=data, model=model, usage=usage)
+
+
+class InMemoryIndex:
+    """Thread-safe in-memory implementation of the Pinecone index calls PineconeService makes"""
+
+    def __init__(self, name: str = 'benchmark', dimension: int = DIMENSION, latency: Optional[LatencyProfile] = None):
+        self.name = name
+        self.dimension = dimension
+        self.latency = latency or LatencyProfile()
+        self._lock = threading.RLock()
+        self._namespaces: Dict[str, Dict[str, Record]] = {}
+
+    def _namespace(self, namespace: Optional[str]) -> Dict[str, Record]:
+        return self._namespaces.setdefault(namespace or '', {})
+
+    def upsert(self, vectors: Iterable, namespace: Optional[str] = None, **kwargs):
+        self.latency.wait('upsert')
+        count = 0
+        with self._lock:
+            store = self._namespace(namespace)
+            for vector in vectors:
+                if isinstance(vector, dict):
+                    vector_id, values, metadata = vector['id'], vector['values'], vector.get('metadata')
+                else:
+                    vector_id, values, metadata = vector[0], vector[1], (vector[2] if len(vector) > 2 else None)
+                store[vector_id] = Record(id=vector_id, values=list(values), metadata=dict(metadata or {}))
+                count += 1
+        return Record(upserted_count=count)
+
+    def update(self, id: str, values=None, set_metadata=None, namespace: Optional[str] = None, **kwargs):
+        self.latency.wait('upsert')
+        with self._lock:
+            record = self._namespace(namespace).get(id)
+            if record is not None:
+                if values is not None:
+                    record['values'] = list(values)
+                if set_metadata:
+                    record['metadata'].update(set_metadata)
+        return Record()
+
+    def delete(self, ids: Optional[List[str]] = None, delete_all: bool = False, namespace: Optional[str] = None, **kwargs):
+        with self._lock:
+            store = self._namespace(namespace)
+            if delete_all:
+                store.clear()
+            for vector_id in ids or []:
+                store.pop(vector_id, None)
+        return Record()
+
+    def query(self, vector, top_k: int = 10, namespace: Optional[str] = None, filter=None,
+              include_metadata: bool = False, include_values: bool = False, **kwargs):
+        self.latency.wait('query')
+        with self._lock:
+            records = list(self._namespace(namespace).values())
+        if filter:
+            records = [r for r in records if _matches_filter(r['metadata'], filter)]
+        if not records:
+            return Record(matches=[], namespace=namespace)
+        matrix = np.asarray([r['values'] for r in records], dtype=np.float32)
+        query = np.asarray(vector, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+        scores = matrix @ query / np.where(norms == 0, 1.0, norms)
+        order = np.argsort(-scores)[:top_k]
+        matches = [
+            Record(
+                id=records[i]['id'],
+                score=float(scores[i]),
+                values=records[i]['values'] if include_values else [],
+                metadata=records[i]['metadata'] if include_metadata else None
+            )
+            for i in order
+        ]
+        return Record(matches=matches, namespace=namespace)
+
+    def fetch(self, ids: List[str], namespace: Optional[str] = None, **kwargs):
+        self.latency.wait('fetch')
+        with self._lock:
+            store = self._namespace(namespace)
+            vectors = {i: Record(store[i]) for i in ids if i in store}
+        return Record(vectors=vectors, namespace=namespace)
+
+    def list_paginated(self, prefix: Optional[str] = None, limit: Optional[int] = None,
+                       pagination_token: Optional[str] = None, namespace: Optional[str] = None, **kwargs):
+        self.latency.wait('list')
+        limit = limit or 100
+        with self._lock:
+            ids = sorted(i for i in self._namespace(namespace) if i.startswith(prefix or ''))
+        start = int(pagination_token) if pagination_token else 0
+        page = ids[start:start + limit]
+        pagination = Record(next=str(start + limit)) if start + limit < len(ids) else None
+        return Record(vectors=[Record(id=i) for i in page], pagination=pagination, namespace=namespace)
+
+    def describe_index_stats(self, **kwargs):
+        self.latency.wait('describe')
+        with self._lock:
+            namespaces = {ns: {'vector_count': len(store)} for ns, store in self._namespaces.items()}
+        return Record(
+            dimension=self.dimension,
+            namespaces=namespaces,
+            total_vector_count=sum(n['vector_count'] for n in namespaces.values())
+        )
+
+    def vector_count(self, namespace: str) -> int:
+        with self._lock:
+            return len(self._namespace(namespace))
+
+
+def _matches_filter(metadata: dict, condition: dict) -> bool:
+    for key, expected in condition.items():
+        value = metadata.get(key)
+        if isinstance(expected, dict):
+            for op, operand in expected.items():
+                if op == '$eq' and value != operand:
+                    return False
+                if op == '$gte' and (value is None or value < operand):
+                    return False
+                if op == '$lte' and (value is None or value > operand):
+                    return False
+                if op == '$in' and value not in operand:
+                    return False
+        elif value != expected:
+            return False
+    return True
+
+
+class FakePineconeClient:
+    """Stand-in for PineconeGRPC: hands out the shared in-memory index"""
+
+    def __init__(self, index: InMemoryIndex):
+        self.index = index
+
+    def Index(self, name: str = None, **kwargs):
+        return self.index
+
+    def describe_index(self, name: str):
+        self.index.latency.wait('describe')
+        return Record(name=name, dimension=self.index.dimension, status=Record(ready=True, state='Ready'))
+
+
+class InMemoryPineconeService(PineconeService):
+    """
+    The real PineconeService backed by an in-memory index and an embedding backend,
+    by default OpenAI's backend wrapped around a fake client.
+
+    Call InMemoryPineconeService.install(index, embedding_client) once; after that the
+    class can be constructed with just a subdomain, exactly like PineconeService.
+    Tenants routed to another index get the one registered under its name in `indexes`,
+    or the shared index when there is none.
+    """
+    shared_index: Optional[InMemoryIndex] = None
+    shared_embedder: Optional[EmbeddingBackend] = None
+    indexes: Dict[str, InMemoryIndex] = {}
+
+    def __init__(self, subdomain=None, index_name=None):
+        self.index_name = index_name or (tenant_index(subdomain) if subdomain else PINECONE_INDEX_NAME)
+        index = self.indexes.get(self.index_name, self.shared_index)
+        self.pc = FakePineconeClient(index)
+        self.index = GuardedIndex(index)
+        self.emotions_index = GuardedIndex(self.shared_index)
+        self.embedder = self.shared_embedder
+        self.subdomain = subdomain
+        self.namespace = self.embedder.namespace(subdomain)
+
+    @classmethod
+    def install(cls, index: InMemoryIndex, embedding_client: FakeEmbeddingClient,
+                embedder: Optional[EmbeddingBackend] = None) -> None:
+        cls.shared_index = index
+        cls.shared_embedder = embedder or OpenAIEmbeddingBackend(client=embedding_client)
+
+    @classmethod
+    def warm(cls):
+        cls.shared_index.describe_index_stats()
+
+
+EMOTION_EXAMPLES_PER_EMOTION = 4
+
+
+def seed_emotions(index: InMemoryIndex, examples_per_emotion: int = EMOTION_EXAMPLES_PER_EMOTION,
+                  embedder: Optional[EmbeddingBackend] = None) -> int:
+    """
+    Fill the emotions namespace with reference vectors, one flag per example. Without an
+    embedder the vectors are seeded from the text, matching FakeEmbeddingClient.
+    """
+    texts = {f"{name}-{i}": (name, f"{name} example {i}") for name in emotions for i in range(examples_per_emotion)}
+    if embedder:
+        values = embedder.embed([text for _, text in texts.values()])
+        namespace = embedder.namespace('emotions')
+    else:
+        values = [seeded_vector(text, index.dimension).tolist() for _, text in texts.values()]
+        namespace = 'emotions'
+    vectors = [
+        {'id': id, 'values': vector, 'metadata': {'text': text, name: True}}
+        for (id, (name, text)), vector in zip(texts.items(), values)
+    ]
+    index.upsert(vectors=vectors, namespace=namespace)
+    return len(vectors)
+
+
+def write_static_model(path: str, vocabulary: Iterable[str], dimension: int = 256) -> str:
+    """Write a seeded .npz model in the format LocalEmbeddingBackend loads"""
+    vocab = ['[UNK]'] + sorted(set(vocabulary))
+    matrix = np.stack([seeded_vector(token, dimension) for token in vocab])
+    np.savez(path, vocab=np.array(vocab), embeddings=matrix)
+    return path
+
+
+def local_embedder(path: str, vocabulary: Iterable[str], dimension: int = 256) -> LocalEmbeddingBackend:
+    return LocalEmbeddingBackend(write_static_model(path, vocabulary, dimension))
+
+
+def fake_redis():
+    """A decode_responses=True fakeredis client, matching RedisClient's settings"""
+    import fakeredis
+    return fakeredis.FakeRedis(decode_responses=True)
@@ -0,0 +1,148 @@
+"""
+Shared setup for the offline benchmarks: builds the real Flask app wired to
+the fakes in fakes.py and bootstraps authenticated sessions with locally
+signed JWTs.
+"""
+import os
+import sys
+import random
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, os.path.abspath(SRC_DIR))
+
+# Deterministic local settings; must be in place before the app modules are imported
+JWT_SECRET = 'benchmark-secret'
+JWT_AUDIENCE = 'benchmark-audience'
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+os.environ['ZENDESK_APP_PUBLIC_KEY'] = JWT_SECRET
+os.environ['ZENDESK_APP_AUD'] = JWT_AUDIENCE
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('FILE_LOG_LEVEL', 'WARNING')
+# The fakes have no quota unless --quota is given; set these lower to exercise the limiter against it
+os.environ.setdefault('OPENAI_EMBEDDING_RPM', '1000000')
+os.environ.setdefault('OPENAI_EMBEDDING_TPM', '1000000000')
+os.environ.setdefault('PINECONE_OPS_PER_SECOND', '1000000')
+
+import jwt
+
+from fakes import (
+    FakeEmbeddingClient, InMemoryIndex, InMemoryPineconeService, LatencyProfile, fake_redis, local_embedder,
+    seed_emotions
+)
+
+BASE_TIMESTAMP = 1_700_000_000
+WORDS = ('thanks', 'issue', 'still', 'broken', 'great', 'help', 'refund', 'waiting', 'please', 'update',
+         'love', 'terrible', 'quickly', 'order', 'account', 'happy', 'angry', 'confused', 'resolved', 'again')
+
+
+class BenchmarkEnvironment:
+    """The app plus handles to the in-memory services behind it"""
+
+    def __init__(self, latency: Optional[LatencyProfile] = None, embedding_backend: str = 'openai'):
+        from config.redis_config import RedisClient
+        import services.auth_service as auth_service
+        import api.views as views
+        import services.health_prober as health_prober
+
+        # Flask-Session's filesystem store writes relative to the working directory
+        self._session_dir = tempfile.TemporaryDirectory(prefix='sentiment-bench-')
+        self._cwd = os.getcwd()
+        os.chdir(self._session_dir.name)
+
+        self.latency = latency or LatencyProfile()
+        self.embedding_client = FakeEmbeddingClient(latency=self.latency)
+        self.redis = fake_redis()
+        if embedding_backend == 'local':
+            # The model's embedding stands in for a network call, so it takes no injected latency
+            embedder = local_embedder(os.path.join(self._session_dir.name, 'static-model.npz'), WORDS)
+            self.index = InMemoryIndex(dimension=embedder.dimension, latency=self.latency)
+            seed_emotions(self.index, embedder=embedder)
+        else:
+            embedder = None
+            self.index = InMemoryIndex(latency=self.latency)
+            seed_emotions(self.index)
+
+        InMemoryPineconeService.install(self.index, self.embedding_client, embedder)
+        auth_service.PineconeService = InMemoryPineconeService
+        views.PineconeService = InMemoryPineconeService
+        health_prober.PineconeService = InMemoryPineconeService
+        RedisClient._instance = self.redis
+
+        from api.server import create_app
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+
+    def client(self, tenant: str):
+        """
+        A test client holding an authenticated session for the tenant, bootstrapped
+        the way Zendesk loads the app iframe: a form POST carrying a signed JWT.
+        """
+        client = self.app.test_client()
+        response = client.post(
+            f'/sentiment-checker/background-refresh?subdomain={tenant}',
+            data={'token': make_token(tenant)}
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"Session bootstrap failed for {tenant}: {response.status_code} {response.data!r}")
+        return client
+
+    def close(self):
+        os.chdir(self._cwd)
+        self._session_dir.cleanup()
+
+
+def make_token(tenant: str, ttl: int = 3600) -> str:
+    now = int(time.time())
+    return jwt.encode({'aud': JWT_AUDIENCE, 'iat': now, 'exp': now + ttl, 'sub': tenant}, JWT_SECRET, algorithm='HS256')
+
+
+def iso_timestamp(timestamp: int) -> str:
+    """Zendesk-style UTC timestamp, as the frontend sends them"""
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def comment_html(rng: random.Random, size: int) -> str:
+    """Roughly `size` bytes of comment HTML"""
+    parts = []
+    length = 0
+    while length < size:
+        sentence = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(6, 14)))
+        parts.append(f"<p>{sentence}.</p>")
+        length += len(sentence) + 8
+    return ''.join(parts)
+
+
+def ticket_payload(ticket_id: str, comment_count: int, body_size: int = 400, rng: Optional[random.Random] = None,
+                   status: str = 'open', with_comments: bool = True) -> Dict:
+    rng = rng or random.Random(ticket_id)
+    ticket = {
+        'id': ticket_id,
+        'status': status,
+        'created_at': iso_timestamp(BASE_TIMESTAMP),
+        'updated_at': iso_timestamp(BASE_TIMESTAMP + comment_count * 3600),
+        'requestor': {'id': rng.randint(1, 500)},
+        'assignee': {'id': rng.randint(1, 50)},
+    }
+    if with_comments:
+        ticket['comments'] = [
+            {
+                'id': f"{ticket_id}{i:04d}",
+                'body': comment_html(rng, body_size),
+                'created_at': iso_timestamp(BASE_TIMESTAMP + i * 3600),
+                'author_id': rng.randint(1, 500),
+            }
+            for i in range(comment_count)
+        ]
+    return ticket
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[rank]
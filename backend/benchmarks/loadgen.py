@@ -0,0 +1,328 @@
+"""
+Traffic-replay load generator modeled on the Zendesk frontend.
+
+Synthesizes the request mix the React apps produce, for N tenants with M
+agents each, and runs it against the real Flask app with in-process fakes
+for OpenAI, Pinecone and Redis (see fakes.py). Every agent:
+
+- bootstraps a session the way the app iframe does (form POST with a signed JWT)
+- runs BackgroundApp: check-namespace at load, then a refresh every 45 minutes
+  that posts analyze-comments for each unsolved ticket, one at a time
+- opens tickets in the sidebar: analyze-comments for the ticket (sometimes
+  with a new comment), then get-score over the requester's recent tickets
+- sweeps the NavBar: pages through get-unsolved-tickets
+
+Simulated time runs --time-scale times faster than wall time so a 45 minute
+refresh cycle fits in a short run. Generated traffic can be written with
+--record and replayed later (optionally sped up) with --replay.
+
+Usage:
+    python backend/benchmarks/loadgen.py --tenants 5 --agents 10 --duration 60 --workers 8
+    python backend/benchmarks/loadgen.py --duration 30 --record traffic.jsonl
+    python backend/benchmarks/loadgen.py --replay traffic.jsonl --speed 2
+"""
+import argparse
+import heapq
+import itertools
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from harness import BenchmarkEnvironment, LatencyProfile, percentile, ticket_payload, comment_html, iso_timestamp, BASE_TIMESTAMP
+
+ROUTE_PREFIX = '/sentiment-checker'
+BACKGROUND_REFRESH_INTERVAL = 45 * 60  # seconds, as in BackgroundApp.tsx
+
+# One request: (method, path, json body)
+Request = Tuple[str, str, Optional[dict]]
+
+
+class Tenant:
+    """A Zendesk account: its tickets and the agents working them"""
+
+    def __init__(self, name: str, ticket_count: int, comment_range: Tuple[int, int], body_size: int, rng: random.Random):
+        self.name = name
+        self.body_size = body_size
+        self.rng = rng
+        self.lock = threading.Lock()
+        self.tickets: Dict[str, dict] = {}
+        for i in range(ticket_count):
+            ticket_id = str(10000 + i)
+            ticket = ticket_payload(ticket_id, rng.randint(*comment_range), body_size, random.Random(f"{name}:{ticket_id}"))
+            self.tickets[ticket_id] = ticket
+
+    def ticket_snapshot(self, ticket_id: str, add_comment: bool = False) -> dict:
+        with self.lock:
+            ticket = self.tickets[ticket_id]
+            if add_comment:
+                index = len(ticket['comments'])
+                ticket['comments'].append({
+                    'id': f"{ticket_id}{index:04d}",
+                    'body': comment_html(self.rng, self.body_size),
+                    'created_at': iso_timestamp(BASE_TIMESTAMP + index * 3600),
+                    'author_id': self.rng.randint(1, 500),
+                })
+            return json.loads(json.dumps(ticket))
+
+    def unsolved_ids(self) -> List[str]:
+        return [ticket_id for ticket_id, ticket in self.tickets.items() if ticket['status'] != 'solved']
+
+
+class Agent:
+    """One agent's browser: a session plus the three apps' request loops"""
+
+    def __init__(self, tenant: Tenant, agent_id: int, args, rng: random.Random):
+        self.tenant = tenant
+        self.agent_id = agent_id
+        self.args = args
+        self.rng = rng
+        self.client = None
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {'X-Zendesk-Subdomain': self.tenant.name}
+
+    def background_load(self) -> Iterator[Request]:
+        yield 'POST', f"{ROUTE_PREFIX}/check-namespace", {'subdomain': self.tenant.name}
+        yield 'GET', f"{ROUTE_PREFIX}/get-ticket-count", None
+
+    def background_refresh(self) -> Iterator[Request]:
+        for ticket_id in self.tenant.unsolved_ids():
+            ticket = self.tenant.ticket_snapshot(ticket_id)
+            yield 'POST', f"{ROUTE_PREFIX}/analyze-comments", {'tickets': [ticket]}
+
+    def sidebar_view(self) -> Iterator[Request]:
+        ticket_id = self.rng.choice(list(self.tenant.tickets))
+        ticket = self.tenant.ticket_snapshot(ticket_id, add_comment=self.rng.random() < self.args.new_comment_rate)
+        yield 'POST', f"{ROUTE_PREFIX}/analyze-comments", {'tickets': [ticket]}
+        recent = self.rng.sample(list(self.tenant.tickets), min(5, len(self.tenant.tickets)))
+        summaries = [{k: v for k, v in self.tenant.tickets[t].items() if k != 'comments'} for t in recent]
+        yield 'POST', f"{ROUTE_PREFIX}/get-score", {'tickets': summaries}
+
+    def navbar_sweep(self) -> Iterator[Request]:
+        per_page = 25
+        pages = max(1, -(-len(self.tenant.unsolved_ids()) // per_page))
+        for page in range(1, pages + 1):
+            yield 'POST', f"{ROUTE_PREFIX}/get-unsolved-tickets?page={page}&per_page={per_page}", {}
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, route: str, elapsed: float, ok: bool):
+        with self.lock:
+            self.latencies[route].append(elapsed)
+            if not ok:
+                self.errors[route] += 1
+
+    def report(self, wall_seconds: float):
+        print(f"{'route':<32}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+        total = 0
+        for route in sorted(self.latencies):
+            samples = self.latencies[route]
+            total += len(samples)
+            print(f"{route:<32}{len(samples):>10}{len(samples) / wall_seconds:>10.1f}"
+                  f"{percentile(samples, 50) * 1000:>10.2f}{percentile(samples, 95) * 1000:>10.2f}"
+                  f"{percentile(samples, 99) * 1000:>10.2f}{self.errors[route]:>8}")
+        print(f"{'total':<32}{total:>10}{total / wall_seconds:>10.1f}")
+
+
+def _route_name(path: str) -> str:
+    return path.split('?')[0][len(ROUTE_PREFIX):] or '/'
+
+
+class LoadGenerator:
+    """
+    Event-driven scheduler: each agent activity is a request generator whose
+    next request is due as soon as the previous one finishes; new activities
+    are scheduled on simulated-time intervals. Worker threads execute due
+    requests concurrently.
+    """
+
+    def __init__(self, env: BenchmarkEnvironment, agents: List[Agent], args, recorder=None):
+        self.env = env
+        self.agents = agents
+        self.args = args
+        self.recorder = recorder
+        self.stats = Stats()
+        self.queue = []
+        self.counter = itertools.count()
+        self.cond = threading.Condition()
+        self.start = None
+        self.stop_at = None
+
+    def _real(self, simulated_seconds: float) -> float:
+        return simulated_seconds / self.args.time_scale
+
+    def schedule(self, due: float, agent: Agent, activity: str, requests: Optional[Iterator[Request]] = None):
+        with self.cond:
+            heapq.heappush(self.queue, (due, next(self.counter), agent, activity, requests))
+            self.cond.notify()
+
+    def _next_occurrence(self, agent: Agent, activity: str, now: float):
+        if activity == 'background_refresh':
+            self.schedule(now + self._real(BACKGROUND_REFRESH_INTERVAL), agent, activity)
+        elif activity == 'sidebar_view':
+            self.schedule(now + self._real(agent.rng.expovariate(1 / self.args.sidebar_interval)), agent, activity)
+        elif activity == 'navbar_sweep':
+            self.schedule(now + self._real(agent.rng.expovariate(1 / self.args.navbar_interval)), agent, activity)
+
+    def _worker(self):
+        while True:
+            with self.cond:
+                while True:
+                    now = time.perf_counter()
+                    if now >= self.stop_at:
+                        return
+                    if self.queue and self.queue[0][0] <= now:
+                        due, _, agent, activity, requests = heapq.heappop(self.queue)
+                        break
+                    timeout = (self.queue[0][0] - now) if self.queue else (self.stop_at - now)
+                    self.cond.wait(min(timeout, self.stop_at - now))
+
+            if requests is None:
+                requests = getattr(agent, activity)()
+                self._next_occurrence(agent, activity, time.perf_counter())
+            request = next(requests, None)
+            if request is None:
+                continue
+            self.execute(agent, request)
+            self.schedule(time.perf_counter(), agent, activity, requests)
+
+    def execute(self, agent: Agent, request: Request):
+        method, path, body = request
+        if self.recorder:
+            self.recorder.write(json.dumps({
+                'offset': time.perf_counter() - self.start,
+                'tenant': agent.tenant.name,
+                'agent': agent.agent_id,
+                'method': method,
+                'path': path,
+                'body': body,
+            }) + '\n')
+        t0 = time.perf_counter()
+        if method == 'GET':
+            response = agent.client.get(path, headers=agent.headers)
+        else:
+            response = agent.client.post(path, json=body, headers=agent.headers)
+        self.stats.record(_route_name(path), time.perf_counter() - t0, response.status_code == 200)
+
+    def run(self) -> float:
+        self.start = time.perf_counter()
+        self.stop_at = self.start + self.args.duration
+        for agent in self.agents:
+            # Agents log in spread over --login-spread seconds, like a shift starting
+            login = self.start + agent.rng.uniform(0, self.args.login_spread)
+            self.schedule(login, agent, 'background_load')
+            self.schedule(login + self._real(agent.rng.uniform(0, BACKGROUND_REFRESH_INTERVAL)), agent, 'background_refresh')
+            self.schedule(login + self._real(agent.rng.expovariate(1 / self.args.sidebar_interval)), agent, 'sidebar_view')
+            self.schedule(login + self._real(agent.rng.expovariate(1 / self.args.navbar_interval)), agent, 'navbar_sweep')
+        workers = [threading.Thread(target=self._worker, daemon=True) for _ in range(self.args.workers)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return time.perf_counter() - self.start
+
+
+def replay(env: BenchmarkEnvironment, path: str, speed: float, workers: int) -> Tuple[Stats, float]:
+    """Re-issue recorded requests at their original offsets divided by speed"""
+    with open(path) as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    clients = {}
+    for entry in entries:
+        key = (entry['tenant'], entry['agent'])
+        if key not in clients:
+            clients[key] = env.client(entry['tenant'])
+
+    stats = Stats()
+    pending = iter(sorted(entries, key=lambda e: e['offset']))
+    lock = threading.Lock()
+    start = time.perf_counter()
+
+    def worker():
+        while True:
+            with lock:
+                entry = next(pending, None)
+            if entry is None:
+                return
+            delay = start + entry['offset'] / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            client = clients[(entry['tenant'], entry['agent'])]
+            headers = {'X-Zendesk-Subdomain': entry['tenant']}
+            t0 = time.perf_counter()
+            if entry['method'] == 'GET':
+                response = client.get(entry['path'], headers=headers)
+            else:
+                response = client.post(entry['path'], json=entry['body'], headers=headers)
+            stats.record(_route_name(entry['path']), time.perf_counter() - t0, response.status_code == 200)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats, time.perf_counter() - start
+
+
+def _range(value: str) -> Tuple[int, int]:
+    low, _, high = value.partition(',')
+    return int(low), int(high or low)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tenants', type=int, default=3)
+    parser.add_argument('--agents', type=int, default=5, help='agents per tenant')
+    parser.add_argument('--tickets', type=int, default=40, help='unsolved tickets per tenant')
+    parser.add_argument('--comments', type=_range, default=(2, 12), help='comments per ticket, "min,max"')
+    parser.add_argument('--body-size', type=int, default=600, help='approximate comment HTML size in bytes')
+    parser.add_argument('--duration', type=float, default=30.0, help='wall-clock seconds to run')
+    parser.add_argument('--time-scale', type=float, default=60.0, help='simulated seconds per wall second')
+    parser.add_argument('--sidebar-interval', type=float, default=120.0, help='mean simulated seconds between ticket views per agent')
+    parser.add_argument('--navbar-interval', type=float, default=600.0, help='mean simulated seconds between NavBar sweeps per agent')
+    parser.add_argument('--new-comment-rate', type=float, default=0.3, help='chance a ticket view sees a new comment')
+    parser.add_argument('--login-spread', type=float, default=2.0, help='wall seconds over which agents log in')
+    parser.add_argument('--workers', type=int, default=8, help='concurrent request threads (models server threads)')
+    parser.add_argument('--latency', default='', help="injected latency, e.g. 'embedding=0.05,query=0.01'")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--record', help='write the generated requests to this JSONL file')
+    parser.add_argument('--replay', help='replay a JSONL file written by --record instead of synthesizing')
+    parser.add_argument('--speed', type=float, default=1.0, help='replay speed multiplier')
+    args = parser.parse_args()
+
+    env = BenchmarkEnvironment(LatencyProfile.parse(args.latency))
+    try:
+        if args.replay:
+            stats, wall = replay(env, args.replay, args.speed, args.workers)
+        else:
+            rng = random.Random(args.seed)
+            agents = []
+            for t in range(args.tenants):
+                tenant = Tenant(f"tenant{t}", args.tickets, args.comments, args.body_size, random.Random(rng.random()))
+                for a in range(args.agents):
+                    agent = Agent(tenant, a, args, random.Random(rng.random()))
+                    agent.client = env.client(tenant.name)
+                    agents.append(agent)
+            recorder = open(args.record, 'w') if args.record else None
+            try:
+                generator = LoadGenerator(env, agents, args, recorder)
+                wall = generator.run()
+                stats = generator.stats
+            finally:
+                if recorder:
+                    recorder.close()
+    finally:
+        env.close()
+    stats.report(wall)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+"""
+Offline benchmark suite for the SentimentChecker views.
+
+Drives the real Flask app through its test client with OpenAI, Pinecone and
+Redis replaced by deterministic in-process fakes (see fakes.py), and reports
+throughput and p50/p99 latency for analyze-comments, get-scores and
+get-unsolved-tickets at each ticket/comment count combination.
+
+Usage:
+    python backend/benchmarks/run_benchmarks.py \\
+        --tickets 10,50 --comments 5,20 --iterations 30 \\
+        --latency embedding=0.02,query=0.005,fetch=0.003,list=0.003,upsert=0.005 \\
+        [--quota openai=50,pinecone=200] [--outage 0.5] [--contention 4] [--embedding-backend openai|local] [--output results.json] [--baseline previous.json --tolerance 0.25]
+
+With --outage, get-scores is also measured while every Pinecone call hangs
+for that many seconds and then fails, for tickets that are cached and ones
+that are not.
+
+With --contention N, single-ticket analyze-comments is measured in the interactive
+and background lanes while N threads keep posting background analyses for several
+tenants. Set PINECONE_OPS_PER_SECOND / OPENAI_EMBEDDING_RPM below the bulk load so
+the shared quota, not the in-process fakes, is the bottleneck.
+
+With --baseline, the run exits non-zero when any scenario's p50 is more than
+--tolerance slower than in the baseline file.
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from typing import Callable, Dict, List
+
+from harness import BenchmarkEnvironment, LatencyProfile, percentile, ticket_payload
+
+ROUTE_PREFIX = '/sentiment-checker'
+
+
+def _measure(name: str, iterations: int, request: Callable[[int], object]) -> Dict:
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        response = request(i)
+        latencies.append(time.perf_counter() - t0)
+        if response.status_code != 200:
+            errors += 1
+    elapsed = time.perf_counter() - started
+    return {
+        'scenario': name,
+        'requests': iterations,
+        'errors': errors,
+        'throughput_rps': iterations / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+
+
+def run_scenarios(env: BenchmarkEnvironment, ticket_counts: List[int], comment_counts: List[int],
+                  iterations: int, body_size: int, outage: float = 0.0) -> List[Dict]:
+    results = []
+    for ticket_count in ticket_counts:
+        for comment_count in comment_counts:
+            tenant = f"bench-t{ticket_count}-c{comment_count}"
+            client = env.client(tenant)
+            headers = {'X-Zendesk-Subdomain': tenant}
+            rng = random.Random(f"{ticket_count}:{comment_count}")
+            suffix = f"[tickets={ticket_count} comments={comment_count}]"
+
+            # analyze-comments: one ticket per call, as the sidebar sends it; every call is a new ticket
+            def analyze(i):
+                ticket = ticket_payload(f"{9000 + i}", comment_count, body_size, rng)
+                return client.post(f"{ROUTE_PREFIX}/analyze-comments", json={'tickets': [ticket]}, headers=headers)
+            results.append(_measure(f"analyze-comments {suffix}", iterations, analyze))
+
+            # Seed the tenant with the ticket set the read endpoints will ask about
+            tickets = [ticket_payload(str(1000 + t), comment_count, body_size, rng) for t in range(ticket_count)]
+            for ticket in tickets:
+                client.post(f"{ROUTE_PREFIX}/analyze-comments", json={'tickets': [ticket]}, headers=headers)
+            summaries = [{k: v for k, v in ticket.items() if k != 'comments'} for ticket in tickets]
+
+            def get_scores(i):
+                return client.post(f"{ROUTE_PREFIX}/get-scores", json={'tickets': summaries}, headers=headers)
+            results.append(_measure(f"get-scores {suffix}", iterations, get_scores))
+
+            if outage:
+                # Half the sidebar's tickets were never scored, so they need Pinecone
+                uncached = [dict(summary, id=str(5000 + t)) for t, summary in enumerate(summaries)]
+                mixed = summaries + uncached
+                env.latency.outages['pinecone'] = outage
+                try:
+                    results.append(_measure(f"get-scores pinecone outage {suffix}", iterations, lambda i: client.post(
+                        f"{ROUTE_PREFIX}/get-scores", json={'tickets': mixed}, headers=headers)))
+                finally:
+                    del env.latency.outages['pinecone']
+
+            # get-ticket-vectors: listed and fetched from Pinecone, then served from the per-ticket cache
+            vector_keys = [f"{tenant}:ticket_vectors:{summary['id']}" for summary in summaries]
+
+            def get_vectors_uncached(i):
+                env.redis.delete(*vector_keys)
+                return client.post(f"{ROUTE_PREFIX}/get-ticket-vectors", json={'tickets': summaries}, headers=headers)
+            results.append(_measure(f"get-ticket-vectors uncached {suffix}", iterations, get_vectors_uncached))
+            results.append(_measure(f"get-ticket-vectors {suffix}", iterations, lambda i: client.post(
+                f"{ROUTE_PREFIX}/get-ticket-vectors?fields=scores", json={'tickets': summaries}, headers=headers)))
+
+            per_page = 25
+            pages = max(1, -(-ticket_count // per_page))
+
+            def get_unsolved(i):
+                page = i % pages + 1
+                return client.post(f"{ROUTE_PREFIX}/get-unsolved-tickets?page={page}&per_page={per_page}",
+                                   json={}, headers=headers)
+            results.append(_measure(f"get-unsolved-tickets {suffix}", iterations, get_unsolved))
+    return results
+
+
+def run_contention(env: BenchmarkEnvironment, threads: int, comment_count: int, iterations: int,
+                   body_size: int) -> List[Dict]:
+    """Agent-facing analysis while bulk refreshes saturate the quota; half the bulk load comes from one tenant"""
+    stop = threading.Event()
+
+    def bulk(n):
+        tenant = 'bench-bulk-large' if n < max(1, threads // 2) else f"bench-bulk-{n}"
+        client = env.client(tenant)
+        headers = {'X-Zendesk-Subdomain': tenant, 'X-Analysis-Priority': 'background'}
+        rng = random.Random(n)
+        i = 0
+        while not stop.is_set():
+            ticket = ticket_payload(f"{n}{i:06d}", comment_count * 2, body_size, rng)
+            client.post(f"{ROUTE_PREFIX}/analyze-comments", json={'tickets': [ticket]}, headers=headers)
+            i += 1
+
+    workers = [threading.Thread(target=bulk, args=(n,), daemon=True) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    results = []
+    try:
+        # Let the bulk load drain the buckets first
+        time.sleep(2)
+        for lane in ('interactive', 'background'):
+            tenant = f"bench-agent-{lane}"
+            client = env.client(tenant)
+            headers = {'X-Zendesk-Subdomain': tenant, 'X-Analysis-Priority': lane}
+            rng = random.Random(lane)
+
+            def analyze(i):
+                ticket = ticket_payload(f"{7000 + i}", comment_count, body_size, rng)
+                return client.post(f"{ROUTE_PREFIX}/analyze-comments", json={'tickets': [ticket]}, headers=headers)
+            results.append(_measure(f"analyze-comments {lane} lane [bulk threads={threads} comments={comment_count}]",
+                                    iterations, analyze))
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join()
+    return results
+
+
+def compare(results: List[Dict], baseline_path: str, tolerance: float) -> List[str]:
+    with open(baseline_path) as f:
+        baseline = {row['scenario']: row for row in json.load(f)['results']}
+    regressions = []
+    for row in results:
+        before = baseline.get(row['scenario'])
+        if before and before['p50_ms'] > 0 and row['p50_ms'] > before['p50_ms'] * (1 + tolerance):
+            regressions.append(f"{row['scenario']}: p50 {before['p50_ms']:.2f}ms -> {row['p50_ms']:.2f}ms")
+    return regressions
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(',') if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tickets', type=_int_list, default=[10, 50], help='comma-separated ticket counts')
+    parser.add_argument('--comments', type=_int_list, default=[5, 20], help='comma-separated comments per ticket')
+    parser.add_argument('--iterations', type=int, default=30, help='requests per scenario')
+    parser.add_argument('--body-size', type=int, default=400, help='approximate comment HTML size in bytes')
+    parser.add_argument('--latency', default='', help="injected latency, e.g. 'embedding=0.02,query=0.005'")
+    parser.add_argument('--quota', default='', help="fake provider limits in calls/s, e.g. 'openai=50,pinecone=200'")
+    parser.add_argument('--outage', type=float, default=0.0,
+                        help='also measure get-scores while Pinecone calls hang this many seconds, then fail')
+    parser.add_argument('--contention', type=int, default=0,
+                        help='also measure interactive vs background analysis under this many bulk threads')
+    parser.add_argument('--embedding-backend', choices=('openai', 'local'), default='openai',
+                        help='fake OpenAI client, or LocalEmbeddingBackend over a generated static model')
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--baseline', help='JSON from a previous --output run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p50 slowdown vs baseline')
+    args = parser.parse_args()
+
+    env = BenchmarkEnvironment(LatencyProfile.parse(args.latency).set_quotas(args.quota), args.embedding_backend)
+    try:
+        results = run_scenarios(env, args.tickets, args.comments, args.iterations, args.body_size, args.outage)
+        if args.contention:
+            results += run_contention(env, args.contention, args.comments[0], args.iterations, args.body_size)
+    finally:
+        env.close()
+
+    for provider, quota in env.latency.quotas.items():
+        print(f"{provider} quota {quota.per_second:g}/s: {quota.rejected} calls throttled")
+    print(f"{'scenario':<60}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for row in results:
+        print(f"{row['scenario']:<60}{row['throughput_rps']:>10.1f}{row['p50_ms']:>10.2f}{row['p99_ms']:>10.2f}{row['errors']:>8}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'latency': args.latency, 'embedding_backend': args.embedding_backend, 'results': results}, f, indent=2)
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
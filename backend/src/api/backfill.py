@@ -0,0 +1,310 @@
+"""
+Offline ingestion of a Zendesk ticket export, for onboarding a tenant without the
+frontend posting tickets one at a time to analyze-comments.
+
+The export is read as a stream, one ticket per line with its comments. Tickets are
+grouped into batches of about BACKFILL_BATCH_COMMENTS comments, and each batch goes
+through the same stages as analyze-comments, but batched:
+
+1. clean the comment HTML
+2. embed every chunk of the batch in as few embedding calls as possible
+3. score emotions
+4. upsert the vectors 100 at a time
+5. write the ticket scores to Redis in one pipeline
+
+Batches run on a pool of workers, and the reader blocks while the pool has no free
+slot. A checkpoint file records the line before which every ticket is stored, so a
+run can be stopped and resumed.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from models import TicketInput
+from models.metadata import build_comment_metadata, parse_comment_metadata
+from services.chunking import chunk_text, pool_embeddings
+from services.aggregates import SentimentAggregates
+from services.comment_cleaner import CommentCleaner
+from services.emotion_scoring import encode_profile
+from services.metrics_service import record_comment_chunks, track_stage
+import dotenv, os
+import json
+import logging
+import threading
+import time
+
+dotenv.load_dotenv()
+logger = logging.getLogger('backfill')
+
+BACKFILL_BATCH_COMMENTS = int(os.getenv("BACKFILL_BATCH_COMMENTS", 256))
+BACKFILL_WORKERS = int(os.getenv("BACKFILL_WORKERS", 8))
+UPSERT_BATCH_SIZE = 100
+
+
+@dataclass
+class Batch:
+    # Export lines [start_line, end_line), including any blank or unreadable ones
+    start_line: int
+    end_line: int
+    tickets: List[TicketInput]
+    comments: int
+
+
+@dataclass
+class BackfillStats:
+    tickets: int = 0
+    comments: int = 0
+    skipped: int = 0
+    failed_batches: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, tickets: int, comments: int, skipped: int) -> None:
+        with self._lock:
+            self.tickets += tickets
+            self.comments += comments
+            self.skipped += skipped
+
+    def fail(self) -> None:
+        with self._lock:
+            self.failed_batches += 1
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    @property
+    def comments_per_second(self) -> float:
+        return self.comments / self.elapsed if self.elapsed else 0.0
+
+
+def ticket_from_export(record: Dict[str, Any]) -> TicketInput:
+    """Build a ticket from an export line. Zendesk ids are numbers, and comment HTML may be under html_body."""
+    ticket = record.get('ticket', record)
+    comments = []
+    for comment in ticket.get('comments') or record.get('comments') or []:
+        comments.append({
+            'id': str(comment['id']),
+            'body': comment.get('html_body') or comment.get('body'),
+            'created_at': comment.get('created_at'),
+            'author_id': comment.get('author_id')
+        })
+    return TicketInput(
+        id=str(ticket['id']),
+        comments=comments,
+        status=ticket.get('status'),
+        created_at=ticket.get('created_at'),
+        updated_at=ticket.get('updated_at'),
+        requestor=ticket.get('requester') or ticket.get('requestor') or _person(ticket.get('requester_id')),
+        assignee=ticket.get('assignee') or _person(ticket.get('assignee_id'))
+    )
+
+
+def _person(id: Optional[Any]) -> Optional[Dict[str, Any]]:
+    # Exports list people by id only; the frontend sends {'id', 'name'}
+    return {'id': id} if id is not None else None
+
+
+def read_export(path: str, start_line: int = 0) -> Iterator[Tuple[int, TicketInput]]:
+    """Yield (line number, ticket) from a JSON Lines export without loading it into memory"""
+    with open(path, encoding='utf-8') as export:
+        for line_number, line in enumerate(export):
+            if line_number < start_line or not line.strip():
+                continue
+            try:
+                yield line_number, ticket_from_export(json.loads(line))
+            except Exception as e:
+                logger.error(f"Skipping unreadable export line {line_number + 1}: {e}")
+
+
+def batched(tickets: Iterator[Tuple[int, TicketInput]], start_line: int,
+            batch_comments: int = BACKFILL_BATCH_COMMENTS) -> Iterator[Batch]:
+    """Group whole tickets into batches of about batch_comments comments, covering contiguous line ranges"""
+    batch = Batch(start_line, start_line, [], 0)
+    for line_number, ticket in tickets:
+        batch.tickets.append(ticket)
+        batch.comments += len(ticket.comments or [])
+        batch.end_line = line_number + 1
+        if batch.comments >= batch_comments:
+            yield batch
+            batch = Batch(batch.end_line, batch.end_line, [], 0)
+    if batch.tickets:
+        yield batch
+
+
+class Checkpoint:
+    """Line watermark for an export: every ticket before `line` is stored. Batches may finish in any order."""
+
+    def __init__(self, path: str, export_path: str):
+        self.path = path
+        self.export_path = os.path.abspath(export_path)
+        self.line = 0
+        self.comments = 0
+        self._finished: Dict[int, Tuple[int, int, bool]] = {}
+        self._lock = threading.Lock()
+
+    def load(self) -> int:
+        if os.path.exists(self.path):
+            with open(self.path) as checkpoint:
+                data = json.load(checkpoint)
+            if data.get('export') == self.export_path:
+                self.line = int(data.get('line', 0))
+                self.comments = int(data.get('comments', 0))
+            else:
+                logger.warning(f"Checkpoint {self.path} is for {data.get('export')}, starting from the top")
+        return self.line
+
+    def finish(self, batch: Batch, ok: bool) -> None:
+        with self._lock:
+            self._finished[batch.start_line] = (batch.end_line, batch.comments, ok)
+            advanced = False
+            # A failed batch holds the watermark, so a resumed run retries it
+            while self.line in self._finished and self._finished[self.line][2]:
+                end_line, comments, _ = self._finished.pop(self.line)
+                self.line = end_line
+                self.comments += comments
+                advanced = True
+            if advanced:
+                self._save()
+
+    def _save(self) -> None:
+        temporary = f"{self.path}.tmp"
+        with open(temporary, 'w') as checkpoint:
+            json.dump({'export': self.export_path, 'line': self.line, 'comments': self.comments,
+                       'updated_at': int(time.time())}, checkpoint)
+        os.replace(temporary, self.path)
+
+
+class BackfillPipeline:
+    """
+    Runs export batches through a SentimentChecker bound to one tenant. The checker is
+    thread-local, so each pool thread binds its own services on first use.
+    """
+
+    def __init__(self, checker, subdomain: str, workers: int = BACKFILL_WORKERS,
+                 batch_comments: int = BACKFILL_BATCH_COMMENTS, skip_existing: bool = True):
+        self.checker = checker
+        self.subdomain = subdomain
+        self.workers = workers
+        self.batch_comments = batch_comments
+        self.skip_existing = skip_existing
+        self.stats = BackfillStats()
+
+    def run(self, export_path: str, checkpoint: Checkpoint,
+            on_progress: Optional[Callable[[BackfillStats], None]] = None, progress_interval: float = 10.0) -> BackfillStats:
+        start_line = checkpoint.load()
+        # Backpressure: the reader waits while every worker is busy and one batch is queued behind each
+        slots = threading.BoundedSemaphore(self.workers * 2)
+        next_progress = time.monotonic() + progress_interval
+
+        def finished(batch, future):
+            slots.release()
+            error = future.exception()
+            if error is not None:
+                self.stats.fail()
+                logger.error(f"Backfill batch at line {batch.start_line + 1} failed: {error}")
+            checkpoint.finish(batch, error is None)
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='backfill') as pool:
+            for batch in batched(read_export(export_path, start_line), start_line, self.batch_comments):
+                slots.acquire()
+                future = pool.submit(self._process, batch)
+                future.add_done_callback(lambda future, batch=batch: finished(batch, future))
+                if on_progress and time.monotonic() >= next_progress:
+                    on_progress(self.stats)
+                    next_progress = time.monotonic() + progress_interval
+        return self.stats
+
+    def _bind(self):
+        checker = self.checker
+        if getattr(checker, 'subdomain', None) != self.subdomain:
+            checker.bind_tenant(self.subdomain, 'backfill')
+        return checker
+
+    def _process(self, batch: Batch) -> None:
+        checker = self._bind()
+        service = checker.pinecone_service
+        comments = [
+            (ticket, comment, f"{ticket.id}#{comment.id}")
+            for ticket in batch.tickets for comment in ticket.comments or [] if comment.body
+        ]
+        results: Dict[str, List[Dict[str, Any]]] = {ticket.id: [] for ticket in batch.tickets}
+
+        # Comments stored by an earlier, interrupted run keep their scores and are not re-embedded
+        existing = {}
+        if self.skip_existing and comments:
+            existing = service.fetch_vectors([vector_id for _, _, vector_id in comments])
+        pending = []
+        for ticket, comment, vector_id in comments:
+            stored = parse_comment_metadata((existing.get(vector_id) or {}).get('metadata'), vector_id)
+            if stored is not None and stored.emotion_score is not None:
+                results[ticket.id].append({'timestamp': stored.timestamp, 'emotion_score': stored.emotion_score})
+            else:
+                pending.append((ticket, comment, vector_id))
+
+        with track_stage('html_parse'):
+            cleaner = CommentCleaner(checker.redis, self.subdomain)
+            cleaned = [cleaner.clean(comment.body).text for _, comment, _ in pending]
+        kept = [(item, text) for item, text in zip(pending, cleaned) if text.strip()]
+        skipped = len(comments) - len(kept)
+
+        # One flat list of chunks for the whole batch; the backend splits it into API-sized requests
+        chunked = [chunk_text(text) for _, text in kept]
+        vectors = service.get_embeddings([chunk.text for chunks in chunked for chunk in chunks]) if chunked else []
+
+        upserts = []
+        # Newly scored comments, folded into the assignee and requester aggregates once stored
+        scored = []
+        offset = 0
+        for ((ticket, comment, vector_id), _), chunks in zip(kept, chunked):
+            embedding = pool_embeddings(vectors[offset:offset + len(chunks)], [chunk.tokens for chunk in chunks])
+            offset += len(chunks)
+            record_comment_chunks(len(chunks))
+            with track_stage('emotion_query'):
+                emotion_score, profile = checker._score_emotions(checker._query_emotions(embedding, top_k=100))
+            timestamp = checker._convert_date_to_timestamp(comment.created_at)
+            upserts.append({
+                "id": vector_id,
+                "values": embedding,
+                "metadata": build_comment_metadata(ticket.id, comment.body, emotion_score, timestamp,
+                                                   author_id=comment.author_id, chunks=len(chunks),
+                                                   emotion_profile=encode_profile(profile))
+            })
+            results[ticket.id].append({'timestamp': timestamp, 'emotion_score': emotion_score})
+            scored.append((ticket, comment, timestamp, emotion_score))
+
+        with track_stage('upsert'):
+            for i in range(0, len(upserts), UPSERT_BATCH_SIZE):
+                service.index.upsert(vectors=upserts[i:i + UPSERT_BATCH_SIZE], namespace=service.namespace)
+
+        self._write_scores(checker, batch.tickets, results, scored)
+        self.stats.add(len(batch.tickets), len(upserts), skipped)
+
+    def _write_scores(self, checker, tickets: List[TicketInput], results: Dict[str, List[Dict[str, Any]]],
+                      scored: List[Tuple[TicketInput, Any, int, float]]) -> None:
+        """
+        Cache ticket scores, drop cached comment lists and update the aggregates as
+        analyze-comments does, sending the batch's writes as one Redis pipeline
+        """
+        redis = checker.redis
+        if redis is None:
+            return
+        checker.redis = redis.pipeline(transaction=False)
+        try:
+            for ticket in tickets:
+                if results[ticket.id]:
+                    checker._process_comment_results(ticket, results[ticket.id])
+            for ticket_id in {ticket.id for ticket, _, _, _ in scored}:
+                # As _invalidate_ticket_vectors, queued on the batch pipeline
+                generation_key = checker._get_cache_key('ticket_vectors_gen', ticket_id)
+                checker.redis.incr(generation_key)
+                checker.redis.expire(generation_key, checker.cache_ttl)
+                checker.redis.delete(checker._get_cache_key('ticket_vectors', ticket_id))
+            aggregates = SentimentAggregates(redis, self.subdomain)
+            for ticket, comment, timestamp, emotion_score in scored:
+                assignee_id, requester_id = checker._ticket_people(ticket, comment)
+                aggregates.record(emotion_score, timestamp, assignee_id, requester_id, comment.author_id,
+                                  pipeline=checker.redis)
+            with track_stage('redis_set'):
+                checker.redis.execute()
+        finally:
+            checker.redis = redis
@@ -0,0 +1,382 @@
+"""
+Operational commands, run with the Flask CLI from backend/src:
+
+    flask --app wsgi embeddings seed-emotions --target-index sentiment-local
+    flask --app wsgi embeddings reproject --dimensions 512 --target-index sentiment-512
+    flask --app wsgi embeddings migrate-metadata --dry-run
+    flask --app wsgi tickets backfill export.jsonl --subdomain acme
+    flask --app wsgi tickets rescore --dry-run
+    flask --app wsgi tickets webhook-secret --subdomain acme
+    flask --app wsgi profiling enable --subdomain acme --rate 0.1 --minutes 30
+    flask --app wsgi shards migrate --subdomain acme --index sentiment-2 --redis b
+"""
+from flask.cli import AppGroup
+from services.embedding_service import (
+    OPENAI_EMBEDDING_MODEL, backend_namespace, openai_backend_name, reduce_dimensions
+)
+from services.pinecone_service import IndexDimensionError, PineconeService
+from models.metadata import METADATA_VERSION, upgrade_comment_metadata
+from .backfill import BACKFILL_BATCH_COMMENTS, BACKFILL_WORKERS, BackfillPipeline, Checkpoint
+from .rescore import FETCH_BATCH_SIZE as RESCORE_BATCH_SIZE, rescore_namespace
+from .shards import COPY_BATCH_SIZE, migrate_tenant
+from config.redis_config import RedisClient
+from services.scheduler import BACKFILL, bind_priority
+from services.profiler import PROFILE_RATES_REFRESH, clear_sample_rate, set_sample_rate
+from services.tenant_router import TenantRoute, get_tenant_redis, tenant_index, tenant_router
+import click
+import logging
+import time
+
+logger = logging.getLogger('sentiment_checker')
+
+embeddings_cli = AppGroup('embeddings', help='Manage vectors for the configured embedding backend.')
+tickets_cli = AppGroup('tickets', help='Bulk ticket ingestion.')
+profiling_cli = AppGroup('profiling', help='Profile a sample of requests.')
+shards_cli = AppGroup('shards', help='Place tenants on Pinecone indexes and Redis shards.')
+
+SOURCE_EMOTIONS_NAMESPACE = 'emotions'
+
+
+@embeddings_cli.command('seed-emotions')
+@click.option('--batch-size', default=100, show_default=True, help='Reference texts embedded and upserted per call.')
+@click.option('--target-index', help='Index to seed, when the backend needs an index of its own dimension. '
+                                     'Defaults to the configured index.')
+def seed_emotions(batch_size, target_index):
+    """
+    Re-embed the emotion reference set from the configured index into the active
+    backend's emotions namespace, in that index or in --target-index.
+    """
+    service = PineconeService()
+    target = service.emotions_namespace
+    if target == SOURCE_EMOTIONS_NAMESPACE:
+        click.echo(f"Backend '{service.embedder.name}' reads '{SOURCE_EMOTIONS_NAMESPACE}' directly; nothing to seed.")
+        return
+    target_service = PineconeService(index_name=target_index) if target_index else service
+    try:
+        target_service.check_dimension()
+    except IndexDimensionError as e:
+        raise click.ClickException(str(e))
+
+    seeded = listed = 0
+    for ids in _id_batches(service, SOURCE_EMOTIONS_NAMESPACE, batch_size):
+        listed += len(ids)
+        records = service.fetch_vectors(ids, namespace=SOURCE_EMOTIONS_NAMESPACE)
+        records = [record for record in records.values() if record['metadata'] and record['metadata'].get('text')]
+        if not records:
+            continue
+        embeddings = service.get_embeddings([record['metadata']['text'] for record in records])
+        target_service.index.upsert(
+            vectors=[
+                {"id": record['id'], "values": values, "metadata": dict(record['metadata'])}
+                for record, values in zip(records, embeddings)
+            ],
+            namespace=target
+        )
+        seeded += len(records)
+    logger.info(f"Seeded {seeded} emotion reference vectors into {target_service.index_name}/{target}")
+    click.echo(f"Seeded {seeded} of {listed} emotion reference vectors into '{target_service.index_name}/{target}'.")
+
+
+@embeddings_cli.command('reproject')
+@click.option('--dimensions', type=int, required=True, help='Target vector size (must match the target index).')
+@click.option('--target-index', required=True, help='Pinecone index created with the target dimension.')
+@click.option('--namespace', 'namespaces', multiple=True,
+              help='Source namespace to re-project; repeatable. Defaults to every default-backend namespace.')
+@click.option('--batch-size', default=100, show_default=True, help='Vectors fetched and upserted per call.')
+def reproject(dimensions, target_index, namespaces, batch_size):
+    """
+    Copy full-size OpenAI vectors into a reduced-dimension index by truncating and
+    re-normalizing them, without calling the embedding API. Valid for text-embedding-3
+    models; run with EMBEDDING_DIMENSIONS unset so the source is the full-size index.
+    """
+    # Bulk copy: every read and upsert takes quota from the backfill lane, behind agent traffic
+    bind_priority(BACKFILL, None)
+    service = PineconeService()
+    target = PineconeService(index_name=target_index).index
+    backend_name = openai_backend_name(OPENAI_EMBEDDING_MODEL, dimensions)
+    if not namespaces:
+        stats = service.describe_index_stats()
+        namespaces = [
+            namespace for namespace, summary in stats.get('namespaces', {}).items()
+            if '__' not in namespace and summary.get('vector_count', 0) > 0
+        ]
+
+    for namespace in namespaces:
+        target_namespace = backend_namespace(namespace, backend_name)
+        copied = listed = 0
+        for ids in _id_batches(service, namespace, batch_size):
+            listed += len(ids)
+            records = service.fetch_vectors(ids, namespace=namespace, include_values=True)
+            records = [record for record in records.values() if record['values']]
+            if not records:
+                continue
+            values = reduce_dimensions([list(record['values']) for record in records], dimensions)
+            target.upsert(
+                vectors=[
+                    {"id": record['id'], "values": vector.tolist(), "metadata": dict(record['metadata'] or {})}
+                    for record, vector in zip(records, values)
+                ],
+                namespace=target_namespace
+            )
+            copied += len(records)
+        logger.info(f"Re-projected {copied} vectors from {namespace} to {target_index}/{target_namespace}")
+        click.echo(f"{namespace} -> {target_index}/{target_namespace}: {copied} of {listed} vectors")
+
+
+@embeddings_cli.command('migrate-metadata')
+@click.option('--namespace', 'namespaces', multiple=True,
+              help='Namespace to migrate; repeatable. Defaults to every comment namespace in the index.')
+@click.option('--batch-size', default=100, show_default=True, help='Vectors fetched and upserted per call.')
+@click.option('--dry-run', is_flag=True, help='Count the records that would change without writing.')
+def migrate_metadata(namespaces, batch_size, dry_run):
+    """
+    Rewrite comment vectors to the current metadata version, dropping the stored
+    comment body in favour of its hash. Records are re-upserted with their existing
+    values, since a metadata update cannot remove a key. Safe to re-run.
+    """
+    for index_name in tenant_router.indexes:
+        service = PineconeService(index_name=index_name)
+        _migrate_index_metadata(service, namespaces, batch_size, dry_run)
+
+
+def _migrate_index_metadata(service, namespaces, batch_size, dry_run):
+    stats = service.describe_index_stats()
+    present = {
+        namespace for namespace, summary in stats.get('namespaces', {}).items()
+        if namespace.split('__')[0] != SOURCE_EMOTIONS_NAMESPACE and summary.get('vector_count', 0) > 0
+    }
+    namespaces = [namespace for namespace in namespaces if namespace in present] if namespaces else sorted(present)
+
+    for namespace in namespaces:
+        upgraded = current = 0
+        for ids in _id_batches(service, namespace, batch_size):
+            records = service.fetch_vectors(ids, namespace=namespace, include_values=True)
+            vectors = []
+            for record in records.values():
+                metadata = upgrade_comment_metadata(record['metadata'], record['id'])
+                if metadata is None or not record['values']:
+                    current += 1
+                    continue
+                vectors.append({"id": record['id'], "values": list(record['values']), "metadata": metadata})
+            if vectors and not dry_run:
+                service.index.upsert(vectors=vectors, namespace=namespace)
+            upgraded += len(vectors)
+        action = 'would upgrade' if dry_run else 'upgraded'
+        logger.info(f"Metadata migration {service.index_name}/{namespace}: {action} {upgraded}, {current} current or unreadable")
+        click.echo(f"{service.index_name}/{namespace}: {action} {upgraded} of {upgraded + current} vectors "
+                   f"to metadata v{METADATA_VERSION}")
+
+
+@tickets_cli.command('backfill')
+@click.argument('export_path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--subdomain', required=True, help='Tenant the export belongs to.')
+@click.option('--workers', default=BACKFILL_WORKERS, show_default=True, help='Batches processed concurrently.')
+@click.option('--batch-comments', default=BACKFILL_BATCH_COMMENTS, show_default=True,
+              help='Approximate comments per batch; tickets are never split.')
+@click.option('--checkpoint', 'checkpoint_path', help='Resume file. Defaults to EXPORT_PATH.checkpoint.')
+@click.option('--no-skip-existing', is_flag=True, help='Re-embed comments that already have vectors.')
+@click.option('--progress-interval', default=10.0, show_default=True, help='Seconds between progress lines.')
+def backfill(export_path, subdomain, workers, batch_comments, checkpoint_path, no_skip_existing, progress_interval):
+    """
+    Analyze a Zendesk ticket export (JSON Lines, one ticket with its comments per line)
+    and store comment vectors and ticket scores for a tenant. Re-running resumes from the
+    checkpoint; a failed batch is retried on the next run.
+    """
+    from .views import SentimentChecker
+
+    checkpoint = Checkpoint(checkpoint_path or f"{export_path}.checkpoint", export_path)
+    pipeline = BackfillPipeline(SentimentChecker(), subdomain, workers=workers, batch_comments=batch_comments,
+                                skip_existing=not no_skip_existing)
+
+    def progress(stats):
+        click.echo(f"{stats.tickets} tickets, {stats.comments} comments embedded, {stats.skipped} skipped, "
+                   f"{stats.comments_per_second:.1f} comments/s, checkpoint at line {checkpoint.line}")
+
+    stats = pipeline.run(export_path, checkpoint, on_progress=progress, progress_interval=progress_interval)
+    progress(stats)
+    logger.info(f"Backfilled {stats.comments} comments for {subdomain} in {stats.elapsed:.1f}s")
+    if stats.failed_batches:
+        raise click.ClickException(f"{stats.failed_batches} batches failed; re-run to retry them from line {checkpoint.line + 1}")
+
+
+@tickets_cli.command('rescore')
+@click.option('--subdomain', 'subdomains', multiple=True,
+              help='Tenant to re-score; repeatable. Defaults to every tenant with vectors for the active backend.')
+@click.option('--dry-run', is_flag=True, help='Count the scores that would change without writing.')
+def rescore(subdomains, dry_run):
+    """
+    Apply the current emotion weights to stored comments from their emotion profiles, then
+    refresh the cached ticket scores. Nothing is re-embedded.
+    """
+    if not subdomains:
+        subdomains = []
+        for index_name in tenant_router.indexes:
+            service = PineconeService(index_name=index_name)
+            for namespace, summary in service.describe_index_stats().get('namespaces', {}).items():
+                subdomain = namespace.split('__')[0]
+                # Only the active backend's namespaces back the cached scores, and only in the
+                # tenant's current index; a copy left behind by a migration is not rescored
+                if subdomain != SOURCE_EMOTIONS_NAMESPACE and service.embedder.namespace(subdomain) == namespace \
+                        and summary.get('vector_count', 0) > 0 and tenant_index(subdomain) == index_name:
+                    subdomains.append(subdomain)
+
+    for subdomain in subdomains:
+        started = time.monotonic()
+        service = PineconeService(subdomain)
+        namespace = service.namespace
+        id_batches = _id_batches(service, namespace, RESCORE_BATCH_SIZE)
+        result = rescore_namespace(service, namespace, id_batches, redis=get_tenant_redis(subdomain),
+                                   subdomain=subdomain, dry_run=dry_run)
+        action = 'would change' if dry_run else 'changed'
+        logger.info(f"Re-scored {namespace}: {action} {result.changed} of {result.comments} comments")
+        click.echo(f"{namespace}: {action} {result.changed} of {result.comments} comment scores, "
+                   f"{result.tickets_cached} cached tickets, {result.without_profile} without a profile "
+                   f"({time.monotonic() - started:.1f}s)")
+
+
+@tickets_cli.command('webhook-secret')
+@click.option('--subdomain', required=True, help='Tenant whose webhook signs with this secret.')
+@click.option('--secret', help="The webhook's signing secret from Zendesk admin; prompted for when left out.")
+@click.option('--clear', is_flag=True, help='Remove the tenant secret and fall back to ZENDESK_WEBHOOK_SECRET.')
+def webhook_secret(subdomain, secret, clear):
+    """Store the signing secret used to verify a tenant's Zendesk webhook deliveries."""
+    redis = RedisClient.get_instance()
+    key = f"webhook:secret:{subdomain}"
+    if clear:
+        redis.delete(key)
+        click.echo(f"Cleared the webhook secret for {subdomain}")
+    else:
+        redis.set(key, secret or click.prompt('Signing secret', hide_input=True))
+        click.echo(f"Stored the webhook secret for {subdomain}")
+
+
+@profiling_cli.command('enable')
+@click.option('--subdomain', help='Tenant to profile. Defaults to every tenant.')
+@click.option('--rate', default=0.1, show_default=True, help='Fraction of requests to the profiled views.')
+@click.option('--minutes', default=30, show_default=True, help='Profiling switches itself off after this.')
+def enable_profiling(subdomain, rate, minutes):
+    """Profile a sampled fraction of a tenant's analyze, score and ticket list requests."""
+    if not 0 < rate <= 1:
+        raise click.BadParameter('must be in (0, 1]', param_hint='--rate')
+    set_sample_rate(RedisClient.get_instance(), subdomain, rate, minutes * 60)
+    click.echo(f"Profiling {rate:.0%} of requests for {subdomain or 'every tenant'} for {minutes} minutes; "
+               f"workers pick this up within {PROFILE_RATES_REFRESH:g}s")
+
+
+@profiling_cli.command('disable')
+@click.option('--subdomain', help='Tenant to stop profiling. Defaults to the every-tenant rate.')
+def disable_profiling(subdomain):
+    """Stop sampling requests for profiling."""
+    clear_sample_rate(RedisClient.get_instance(), subdomain)
+    click.echo(f"Stopped profiling {subdomain or 'every tenant'}")
+
+
+@shards_cli.command('show')
+@click.option('--subdomain', help='Tenant to show. Defaults to the configured shards and every pin.')
+def show_shards(subdomain):
+    """Show where tenants are placed."""
+    if subdomain:
+        route, hashed = tenant_router.route(subdomain), tenant_router.hashed(subdomain)
+        source = 'hashed' if route == hashed else 'pinned'
+        click.echo(f"{subdomain}: index {route.index}, Redis shard {route.redis} ({source})")
+        return
+    click.echo(f"Indexes: {', '.join(tenant_router.indexes)}")
+    click.echo(f"Redis shards: {', '.join(tenant_router.redis_shards)}")
+    pins = {subdomain: dict(pin) for subdomain, pin in tenant_router.overrides.items()}
+    for subdomain, pin in tenant_router.pins().items():
+        pins.setdefault(subdomain, {}).update(pin)
+    for subdomain in sorted(pins):
+        route = tenant_router.route(subdomain)
+        click.echo(f"{subdomain}: index {route.index}, Redis shard {route.redis}")
+
+
+@shards_cli.command('pin')
+@click.option('--subdomain', 'subdomains', multiple=True, help='Tenant to pin; repeatable.')
+@click.option('--all', 'all_tenants', is_flag=True, help='Pin every tenant with vectors where it is now.')
+@click.option('--index', help='Index to pin to. Defaults to where the tenant is now.')
+@click.option('--redis', 'redis_shard', help='Redis shard to pin to. Defaults to where the tenant is now.')
+@click.option('--clear', is_flag=True, help='Remove the pin, placing the tenant by hash again.')
+def pin_tenants(subdomains, all_tenants, index, redis_shard, clear):
+    """
+    Fix where tenants are placed, without moving their data; use `shards migrate` to move
+    it. Run with --all before adding an index or shard, so that no tenant is re-homed.
+    """
+    if all_tenants:
+        subdomains = sorted(_tenants())
+    if not subdomains:
+        raise click.UsageError('Pass --subdomain or --all')
+    _check_route(index, redis_shard)
+    for subdomain in subdomains:
+        if clear:
+            tenant_router.unpin(subdomain)
+            click.echo(f"Unpinned {subdomain}")
+            continue
+        route = tenant_router.route(subdomain)
+        tenant_router.pin(subdomain, index or route.index, redis_shard or route.redis)
+        click.echo(f"Pinned {subdomain} to index {index or route.index}, Redis shard {redis_shard or route.redis}")
+
+
+@shards_cli.command('migrate')
+@click.option('--subdomain', required=True, help='Tenant to move.')
+@click.option('--index', help='Target index. Defaults to the current one.')
+@click.option('--redis', 'redis_shard', help='Target Redis shard. Defaults to the current one.')
+@click.option('--batch-size', default=COPY_BATCH_SIZE, show_default=True, help='Vectors fetched and upserted per call.')
+@click.option('--keep-source', is_flag=True, help='Leave the old copy in place instead of deleting it.')
+def migrate_shard(subdomain, index, redis_shard, batch_size, keep_source):
+    """
+    Move a tenant's vectors and Redis keys to another index or shard while it is being
+    served, and pin it there.
+    """
+    _check_route(index, redis_shard)
+    route = tenant_router.route(subdomain)
+    target = TenantRoute(index or route.index, redis_shard or route.redis)
+    if target == route:
+        click.echo(f"{subdomain} is already on index {route.index}, Redis shard {route.redis}")
+        return
+    started = time.monotonic()
+    stats = migrate_tenant(subdomain, target, lambda index_name: PineconeService(index_name=index_name),
+                           batch_size=batch_size, keep_source=keep_source, echo=click.echo)
+    click.echo(f"Moved {subdomain} to index {target.index}, Redis shard {target.redis}: "
+               f"{stats.vectors + stats.vectors_caught_up} vectors, {stats.keys + stats.keys_caught_up} keys "
+               f"({time.monotonic() - started:.1f}s)")
+
+
+def _check_route(index, redis_shard):
+    if index and index not in tenant_router.indexes:
+        raise click.BadParameter(f"not in PINECONE_INDEXES ({', '.join(tenant_router.indexes)})", param_hint='--index')
+    if redis_shard and redis_shard not in tenant_router.redis_shards:
+        raise click.BadParameter(f"not in REDIS_SHARDS ({', '.join(tenant_router.redis_shards)})", param_hint='--redis')
+
+
+def _tenants():
+    """Subdomains with comment vectors in any index"""
+    tenants = set()
+    for index_name in tenant_router.indexes:
+        stats = PineconeService(index_name=index_name).describe_index_stats()
+        for namespace, summary in stats.get('namespaces', {}).items():
+            subdomain = namespace.split('__')[0]
+            if subdomain != SOURCE_EMOTIONS_NAMESPACE and summary.get('vector_count', 0) > 0:
+                tenants.add(subdomain)
+    return tenants
+
+
+def _id_batches(service, namespace, batch_size):
+    """
+    A namespace's ids in batches of batch_size, streamed from the prefetching list iterator
+    so listing the next page overlaps with processing this one and memory stays flat
+    """
+    batch = []
+    for ids in service.iter_vector_ids(namespace=namespace):
+        batch.extend(ids)
+        while len(batch) >= batch_size:
+            yield batch[:batch_size]
+            batch = batch[batch_size:]
+    if batch:
+        yield batch
+
+
+def register_commands(app):
+    app.cli.add_command(embeddings_cli)
+    app.cli.add_command(tickets_cli)
+    app.cli.add_command(profiling_cli)
+    app.cli.add_command(shards_cli)
@@ -0,0 +1,113 @@
+"""
+Re-score stored comments after the emotion weights in models/emotions.py change.
+
+Every comment analyzed since emotion profiles were introduced stores, in its metadata,
+the summed similarity and count of the reference matches per emotion. A comment's
+score is a function of that profile and the weights only, so new scores and ticket
+aggregates are recomputed with NumPy and written back, with no embedding or emotion
+queries. Comments without a profile keep their score; they need re-analysis to
+pick up new weights.
+"""
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+from models.metadata import parse_comment_metadata
+from services.emotion_scoring import current_weights, decode_profile, profile_matrices, rescore, ticket_scores
+import json
+import logging
+import time
+
+logger = logging.getLogger('rescore')
+
+FETCH_BATCH_SIZE = 1000
+UPSERT_BATCH_SIZE = 100
+# Smaller differences are float noise from re-accumulating the profile, not a weight change
+SCORE_TOLERANCE = 1e-6
+# Lifetime of the ticket_vectors generation counters, the comment cache TTL
+GENERATION_TTL = 3600
+
+
+@dataclass
+class RescoreStats:
+    comments: int = 0
+    changed: int = 0
+    without_profile: int = 0
+    tickets_cached: int = 0
+
+
+def rescore_namespace(service, namespace: str, id_batches: Iterable[List[str]], redis=None,
+                      subdomain: Optional[str] = None, dry_run: bool = False) -> RescoreStats:
+    """
+    Recompute emotion_score for every listed vector, upsert the changed ones in batches, then
+    recompute ticket scores from all of them and update the tickets already in the score cache.
+    Ids are consumed batch by batch, so only the per-comment scores are held for the whole run.
+    """
+    names, weights = current_weights()
+    stats = RescoreStats()
+    ticket_ids: List[str] = []
+    timestamps: List[int] = []
+    scores: List[float] = []
+
+    for ids in id_batches:
+        records = service.fetch_vectors(ids, namespace=namespace, include_values=True)
+        parsed = [(record, parse_comment_metadata(record['metadata'], record['id'])) for record in records.values()]
+        parsed = [(record, metadata) for record, metadata in parsed if metadata is not None and metadata.emotion_score is not None]
+        profiled = [(record, metadata, decode_profile(metadata.emotion_profile)) for record, metadata in parsed]
+        profiled = [item for item in profiled if item[2] is not None]
+        stats.comments += len(parsed)
+        stats.without_profile += len(parsed) - len(profiled)
+
+        new_scores = {}
+        if profiled:
+            similarity, counts = profile_matrices([profile for _, _, profile in profiled], names)
+            for (record, metadata, _), score in zip(profiled, rescore(similarity, counts, weights).tolist()):
+                if abs(score - metadata.emotion_score) > SCORE_TOLERANCE:
+                    new_scores[record['id']] = score
+
+        upserts = [
+            {"id": record['id'], "values": list(record['values']),
+             "metadata": dict(record['metadata'], emotion_score=new_scores[record['id']])}
+            for record, _ in parsed if record['id'] in new_scores and record['values']
+        ]
+        if not dry_run:
+            for j in range(0, len(upserts), UPSERT_BATCH_SIZE):
+                service.index.upsert(vectors=upserts[j:j + UPSERT_BATCH_SIZE], namespace=namespace)
+        stats.changed += len(new_scores)
+
+        for record, metadata in parsed:
+            ticket_ids.append(metadata.ticket_id)
+            timestamps.append(metadata.timestamp)
+            scores.append(new_scores.get(record['id'], metadata.emotion_score))
+
+    if redis is not None and subdomain:
+        stats.tickets_cached = _update_cached_tickets(redis, subdomain, ticket_scores(ticket_ids, timestamps, scores), dry_run)
+    return stats
+
+
+def _update_cached_tickets(redis, subdomain: str, scores: Dict[str, float], dry_run: bool) -> int:
+    """
+    Replace the score in cached ticket entries, keeping their other fields and TTL, and drop
+    cached comment lists. Tickets not in the cache are left out: get-scores computes them
+    from the updated vectors.
+    """
+    keys = [f"{subdomain}:ticket:{ticket_id}" for ticket_id in scores]
+    updated = 0
+    for i in range(0, len(keys), FETCH_BATCH_SIZE):
+        batch = keys[i:i + FETCH_BATCH_SIZE]
+        pipe = redis.pipeline(transaction=False)
+        batch_ids = [key.rsplit(':', 1)[1] for key in batch]
+        pipe.delete(*[f"{subdomain}:ticket_vectors:{ticket_id}" for ticket_id in batch_ids])
+        # Keep reads in flight from caching the old scores again, as _invalidate_ticket_vectors does
+        for ticket_id in batch_ids:
+            pipe.incr(f"{subdomain}:ticket_vectors_gen:{ticket_id}")
+            pipe.expire(f"{subdomain}:ticket_vectors_gen:{ticket_id}", GENERATION_TTL)
+        for key, cached in zip(batch, redis.mget(batch)):
+            if not cached:
+                continue
+            data = json.loads(cached)
+            data['score'] = scores[key.rsplit(':', 1)[1]]
+            data['cached_at'] = int(time.time())
+            pipe.set(key, json.dumps(data), keepttl=True)
+            updated += 1
+        if not dry_run:
+            pipe.execute()
+    return updated
@@ -11,6 +11,9 @@ def create_blueprints():
     root = Blueprint('root', __name__)
     root.add_url_rule('/', 'index', root_obj.index)
     root.add_url_rule('/health', 'health', root_obj.health, methods=['GET'])
+    root.add_url_rule('/metrics', 'metrics', root_obj.metrics, methods=['GET'])
+    root.add_url_rule('/profiles', 'profiles', root_obj.profiles, methods=['GET'])
+    root.add_url_rule('/profiles/<filename>', 'profile', root_obj.profile, methods=['GET'])
 
     logger.debug("Initializing sentiment-checker routes")
     sentiment_checker_obj = SentimentChecker()
@@ -27,12 +30,15 @@ def create_blueprints():
     sentiment_checker.add_url_rule('/health', 'health', sentiment_checker_obj.health, methods=['GET'])
     
     # API routes
+    sentiment_checker.add_url_rule('/webhook', 'webhook', sentiment_checker_obj.webhook, methods=['POST'])
     sentiment_checker.add_url_rule('/analyze-comments', 'analyze_comments', sentiment_checker_obj.analyze_comments, methods=['POST'])
     sentiment_checker.add_url_rule('/get-ticket-vectors', 'get_ticket_vectors', sentiment_checker_obj.get_ticket_vectors, methods=['POST'])
     sentiment_checker.add_url_rule('/get-unsolved-tickets', 'get_unsolved_tickets', sentiment_checker_obj.get_unsolved_tickets, methods=['POST'])
     sentiment_checker.add_url_rule('/get-score', 'get_score', sentiment_checker_obj.get_score, methods=['POST'])
     sentiment_checker.add_url_rule('/get-scores', 'get_scores', sentiment_checker_obj.get_scores, methods=['POST'])
     sentiment_checker.add_url_rule('/check-namespace', 'check_namespace', sentiment_checker_obj.check_namespace, methods=['POST'])
+    sentiment_checker.add_url_rule('/get-comment-stats', 'get_comment_stats', sentiment_checker_obj.get_comment_stats, methods=['GET'])
+    sentiment_checker.add_url_rule('/get-aggregates', 'get_aggregates', sentiment_checker_obj.get_aggregates, methods=['GET'])
     sentiment_checker.add_url_rule('/get-ticket-count', 'get_ticket_count', sentiment_checker_obj.get_ticket_count, methods=['GET'])
     sentiment_checker.add_url_rule('/remove-ticket-from-cache', 'remove_ticket_from_cache', sentiment_checker_obj.remove_ticket_from_cache, methods=['POST'])
     return root, sentiment_checker
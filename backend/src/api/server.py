@@ -2,6 +2,8 @@ from datetime import timedelta
 from flask import Flask, render_template
 from flask_session import Session
 from flask_cors import CORS
+from config.logging_config import configure_logging
+from services.lifecycle import register_warmup, register_shutdown
 import dotenv
 import logging
 import os
@@ -9,13 +11,8 @@ import sys
 
 
 dotenv.load_dotenv()
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[logging.StreamHandler(sys.stdout)]
-)
+configure_logging()
 logger = logging.getLogger('sentiment_checker')
-logging.getLogger('pinecone_plugin_interface').setLevel(logging.CRITICAL)
 
 def create_app():
     app = Flask(__name__)
@@ -32,8 +29,34 @@ def create_app():
     from .routes import create_blueprints
     root_blueprint, sentiment_checker_blueprint = create_blueprints()
 
+    from services.auth_service import preload_jwt_keys
+    preload_jwt_keys()
+
+    # Per-worker warmup and shutdown, run from the gunicorn hooks in gunicorn.conf.py
+    from services.pinecone_service import PineconeService
+    from config.redis_config import RedisClient
+    from config.logging_config import stop_logging
+    from services.emotion_index import warm_emotion_index
+    from services.chunking import warm_tokenizer
+    from services.score_refresher import shutdown_refresher
+    from services.health_prober import start_health_prober, stop_health_prober
+    from .webhooks import start_webhook_dispatcher, stop_webhook_dispatcher
+    register_warmup(PineconeService.warm)
+    register_warmup(warm_tokenizer)
+    register_warmup(warm_emotion_index)
+    register_warmup(RedisClient.get_instance)
+    register_warmup(start_health_prober)
+    register_warmup(start_webhook_dispatcher)
+    register_shutdown(stop_logging)
+    register_shutdown(shutdown_refresher)
+    register_shutdown(stop_health_prober)
+    register_shutdown(stop_webhook_dispatcher)
+
     app.register_blueprint(root_blueprint)
     app.register_blueprint(sentiment_checker_blueprint)
+
+    from .commands import register_commands
+    register_commands(app)
     CORS(app, resources={r"/api/*": {"origins": "*"}}, supports_credentials=True)
     Session(app)
 
@@ -0,0 +1,163 @@
+"""
+Move a tenant to another Pinecone index or Redis shard.
+
+The tenant keeps being served while it moves. Its namespaces and keys are copied to the
+target while the old route still serves it. It is then pinned to the target, and the
+workers pick up the pin within TENANT_ROUTES_REFRESH seconds. Until they do, some of them
+still write to the source, so a second pass copies whatever is missing from the target.
+That pass never overwrites, because the target now has the newer data. Only then is the
+source copy deleted.
+
+Writes that land on the source between the catch-up pass and the delete are lost. They
+are recomputed when the tickets are next analyzed.
+"""
+from dataclasses import dataclass
+from typing import Iterable, List, Optional
+from redis.client import NEVER_DECODE
+from redis.exceptions import ResponseError
+from services.tenant_router import TENANT_ROUTES_REFRESH, TenantRoute, tenant_router
+import logging
+import time
+
+logger = logging.getLogger('shards')
+
+COPY_BATCH_SIZE = 100
+SCAN_COUNT = 1000
+
+
+@dataclass
+class MigrationStats:
+    vectors: int = 0
+    vectors_caught_up: int = 0
+    keys: int = 0
+    keys_caught_up: int = 0
+
+
+def tenant_namespaces(service, subdomain: str) -> List[str]:
+    """The tenant's namespaces in the service's index, for every embedding backend"""
+    stats = service.describe_index_stats()
+    return sorted(namespace for namespace, summary in stats.get('namespaces', {}).items()
+                  if namespace.split('__')[0] == subdomain and summary.get('vector_count', 0) > 0)
+
+
+def copy_namespace(source, target, namespace: str, batch_size: int = COPY_BATCH_SIZE,
+                   only_missing: bool = False) -> int:
+    """Copy a namespace's vectors between indexes; with only_missing, ids the target has are skipped"""
+    copied = 0
+    for ids in _batches(source.iter_vector_ids(namespace=namespace), batch_size):
+        if only_missing:
+            existing = target.fetch_vectors(ids, namespace=namespace, include_metadata=False)
+            ids = [id for id in ids if id not in existing]
+            if not ids:
+                continue
+        records = source.fetch_vectors(ids, namespace=namespace, include_values=True)
+        vectors = [{"id": record['id'], "values": list(record['values']), "metadata": dict(record['metadata'] or {})}
+                   for record in records.values() if record['values']]
+        if vectors:
+            target.index.upsert(vectors=vectors, namespace=namespace)
+        copied += len(vectors)
+    return copied
+
+
+def delete_namespace(service, namespace: str) -> None:
+    service.index.delete(delete_all=True, namespace=namespace)
+
+
+def copy_keys(source, target, subdomain: str, only_missing: bool = False) -> int:
+    """Copy a tenant's keys with their TTLs between Redis shards; with only_missing, existing keys are kept"""
+    copied = 0
+    for keys in _key_batches(source, subdomain):
+        pipe = source.pipeline(transaction=False)
+        for key in keys:
+            # Serialized values are binary, whatever the client decodes
+            pipe.execute_command('DUMP', key, **{NEVER_DECODE: True})
+            pipe.pttl(key)
+        dumped = pipe.execute()
+
+        pipe = target.pipeline(transaction=False)
+        restored = []
+        for key, value, ttl in zip(keys, dumped[::2], dumped[1::2]):
+            # Expired or deleted since the scan
+            if value is None or ttl == -2:
+                continue
+            args = ['RESTORE', key, max(ttl, 0), value]
+            pipe.execute_command(*(args if only_missing else args + ['REPLACE']))
+            restored.append(key)
+        for key, result in zip(restored, pipe.execute(raise_on_error=False)):
+            if isinstance(result, ResponseError):
+                if 'BUSYKEY' not in str(result):
+                    raise result
+            else:
+                copied += 1
+    return copied
+
+
+def delete_keys(client, subdomain: str) -> int:
+    deleted = 0
+    for keys in _key_batches(client, subdomain):
+        deleted += client.delete(*keys)
+    return deleted
+
+
+def migrate_tenant(subdomain: str, target: TenantRoute, service_factory, batch_size: int = COPY_BATCH_SIZE,
+                   keep_source: bool = False, wait: Optional[float] = None, echo=logger.info) -> MigrationStats:
+    """
+    Copy a tenant to the target route, pin it there, copy what was written to the source in
+    the meantime, then delete the source copy. service_factory(index_name) returns a
+    PineconeService for an index.
+    """
+    source = tenant_router.route(subdomain)
+    stats = MigrationStats()
+    move_index = source.index != target.index
+    move_redis = source.redis != target.redis
+    source_service = service_factory(source.index)
+    target_service = service_factory(target.index)
+    source_redis = tenant_router.redis(source.redis)
+    target_redis = tenant_router.redis(target.redis)
+
+    namespaces = tenant_namespaces(source_service, subdomain) if move_index else []
+    for namespace in namespaces:
+        copied = copy_namespace(source_service, target_service, namespace, batch_size)
+        stats.vectors += copied
+        echo(f"Copied {copied} vectors of {namespace} from {source.index} to {target.index}")
+    if move_redis:
+        stats.keys = copy_keys(source_redis, target_redis, subdomain)
+        echo(f"Copied {stats.keys} keys from Redis shard {source.redis} to {target.redis}")
+
+    tenant_router.pin(subdomain, target.index, target.redis)
+    wait = TENANT_ROUTES_REFRESH if wait is None else wait
+    echo(f"Pinned {subdomain} to {target.index}/{target.redis}; waiting {wait:g}s for workers to pick it up")
+    time.sleep(wait)
+
+    for namespace in tenant_namespaces(source_service, subdomain) if move_index else []:
+        stats.vectors_caught_up += copy_namespace(source_service, target_service, namespace, batch_size,
+                                                  only_missing=True)
+    if move_redis:
+        stats.keys_caught_up = copy_keys(source_redis, target_redis, subdomain, only_missing=True)
+    echo(f"Caught up {stats.vectors_caught_up} vectors and {stats.keys_caught_up} keys written during the switch")
+
+    if keep_source:
+        echo(f"Kept the copy of {subdomain} in {source.index}/{source.redis}")
+    else:
+        for namespace in tenant_namespaces(source_service, subdomain) if move_index else []:
+            delete_namespace(source_service, namespace)
+        deleted = delete_keys(source_redis, subdomain) if move_redis else 0
+        echo(f"Deleted {subdomain}'s namespaces from {source.index} and {deleted} keys from {source.redis}")
+    logger.info(f"Migrated {subdomain} from {source} to {target}: {stats}")
+    return stats
+
+
+def _batches(pages: Iterable[List[str]], size: int):
+    batch = []
+    for page in pages:
+        batch.extend(page)
+        while len(batch) >= size:
+            yield batch[:size]
+            batch = batch[size:]
+    if batch:
+        yield batch
+
+
+def _key_batches(client, subdomain: str):
+    keys = client.scan_iter(match=f"{subdomain}:*", count=SCAN_COUNT)
+    return _batches(([key] for key in keys), SCAN_COUNT)
@@ -1,28 +1,110 @@
 from typing import Tuple, Dict, Any, Optional, List, Union
-from flask import Response, jsonify, request, render_template, make_response
+from flask import Response, jsonify, request, render_template, make_response, send_from_directory
 from datetime import datetime
 from bs4 import BeautifulSoup as bs
 from services.auth_service import init_required
+from services.profiler import PROFILE_TOKEN, profile_file, profiled, recent_profiles
 from services.pinecone_service import PineconeService
-from models import emotions, TicketInput, CommentInput, TicketResponse, CommentResponse
-from utils import check_element, return_render, return_response
+from models import emotions, TicketInput, CommentInput, TicketResponse, CommentResponse, TicketSummary
+from models.metadata import build_comment_metadata, parse_comment_metadata
+from utils import check_element, get_subdomain, return_render, return_response
 import numpy as np
 import logging
 import os
 import math
+import threading
 from config.redis_config import RedisClient, RedisConfigError
+from config.logging_config import COMMENT_LOGGER_NAME
+from services.metrics_service import (
+    bind_labels, record_comment_chunks, record_score_cache, record_webhook_event, render_metrics, track_stage
+)
+from services.lifecycle import is_draining
+from services.emotion_index import get_emotion_index
+from services.comment_cleaner import CommentCleaner
+from services.circuit_breaker import CircuitOpenError, is_degraded
+from services.score_refresher import SCORE_SOFT_TTL, schedule_refresh
+from services.health_prober import get_health_snapshot, health_prober
+from services.emotion_scoring import EmotionProfile, emotion_profile, encode_profile, score_profile
+from services.aggregates import SentimentAggregates
+from services.scheduler import bind_priority
+from services.tenant_router import get_tenant_redis
+from .webhooks import (
+    SIGNATURE_HEADER, SIGNATURE_TIMESTAMP_HEADER, WebhookQueue, ticket_from_event, verify_signature, webhook_secret
+)
 import json
+import time
 
 logger = logging.getLogger('sentiment_checker')
+comment_logger = logging.getLogger(COMMENT_LOGGER_NAME)
+
+# get-ticket-vectors projections, as pydantic include specs for a TicketResponse
+TICKET_VECTOR_FIELDS = {
+    'scores': {'id': True, 'score': True, 'status': True, 'updated_at': True, 'created_at': True,
+               'comments': {'__all__': {'id', 'created_at', 'emotion_score'}}},
+    'full': None
+}
+
+# Caches listed comments only while each ticket's invalidation generation is the one read
+# before listing, so a slow read can't put back a list missing a comment stored meanwhile.
+# KEYS: cache key, generation key per ticket. ARGV: ttl, then generation and value per ticket.
+CACHE_IF_CURRENT_SCRIPT = """
+local written = 0
+for i = 1, #KEYS, 2 do
+    local n = (i + 1) / 2
+    if (redis.call('GET', KEYS[i + 1]) or '') == ARGV[n * 2] then
+        redis.call('SET', KEYS[i], ARGV[n * 2 + 1], 'EX', ARGV[1])
+        written = written + 1
+    end
+end
+return written
+"""
+
+
+def _ticket_order(ticket_id: str) -> Tuple[int, Union[int, str]]:
+    return (1, int(ticket_id)) if ticket_id.isdigit() else (0, ticket_id)
+
 
 class Root: 
     def index(self):
         return render_template('root/index.tmpl')
 
     def health(self):
+        if is_draining():
+            return jsonify({'status': 'draining'}), 503
         return jsonify({'status': 'healthy'}), 200   
 
-class SentimentChecker:
+    def metrics(self):
+        """Prometheus text exposition of the pipeline stage metrics"""
+        token = os.environ.get('METRICS_TOKEN')
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            return jsonify({'error': 'Authentication required'}), 401
+        body, content_type = render_metrics()
+        return Response(body, status=200, content_type=content_type)
+
+    def profiles(self):
+        """Summaries of recent request profiles across the cluster, newest first"""
+        if not PROFILE_TOKEN or request.headers.get('Authorization') != f'Bearer {PROFILE_TOKEN}':
+            return jsonify({'error': 'Authentication required'}), 401
+        try:
+            limit = int(request.args.get('limit', 20))
+        except ValueError:
+            return jsonify({'error': 'limit must be a number'}), 400
+        try:
+            return jsonify({'profiles': recent_profiles(max(1, limit))}), 200
+        except Exception as e:
+            logger.error(f"Error listing profiles: {e}")
+            return jsonify({'error': str(e)}), 500
+
+    def profile(self, filename: str):
+        """A profile's .pstats, .collapsed or .json file, if this worker's host wrote it"""
+        if not PROFILE_TOKEN or request.headers.get('Authorization') != f'Bearer {PROFILE_TOKEN}':
+            return jsonify({'error': 'Authentication required'}), 401
+        found = profile_file(filename)
+        if found is None:
+            return jsonify({'error': f"Profile file {filename} not found on this host"}), 404
+        return send_from_directory(*found, as_attachment=True)
+
+class SentimentChecker(threading.local):
     """
     A class for handling the Sentiment Checker application.
 
@@ -30,6 +112,10 @@ class SentimentChecker:
     calculate sentiment scores, and serve the entry point for the Sentiment Checker
     Zendesk application.
 
+    One instance serves every request, and init_required stores per-request
+    state (subdomain, payload, services) on it, so that state is kept per
+    thread to stay correct under threaded servers.
+
     Methods are organized in the following groups:
     1. Initialization and Entry Points
     2. Analysis Methods
@@ -41,12 +127,60 @@ class SentimentChecker:
     
     def __init__(self):
         self.logger = logger
+        self.comment_logger = comment_logger
         self.templates = 'sentiment-checker'
         self.debug_mode = os.environ.get('SENTIMENT_CHECKER_DEBUG') == 'true'
-        self.data = None
+        self.payload = None
+
+    @property
+    def ticket_data(self) -> List[TicketInput]:
+        """Full ticket models, validated from the request body on first access"""
+        return self.payload.tickets if self.payload else []
+
+    def bind_tenant(self, subdomain: str, endpoint: str = 'background') -> None:
+        """Set up this thread's services for a tenant outside a request, as init_required does for one"""
+        self.subdomain = subdomain
+        self.remote_addr = endpoint
+        self.payload = None
+        bind_labels(endpoint, subdomain)
+        bind_priority(endpoint, subdomain)
+        self.pinecone_service = PineconeService(subdomain)
+        try:
+            self.redis = get_tenant_redis(subdomain)
+        except RedisConfigError as e:
+            self.logger.error(f"Error connecting to Redis: {e}")
+            self.redis = None
+        self.cache_ttl = 3600
 
     # Private methods
-    def _analyze(self, ticket: TicketInput, comment: CommentInput) -> CommentResponse:
+    def _query_emotions(self, embedding: List[float], top_k: int) -> List[Any]:
+        """Closest emotion reference vectors, from the worker's in-process copy when enabled"""
+        try:
+            emotion_index = get_emotion_index(self.pinecone_service)
+        except Exception as e:
+            self.logger.error("Error loading emotion index, querying Pinecone: %s", e)
+            emotion_index = None
+        if emotion_index is not None and emotion_index.dimension == len(embedding):
+            return emotion_index.query(embedding, top_k=top_k)
+        return self.pinecone_service.query_vectors(embedding,
+                                                   namespace=self.pinecone_service.emotions_namespace,
+                                                   top_k=top_k,
+                                                   include_metadata=True,
+                                                   include_values=False)
+
+    def _score_emotions(self, emotion_matches: List[Any]) -> Tuple[float, EmotionProfile]:
+        """
+        Similarity-weighted mean of the emotions present in the nearest reference examples,
+        in [-10, 10], and the per-emotion profile it was computed from
+        """
+        profile = emotion_profile(emotion_matches)
+        for emotion_name in profile:
+            if emotion_name not in emotions:
+                self.logger.error("Emotion \"%s\" not found in emotions dictionary. Request remote addr: %s", emotion_name, self.remote_addr)
+        return score_profile(profile), profile
+
+    def _analyze(self, ticket: TicketInput, comment: CommentInput,
+                 stored: Optional[Dict[str, Any]] = None) -> CommentResponse:
         """
         Analyze a single comment and store the result in the database.
         
@@ -54,26 +188,30 @@ class SentimentChecker:
             id: The ID of the ticket containing the comment
             comment: Dict containing comment data with format:
                     {'id': str, 'text': str, 'created_at': str}
+            stored: The ticket's existing vectors by id, when already fetched for all its comments
                     
         Returns:
             Dict containing the analysis results
         """
-        self.logger.debug(f"Analyzing comment {comment.id} for ticket {ticket.id}")
+        self.comment_logger.debug("Analyzing comment %s for ticket %s", comment.id, ticket.id)
         if not comment.body:
-            self.logger.warning(f"Missing body in comment {comment.id} for ticket {ticket.id}")
-            self.logger.warning(f"Comment data: {comment.model_dump()}")
+            self.logger.warning("Missing body in comment %s for ticket %s", comment.id, ticket.id)
+            if self.comment_logger.isEnabledFor(logging.DEBUG):
+                self.comment_logger.debug("Comment data: %s", comment.model_dump())
             return None
         timestamp = self._convert_date_to_timestamp(comment.created_at)
-        body = bs(comment.body, 'html.parser').get_text()
-        body = ' '.join(body.split())
         vector_id = f"{ticket.id}#{comment.id}"
-        try:
-            existing_vector = self.pinecone_service.fetch_vector(vector_id)
-        except Exception as e:
-            self.logger.debug(f"Error fetching vector {vector_id}: {e}, request remote addr: {self.remote_addr}")
-            existing_vector = None
+        if stored is not None:
+            existing_vector = stored.get(vector_id)
+        else:
+            try:
+                existing_vector = self.pinecone_service.fetch_vector(vector_id, namespace=self.pinecone_service.namespace)
+            except Exception as e:
+                self.comment_logger.debug("Error fetching vector %s: %s, request remote addr: %s", vector_id, e, self.remote_addr)
+                existing_vector = None
         if existing_vector:
-            self.logger.info(f"Existing vector found for comment {comment.id}: {existing_vector}, request remote addr: {self.remote_addr}")
+            self.comment_logger.info("Existing vector found for comment %s, request remote addr: %s", comment.id, self.remote_addr)
+            self.comment_logger.debug("Existing vector for comment %s: %s", comment.id, existing_vector)
             if 'metadata' in existing_vector and 'emotion_score' in existing_vector['metadata']:
                 response = CommentResponse(
                     **comment.model_dump(),
@@ -81,52 +219,42 @@ class SentimentChecker:
                 )
                 return response
             else:
-                self.logger.debug(f"No metadata or emotion_score found for vector {vector_id}, request remote addr: {self.remote_addr}")
+                self.comment_logger.debug("No metadata or emotion_score found for vector %s, request remote addr: %s", vector_id, self.remote_addr)
         
-        # If no existing vector or invalid metadata, create new analysis
-        embedding = self.pinecone_service.get_embedding(body)
-        emotion_matches = self.pinecone_service.query_vectors(embedding, 
-                                                              namespace='emotions', 
-                                                              top_k=100, 
-                                                              include_metadata=True, 
-                                                              include_values=False)
+        # If no existing vector or invalid metadata, create new analysis. Cleaning learns
+        # signatures and counts stats, so it runs only for comments that get embedded
+        with track_stage('html_parse'):
+            cleaned = CommentCleaner(self.redis, self.subdomain).clean(comment.body)
+            body = cleaned.text
+        if cleaned.removed:
+            self.comment_logger.debug("Stripped %s from comment %s, %s of %s tokens kept", cleaned.removed, comment.id,
+                                      cleaned.cleaned_tokens, cleaned.original_tokens)
+        embedding, chunk_count = self.pinecone_service.get_chunked_embedding(body)
+        record_comment_chunks(chunk_count)
+        if chunk_count > 1:
+            self.comment_logger.debug("Comment %s embedded as %s chunks", comment.id, chunk_count)
+        with track_stage('emotion_query'):
+            emotion_matches = self._query_emotions(embedding, top_k=100)
         
-        self.logger.debug(f"Emotion matches: {emotion_matches}, request remote addr: {self.remote_addr}")
-        emotion_sum = 0
-        matched_count = 0
+        self.comment_logger.debug("Emotion matches: %s, request remote addr: %s", emotion_matches, self.remote_addr)
+        emotion_score, profile = self._score_emotions(emotion_matches)
         
-        for match in emotion_matches:
-            for emotion_name, emotion_present in match['metadata'].items():
-                if emotion_name not in ['text', 'timestamp']:
-                    if emotion_name in emotions:
-                        if emotion_present:
-                            emotion_sum += emotions[emotion_name].score * match['score']
-                            matched_count += 1
-                    else:
-                        self.logger.error(f"Emotion \"{emotion_name}\" not found in emotions dictionary. Request remote addr: {self.remote_addr}")
-        self.logger.debug(f"Emotion sum for comment {comment.id}: {emotion_sum}, request remote addr: {self.remote_addr}")
+        self.comment_logger.debug("Emotion score for comment %s: %s, request remote addr: %s", comment.id, emotion_score, self.remote_addr)
         
-        if matched_count > 0:   
-            emotion_score = emotion_sum / matched_count
-        else:
-            emotion_score = 0
-            
-        emotion_score = max(min(emotion_score, 10), -10)
-        
-        self.logger.debug(f"Emotion score for comment {comment.id}: {emotion_score}, request remote addr: {self.remote_addr}")
-        
-        metadata = {
-            'body': comment.body,
-            'timestamp': timestamp,
-            'emotion_score': emotion_score,
-            'author_id': comment.author_id
-        }
+        metadata = build_comment_metadata(ticket.id, comment.body, emotion_score, timestamp,
+                                          author_id=comment.author_id, chunks=chunk_count,
+                                          emotion_profile=encode_profile(profile))
         
         upsert_response = self.pinecone_service.upsert_vector(vector_id, embedding, metadata)
         
         if upsert_response.get('upserted_count', 0) == 0:
-            self.logger.error(f"No vector upserted for comment {comment.id}, upsert response: {upsert_response}, request remote addr: {self.remote_addr}")
+            self.logger.error("No vector upserted for comment %s, upsert response: %s, request remote addr: %s", comment.id, upsert_response, self.remote_addr)
             raise Exception(f'No vector upserted for comment {comment.id}')
+
+        self._invalidate_ticket_vectors(ticket.id)
+        assignee_id, requester_id = self._ticket_people(ticket, comment)
+        SentimentAggregates(self.redis, self.subdomain).record(emotion_score, timestamp, assignee_id, requester_id,
+                                                               comment.author_id)
             
         response = CommentResponse(
             **comment.model_dump(),
@@ -135,6 +263,66 @@ class SentimentChecker:
         return response
 
 
+    def _analyze_ticket_comments(self, ticket: TicketInput) -> List[Dict[str, Any]]:
+        """Analyze each of the ticket's comments, skipping ones that fail, as results for _process_comment_results"""
+        comment_results = []
+        # One fetch tells which comments are already scored; if it fails each comment checks on its own
+        try:
+            stored = self.pinecone_service.fetch_vectors([f"{ticket.id}#{comment.id}" for comment in ticket.comments or []])
+        except Exception as e:
+            self.comment_logger.debug("Error fetching vectors of ticket %s: %s, request remote addr: %s", ticket.id, e, self.remote_addr)
+            stored = None
+        for comment in ticket.comments or []:
+            self.comment_logger.info("Analyzing comment %s for ticket %s", comment.id, ticket.id)
+            try:
+                result = self._analyze(ticket, comment, stored)
+                if result:
+                    comment_results.append({
+                        'id': comment.id,
+                        'timestamp': self._convert_date_to_timestamp(result.created_at),
+                        'emotion_score': result.emotion_score
+                    })
+                    self.comment_logger.debug("Analyzed comment %s for ticket %s: %s", comment.id, ticket.id, result)
+                else:
+                    self.logger.warning("No result from analyze for comment %s", comment.id)
+            except Exception as e:
+                self.logger.error("Error analyzing comment %s: %s", comment.id, e)
+                continue
+        return comment_results
+
+    def analyze_queued_ticket(self, subdomain: str, ticket: TicketInput) -> List[CommentInput]:
+        """
+        Analyze the comments a webhook queued for a ticket and re-score the ticket from them
+        and the comments already stored. Runs on the webhook pool; returns the comments that
+        failed and should be queued again.
+        """
+        self.bind_tenant(subdomain, 'webhook')
+        comment_results = self._analyze_ticket_comments(ticket)
+        analyzed = {result['id'] for result in comment_results}
+        failed = [comment for comment in ticket.comments or [] if comment.id not in analyzed and comment.body]
+        if not comment_results:
+            return failed
+
+        # Only the ticket's other stored comments are fetched
+        results = self._complete_comment_results({str(ticket.id): comment_results})[str(ticket.id)]
+
+        # Events may leave out ticket fields the cached entry already has
+        cached = self._get_cached_ticket_data(str(ticket.id)) or {}
+        missing = {field: cached[field] for field in ('status', 'created_at', 'updated_at')
+                   if getattr(ticket, field) is None and cached.get(field) is not None}
+        if missing:
+            ticket = ticket.model_copy(update=missing)
+        self._process_comment_results(ticket, results)
+        self.logger.info(f"Analyzed {len(comment_results)} queued comments for ticket {ticket.id} of {subdomain}")
+        return failed
+
+    @staticmethod
+    def _ticket_people(ticket: TicketInput, comment: CommentInput) -> Tuple[Any, Any]:
+        """(assignee id, requester id) for a comment, from the comment or else the ticket"""
+        assignee_id = comment.ticket_assignee_id or (ticket.assignee or {}).get('id')
+        requester_id = comment.ticket_requestor_id or (ticket.requestor or {}).get('id')
+        return assignee_id, requester_id
+
     def _cache_ticket_data(self, id: str, data: Dict[str, Any], ttl: int = 3600) -> None:
         """Cache ticket data including score and timestamps"""
         if not self.redis:
@@ -151,20 +339,125 @@ class SentimentChecker:
                 data['requestor'] = None
             if 'assignee' not in data:
                 data['assignee'] = None
-            cache_key = self._get_cache_key(id)
-            self.redis.set(cache_key, json.dumps(data), ex=ttl)
-            self.logger.debug(f"Cached data for ticket {id}: {data}")
-            
-            # Maintain set of unsolved tickets
-            if data.get('status', '').lower() in self.UNSOLVED_STATUSES:
-                unsolved_key = f"{self.subdomain}:unsolved_tickets"
-                self.redis.sadd(unsolved_key, id)
-            else:
-                self.redis.srem(f"{self.subdomain}:unsolved_tickets", id)
+            # get_scores serves entries older than SCORE_SOFT_TTL while refreshing them
+            data['cached_at'] = int(time.time())
+            cache_key = self._get_cache_key("ticket", id)
+            with track_stage('redis_set'):
+                self.redis.set(cache_key, json.dumps(data), ex=ttl)
+                self.logger.debug("Cached data for ticket %s: %s", id, data)
+                
+                # Maintain set of unsolved tickets
+                if (data.get('status') or '').lower() in self.UNSOLVED_STATUSES:
+                    unsolved_key = f"{self.subdomain}:unsolved_tickets"
+                    self.redis.sadd(unsolved_key, id)
+                else:
+                    self.redis.srem(f"{self.subdomain}:unsolved_tickets", id)
                 
         except Exception as e:
             self.logger.error(f"Error caching data for ticket {id}: {e}")
 
+    def _calculate_score(self, tickets: List[Union[TicketInput, TicketSummary]]) -> float:
+        """
+        Calculate the weighted score of one or more tickets from their stored comment vectors.
+        Only ticket ids are used, so lightweight ticket summaries are enough.
+        """
+        self.logger.info(f"Processing {len(tickets)} tickets for score calculation, request remote addr: {self.remote_addr}")
+        return self._weighted_score(self._complete_comment_results({str(ticket.id): [] for ticket in tickets}))
+
+    def _complete_comment_results(self, known: Dict[str, List[Dict[str, Any]]]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Add each ticket's stored comments that aren't among its known results, as
+        {'id', 'timestamp', 'emotion_score'}. The tickets are listed concurrently and only
+        the comments not already in memory are fetched.
+        """
+        vector_ids = self.pinecone_service.list_ticket_vector_ids(list(known))
+        missing = []
+        for ticket_id, ids in vector_ids.items():
+            have = {str(result['id']) for result in known[ticket_id]}
+            missing.extend(vector_id for vector_id in ids if vector_id.split('#', 1)[1] not in have)
+        records = self.pinecone_service.fetch_vectors(missing) if missing else {}
+
+        results = {ticket_id: list(comment_results) for ticket_id, comment_results in known.items()}
+        for vector_id in missing:
+            record = records.get(vector_id)
+            metadata = parse_comment_metadata(record['metadata'], vector_id) if record else None
+            if metadata is None or metadata.emotion_score is None:
+                self.logger.warning("No metadata or emotion_score found for vector %s", vector_id)
+                continue
+            ticket_id, comment_id = vector_id.split('#', 1)
+            results[ticket_id].append({
+                'id': comment_id,
+                'timestamp': metadata.timestamp,
+                'emotion_score': metadata.emotion_score
+            })
+        return results
+
+    def _weighted_score(self, results: Dict[str, List[Dict[str, Any]]]) -> float:
+        """Combined score of tickets' comment results: each ticket's comments decay from its newest one"""
+        total_weighted_score = 0
+        total_weight = 0
+        lambda_factor = 1.0 # Adjust this value to control the decay rate
+        all_scores = []
+
+        for ticket_id, comment_results in results.items():
+            if not comment_results:
+                self.logger.warning(f"No vectors found for ticket {ticket_id}")
+                continue
+            sorted_results = sorted(comment_results, key=lambda x: x['timestamp'], reverse=True)
+            newest_timestamp = sorted_results[0]['timestamp']
+            self.logger.debug("Newest timestamp: %s", newest_timestamp)
+
+            for result in sorted_results:
+                time_diff = (newest_timestamp - result['timestamp']) / (24 * 3600)  # Convert to days
+                weight = math.exp(-lambda_factor * time_diff)
+                score = result['emotion_score']
+                total_weighted_score += score * weight
+                total_weight += weight
+                all_scores.append(score)
+                self.comment_logger.info("Vector %s#%s: score=%s, weight=%s", ticket_id, result['id'], score, weight)
+
+        if total_weight > 0:
+            weighted_score = total_weighted_score / total_weight
+        else:
+            weighted_score = 0
+        
+        if all_scores:
+            all_scores_np = np.array(all_scores)
+            std_dev = np.std(all_scores_np)
+            most_recent_score = all_scores[0]
+            self.logger.info(f"Most recent score: {most_recent_score}, weighted score: {weighted_score}, std_dev: {std_dev}")
+
+            if most_recent_score < weighted_score and abs(weighted_score - most_recent_score) > std_dev:
+                weighted_score = most_recent_score
+            elif most_recent_score > weighted_score and abs(most_recent_score - weighted_score) > std_dev:
+                weighted_score = most_recent_score
+            
+        weighted_score = max(min(weighted_score, 1), -1)
+        
+        self.logger.info(f"Calculated weighted score for {len(results)} tickets: {weighted_score}, request remote addr: {self.remote_addr}")
+        return weighted_score
+
+    def _score_ticket(self, ticket: TicketSummary) -> Dict[str, Any]:
+        """Compute a ticket's score and the data cached alongside it"""
+        return {
+            'score': self._calculate_score([ticket]),
+            'status': ticket.status,
+            'updated_at': ticket.updated_at,
+            'created_at': ticket.created_at,
+            'requestor': ticket.requestor,
+            'assignee': ticket.assignee
+        }
+
+    def _refresh_score(self, subdomain: str, ticket: TicketSummary) -> None:
+        """Recompute and cache a stale score; runs on the score refresh pool"""
+        self.bind_tenant(subdomain, 'score_refresh')
+        self._cache_ticket_data(ticket.id, self._score_ticket(ticket))
+        record_score_cache('refreshed')
+
+    def _schedule_score_refresh(self, ticket: TicketSummary) -> bool:
+        lock_key = self._get_cache_key("score_refresh", ticket.id)
+        return schedule_refresh(self.redis, lock_key, self._refresh_score, self.subdomain, ticket)
+
     def _convert_date_to_timestamp(self, date_str: Union[str, int]) -> int:
         """Convert ISO date string to Unix timestamp"""
         try:
@@ -192,7 +485,8 @@ class SentimentChecker:
     def _get_cached_scores(self) -> dict:
         """Get scores from cache"""
         cache_key = self._get_cache_key("sentiment_scores")
-        cached_data = self.redis.get(cache_key)
+        with track_stage('redis_get'):
+            cached_data = self.redis.get(cache_key)
         if cached_data:
             return json.loads(cached_data)
         return {}
@@ -202,11 +496,12 @@ class SentimentChecker:
         """Get ticket data from cache"""
         try:
             cache_key = self._get_cache_key("ticket", id)
-            cached_data = self.redis.get(cache_key)
+            with track_stage('redis_get'):
+                cached_data = self.redis.get(cache_key)
             if cached_data:
-                self.logger.debug(f"Cache hit for ticket {id}")
+                self.logger.debug("Cache hit for ticket %s", id)
                 return json.loads(cached_data)
-            self.logger.debug(f"Cache miss for ticket {id}")
+            self.logger.debug("Cache miss for ticket %s", id)
             return None
         except Exception as e:
             self.logger.error(f"Error getting cached data for ticket {id}: {e}")
@@ -276,14 +571,14 @@ class SentimentChecker:
                 calculated_score = max(min(calculated_score / 10, 1), -1)
                 # Store ticket metadata
                 updated_at = None
-                check, element_type = check_element(ticket, 'updated_at')
+                check, element_type = check_element(ticket, 'updated_at', (str, int))
                 if check:
                     if element_type == 'dict':
                         updated_at = self._convert_date_to_timestamp(ticket.updated_at)
                     elif element_type == 'object':
                         updated_at = self._convert_date_to_timestamp(getattr(ticket, 'updated_at'))
                 created_at = None
-                check, element_type = check_element(ticket, 'created_at')
+                check, element_type = check_element(ticket, 'created_at', (str, int))
                 if check:
                     if element_type == 'dict':
                         created_at = self._convert_date_to_timestamp(ticket.created_at)
@@ -305,14 +600,32 @@ class SentimentChecker:
 
     def _remove_ticket_from_cache(self, id: str):
         """Remove a ticket from cache"""
-        cache_key = self._get_cache_key("ticket", id)
-        self.redis.delete(cache_key)
+        self.redis.delete(self._get_cache_key("ticket", id))
+        self._invalidate_ticket_vectors(id)
         self.logger.info(f"Removed ticket {id} from cache")
 
+    def _invalidate_ticket_vectors(self, id: str) -> None:
+        """
+        Drop the ticket's cached comments once a comment of it is stored or re-scored, and
+        bump its generation so a read already in flight doesn't cache the old list
+        """
+        if not self.redis:
+            return
+        try:
+            generation_key = self._get_cache_key("ticket_vectors_gen", id)
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.incr(generation_key)
+            pipe.expire(generation_key, self.cache_ttl)
+            pipe.delete(self._get_cache_key("ticket_vectors", id))
+            pipe.execute()
+        except Exception as e:
+            self.logger.error(f"Error invalidating cached vectors for ticket {id}: {e}")
+
     def _update_cache(self, scores: dict):
         """Update the cache with new scores"""
         cache_key = self._get_cache_key("sentiment_scores")
-        self.redis.set(cache_key, json.dumps(scores), ex=self.cache_ttl)
+        with track_stage('redis_set'):
+            self.redis.set(cache_key, json.dumps(scores), ex=self.cache_ttl)
 
     # Entry Points
     @init_required
@@ -367,33 +680,25 @@ class SentimentChecker:
 
     # Analysis Methods
     @init_required
+    @profiled
     def analyze_comments(self) -> Tuple[Response, int]:
         """Analyze comments for sentiment."""
         self.logger.info(f"Received request for analyze_comments")
         
         all_results = []
         self.logger.info(f"Processing {len(self.ticket_data)} tickets for analysis, request remote addr: {self.remote_addr}")
+        # Scores of every comment in the request, just computed or already stored
+        known = {str(ticket.id): [] for ticket in self.ticket_data}
         for ticket in self.ticket_data:
             try:
                 if not ticket.comments:
                     self.logger.warning(f"Missing comments in request data for ticket {ticket.id}")
                     continue
                 # Process comments and get sentiment
-                comment_results = []
-                for comment in ticket.comments:
-                    self.logger.info(f"Analyzing comment {comment.id} for ticket {ticket.id}")
-                    try:
-                        result = self._analyze(ticket, comment)
-                        if result:
-                            comment_results.append(result)
-                            self.logger.debug(f"Analyzed comment {comment.id} for ticket {ticket.id}: {result}")
-                        else:
-                            self.logger.warning(f"No result from analyze for comment {comment.id}")
-                    except Exception as e:
-                        self.logger.error(f"Error analyzing comment {comment.id}: {e}")
-                        continue
+                comment_results = self._analyze_ticket_comments(ticket)
                 if not len(comment_results) > 0:
                     continue
+                known[str(ticket.id)].extend(comment_results)
                 # Calculate overall ticket score from comment scores
                 processed_comment_results = self._process_comment_results(ticket, comment_results)
                 self.logger.info(f"Processed comment results for ticket {ticket.id}: {processed_comment_results}")
@@ -401,32 +706,79 @@ class SentimentChecker:
             except Exception as e:
                 self.logger.error(f"Error processing ticket {ticket.id}: {e}")
                 return jsonify({'error': f"Error processing ticket {ticket.id}: {str(e)}"}), 500
-        weighted_score = self.get_score(tickets=self.ticket_data).get_json().get('score')
+        # Pinecone is only read for stored comments the request didn't include
+        weighted_score = self._weighted_score(self._complete_comment_results(known))
         return jsonify({'results': len(all_results), 'weighted_score': weighted_score}), 200
 
-    
+
+    def webhook(self) -> Tuple[Response, int]:
+        """
+        Accept a signed Zendesk webhook for a new comment and queue it for analysis. The
+        tenant comes from the X-Zendesk-Subdomain header or ?subdomain= on the webhook URL.
+        Zendesk retries deliveries that fail with a 5xx.
+        """
+        subdomain, error = get_subdomain(request)
+        if error:
+            return return_response(error[0]), error[1]
+        try:
+            redis = RedisClient.get_instance()
+        except RedisConfigError as e:
+            self.logger.error(f"Error connecting to Redis: {e}")
+            return return_response({'error': 'Queue unavailable'}), 503
+        bind_labels(request.endpoint, subdomain)
+
+        body = request.get_data(cache=True)
+        if not verify_signature(webhook_secret(redis, subdomain), body, request.headers.get(SIGNATURE_HEADER),
+                                request.headers.get(SIGNATURE_TIMESTAMP_HEADER)):
+            self.logger.warning(f"Rejected webhook with invalid signature for {subdomain}, "
+                                f"request remote addr: {request.headers.get('X-Forwarded-For', request.remote_addr)}")
+            record_webhook_event('rejected')
+            return return_response({'error': 'Invalid signature'}), 401
+        try:
+            ticket = ticket_from_event(json.loads(body), request.headers.get(SIGNATURE_TIMESTAMP_HEADER))
+        except Exception as e:
+            self.logger.warning(f"Unreadable webhook body for {subdomain}: {e}")
+            record_webhook_event('invalid')
+            return return_response({'error': f"Unreadable webhook body: {e}"}), 400
+        if not ticket.comments:
+            record_webhook_event('ignored')
+            return return_response({'queued': 0}), 200
+        try:
+            due = WebhookQueue(redis).enqueue(subdomain, ticket)
+        except Exception as e:
+            self.logger.error(f"Error queueing webhook for ticket {ticket.id} of {subdomain}: {e}")
+            return return_response({'error': 'Queue unavailable'}), 503
+        record_webhook_event('queued')
+        return return_response({'queued': len(ticket.comments), 'due_at': due}), 202
+
     @init_required
     def check_namespace(self):
         """Check if a namespace exists in Pinecone for this tenant"""
         try:
-            data = request.get_json()
-            subdomain = data.get('subdomain')
+            subdomain = self.payload.data.get('subdomain')
         except Exception as e:
             self.logger.error(f"Error getting subdomain: {str(e)}")
             return jsonify({'error': str(e)}), 500
-        # Check if namespace exists in Pinecone
-        namespaces = self.pinecone_service.describe_index_stats()
-        exists = subdomain in namespaces.get('namespaces', {})
-        empty = namespaces.get('namespaces', {}).get(subdomain, {}).get('vector_count', 0) == 0
-        if exists and empty:
-            exists = False
+        # Answered from the health prober's index stats, under the active embedding backend's key
+        namespace = self.pinecone_service.embedder.namespace(subdomain)
+        exists = health_prober.namespace_count(namespace) > 0
         return jsonify({'exists': exists})
 
+    @init_required
+    def get_comment_stats(self) -> Tuple[Response, int]:
+        """Quote/signature stripping totals for this tenant, including estimated tokens saved"""
+        try:
+            stats = CommentCleaner(self.redis, self.subdomain).stats()
+        except Exception as e:
+            self.logger.error(f"Error getting comment stats: {e}")
+            return return_response({'error': str(e)}), 500
+        return return_response(stats), 200
+
     @init_required
     def remove_ticket_from_cache(self):
         """Remove a ticket from cache"""
         self.logger.info(f"Received request for remove_ticket_from_cache, request remote addr: {self.remote_addr}")
-        for ticket in self.ticket_data:   
+        for ticket in self.payload.ticket_summaries:
             self._remove_ticket_from_cache(ticket.id)
         return jsonify({'message': 'Tickets removed from cache'}), 200
 
@@ -442,7 +794,7 @@ class SentimentChecker:
                 continue
             
             existing_vectors = self.pinecone_service.list_ticket_vectors(ticket.id)
-            existing_commentIds = set(vector['id'].split('#')[1] for vector in existing_vectors)
+            existing_commentIds = set(vector_id.split('#')[1] for vector_id in existing_vectors)
             new_comments = [comment for comment in ticket.comments 
                            if str(comment.commentId) not in existing_commentIds]
             
@@ -485,176 +837,190 @@ class SentimentChecker:
     # Data Retrieval Methods
     @init_required
     def get_ticket_count(self) -> Tuple[Response, int]:
-        """Get the number of tickets in the database"""
-        ids = self.pinecone_service.list_ticket_ids()
-        if ids:  
-            data = {}
-            sorted_ids = sorted(ids)
-            data['count'] = len(ids)
-            data['latest_ticket'] = sorted_ids[-1].id.split('#')[0]
-            #return return_response(data), 200
-            return data, 200
+        """Get the number of comment vectors in the database and the newest ticket id, streaming the namespace"""
+        count = 0
+        latest_ticket = None
+        for ids in self.pinecone_service.iter_vector_ids():
+            count += len(ids)
+            # Zendesk ids are numbers; compare them as such, not as strings
+            page_latest = max((id.split('#')[0] for id in ids), key=_ticket_order)
+            if latest_ticket is None or _ticket_order(page_latest) > _ticket_order(latest_ticket):
+                latest_ticket = page_latest
+        if count:
+            return {'count': count, 'latest_ticket': latest_ticket}, 200
         else:
             return return_response({'error': 'No ticket ids found'}), 404
 
 
     @init_required
+    @profiled
     def get_ticket_vectors(self) -> Tuple[Response, int]:
-        """Get vectors for a ticket."""
+        """
+        Get the stored comments of tickets, with the ticket fields kept in the cache.
+        `?fields=scores` returns only each comment's id, created_at and emotion_score;
+        the default, `full`, adds author and text where the record still has it.
+        """
         self.logger.info(f"Received request for get_ticket_vectors")
-        
+        fields = request.args.get('fields', 'full')
+        if fields not in TICKET_VECTOR_FIELDS:
+            return return_response({'error': f"Unknown fields '{fields}', expected one of {', '.join(TICKET_VECTOR_FIELDS)}"}), 400
+
+        tickets = self.payload.ticket_summaries
+        comments = self._get_ticket_comments([str(ticket.id) for ticket in tickets])
+        cached_tickets = self._get_cached_tickets([str(ticket.id) for ticket in tickets])
+
         results = {}
-        for ticket in self.ticket_data:
-            vectors = self.pinecone_service.list_ticket_vectors(ticket.id)
-            
-            comments = []
-            for vector in vectors:
-                if 'metadata' in vector:
-                    comment = CommentResponse(
-                        commentId=vector['id'].split('#')[1],
-                        text=vector['metadata'].get('text'),
-                        created_at=vector['metadata'].get('created_at'),
-                        score=vector['metadata'].get('emotion_score'),
-                        author_id=vector['metadata'].get('author_id')
-                    )
-                    comments.append(comment)
-            
+        for ticket in tickets:
+            cached_data = cached_tickets.get(str(ticket.id)) or {}
             ticket_response = TicketResponse(
-                id=ticket.id,
-                comments=comments,
-                score=next((v['metadata'].get('score') for v in vectors 
-                           if 'metadata' in v and 'score' in v['metadata']), None),
-                status=next((v['metadata'].get('status') for v in vectors 
-                           if 'metadata' in v and 'status' in v['metadata']), None),
-                updated_at=next((v['metadata'].get('updated_at') for v in vectors 
-                              if 'metadata' in v and 'updated_at' in v['metadata']), None),
-                created_at=next((v['metadata'].get('created_at') for v in vectors 
-                              if 'metadata' in v and 'created_at' in v['metadata']), None)
+                id=str(ticket.id),
+                comments=comments.get(str(ticket.id), []),
+                score=cached_data.get('score'),
+                status=cached_data.get('status', ticket.status),
+                updated_at=cached_data.get('updated_at', ticket.updated_at),
+                created_at=cached_data.get('created_at', ticket.created_at)
             )
-            results[str(ticket.id)] = ticket_response.model_dump()
-        
+            results[str(ticket.id)] = ticket_response.model_dump(include=TICKET_VECTOR_FIELDS[fields])
+
         return return_response({'vectors': results}), 200
 
-    @init_required
-    def get_score(self, tickets: List[TicketInput] = None, ticket: TicketInput = None) -> Tuple[Response, int]:
+    def _get_ticket_comments(self, ticket_ids: List[str]) -> Dict[str, List[CommentResponse]]:
         """
-        Get the weighted score of a ticket or multiple tickets based on the emotions of the comments.
+        Stored comments per ticket, oldest first. Tickets cached by an earlier call are read
+        in one round trip; the rest are listed concurrently, fetched in as few calls as
+        possible and cached until a new comment is stored for them.
         """
-        self.logger.info(f"Received request for get_score, request remote addr: {self.remote_addr}")
-
-        self.logger.info(f"Processing {len(self.ticket_data)} tickets for score calculation, request remote addr: {self.remote_addr}")
-        
-        total_weighted_score = 0
-        total_weight = 0
-        lambda_factor = 1.0 # Adjust this value to control the decay rate
-        all_scores = []
-        if ticket:
-            tickets = [ticket]
-        elif not tickets:
-            tickets = self.ticket_data
-        
-        self.logger.info(f"Processing {len(tickets)} tickets for score calculation, request remote addr: {self.remote_addr}")
-
-        for ticket in tickets:
-            vector_ids, comment_vectors = [], []
-            self.logger.info(f"Processing ticket: {ticket.id}, request remote addr: {self.remote_addr}")
-            vector_list = self.pinecone_service.list_ticket_vectors(str(ticket.id))
-            for vector in vector_list:
-                vector_ids.append(vector.id if hasattr(vector, 'id') else vector.get('id'))
-            response = self.pinecone_service.fetch_vectors(vector_ids)
-            if len(response.values()) > 0:
-                comment_vectors.append(response)
-                #self.logger.debug(f"Fetched vectors: {comment_vectors}")
-            else:
-                self.logger.warning(f"No vectors found for ticket {ticket.id}") 
-                continue
-
-            if len(comment_vectors) == 0:
-                self.logger.warning(f"No vectors found for tickets: {self.ticket_data}")
-                self.logger.info(f"namespace: {self.pinecone_service.namespace}")
-                return return_response({'score': 0}), 200
+        comments: Dict[str, List[CommentResponse]] = {}
+        keys = [self._get_cache_key('ticket_vectors', ticket_id) for ticket_id in ticket_ids]
+        generation_keys = [self._get_cache_key('ticket_vectors_gen', ticket_id) for ticket_id in ticket_ids]
+        cached, generations = [], []
+        if self.redis and keys:
+            try:
+                with track_stage('redis_get'):
+                    values = self.redis.mget(keys + generation_keys)
+                cached, generations = values[:len(keys)], values[len(keys):]
+            except Exception as e:
+                self.logger.error(f"Error reading cached ticket vectors: {e}")
+        for ticket_id, data in zip(ticket_ids, cached):
+            if data:
+                comments[ticket_id] = [CommentResponse(**comment) for comment in json.loads(data)]
 
-            sorted_vectors = sorted(comment_vectors[0].items(), key=lambda x: x[1]['metadata']['timestamp'], reverse=True)
-            self.logger.debug(f"Sorted vectors: {sorted_vectors}")
+        missing = [ticket_id for ticket_id in ticket_ids if ticket_id not in comments]
+        if not missing:
+            return comments
+        vector_ids = self.pinecone_service.list_ticket_vector_ids(missing)
+        records = self.pinecone_service.fetch_vectors([vector_id for ids in vector_ids.values() for vector_id in ids])
+        for ticket_id in missing:
+            ticket_comments = []
+            for vector_id in vector_ids[ticket_id]:
+                record = records.get(vector_id)
+                metadata = parse_comment_metadata(record['metadata'], vector_id) if record else None
+                if metadata is None:
+                    continue
+                ticket_comments.append(CommentResponse(
+                    id=vector_id.split('#')[1],
+                    body=metadata.body,
+                    created_at=metadata.timestamp,
+                    author_id=metadata.author_id,
+                    emotion_score=metadata.emotion_score
+                ))
+            ticket_comments.sort(key=lambda comment: comment.created_at)
+            comments[ticket_id] = ticket_comments
 
-            if sorted_vectors:
-                newest_timestamp = sorted_vectors[0][1]['metadata']['timestamp']
-                self.logger.debug(f"Newest timestamp: {newest_timestamp}")
-                
-                for vector_id, vector_data in sorted_vectors:
-                    if 'metadata' in vector_data and 'emotion_score' in vector_data['metadata']:
-                        time_diff = (newest_timestamp - vector_data['metadata']['timestamp']) / (24 * 3600)  # Convert to days
-                        weight = math.exp(-lambda_factor * time_diff)
-                        score = vector_data['metadata']['emotion_score']
-                        total_weighted_score += score * weight
-                        total_weight += weight
-                        all_scores.append(score)
-                        self.logger.info(f"Vector {vector_id}: score={score}, weight={weight}")
-                    else:
-                        self.logger.warning(f"No metadata or emotion_score found for vector {vector_id}")
+        to_cache = [ticket_id for ticket_id in missing if comments[ticket_id]]
+        if self.redis and generations and to_cache:
+            generation = dict(zip(ticket_ids, generations))
+            cache_keys, args = [], [self.cache_ttl]
+            for ticket_id in to_cache:
+                cache_keys += [self._get_cache_key('ticket_vectors', ticket_id),
+                               self._get_cache_key('ticket_vectors_gen', ticket_id)]
+                args += [generation[ticket_id] or '',
+                         json.dumps([comment.model_dump(exclude_none=True) for comment in comments[ticket_id]])]
+            try:
+                with track_stage('redis_set'):
+                    self.redis.register_script(CACHE_IF_CURRENT_SCRIPT)(keys=cache_keys, args=args)
+            except Exception as e:
+                self.logger.error(f"Error caching ticket vectors: {e}")
+        return comments
 
-        if total_weight > 0:
-            weighted_score = total_weighted_score / total_weight
-        else:
-            weighted_score = 0
-        
-        if all_scores:
-            all_scores_np = np.array(all_scores)
-            std_dev = np.std(all_scores_np)
-            most_recent_score = all_scores[0]
-            self.logger.info(f"Most recent score: {most_recent_score}, weighted score: {weighted_score}, std_dev: {std_dev}")
+    def _get_cached_tickets(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Cached ticket data for several tickets in one round trip"""
+        if not self.redis or not ids:
+            return {}
+        try:
+            with track_stage('redis_get'):
+                cached = self.redis.mget([self._get_cache_key('ticket', id) for id in ids])
+        except Exception as e:
+            self.logger.error(f"Error getting cached ticket data: {e}")
+            return {}
+        return {id: json.loads(data) for id, data in zip(ids, cached) if data}
 
-            if most_recent_score < weighted_score and abs(weighted_score - most_recent_score) > std_dev:
-                weighted_score = most_recent_score
-            elif most_recent_score > weighted_score and abs(most_recent_score - weighted_score) > std_dev:
-                weighted_score = most_recent_score
-            
-        weighted_score = max(min(weighted_score, 1), -1)
-        
-        self.logger.info(f"Calculated weighted score for {len(tickets)} tickets: {weighted_score}, request remote addr: {self.remote_addr}")
-        return return_response({'score': weighted_score})
+    @init_required
+    def get_score(self) -> Tuple[Response, int]:
+        """
+        Get the weighted score of a ticket or multiple tickets based on the emotions of the comments.
+        If Pinecone is failing, a single ticket falls back to its cached score, flagged degraded.
+        """
+        self.logger.info(f"Received request for get_score, request remote addr: {self.remote_addr}")
+        tickets = self.payload.ticket_summaries
+        try:
+            return return_response({'score': self._calculate_score(tickets), 'degraded': False}), 200
+        except Exception as e:
+            self.logger.error(f"Error calculating score, request remote addr: {self.remote_addr}: {e}")
+            cached_data = self._get_cached_ticket_data(tickets[0].id) if len(tickets) == 1 else None
+            if cached_data:
+                return return_response({'score': cached_data['score'], 'degraded': True}), 200
+            return return_response({'error': 'Score temporarily unavailable', 'degraded': True}), 503
 
     @init_required
+    @profiled
     def get_scores(self) -> Tuple[Response, int]:
-        """Get scores, using cache when possible"""
+        """
+        Get scores, using cache when possible. Entries past SCORE_SOFT_TTL are returned
+        as they are and refreshed in the background. While Pinecone's circuit is open,
+        uncached tickets are left out and the response is flagged degraded.
+        """
         self.logger.info(f"Received request for get_scores, request remote addr: {self.remote_addr}")
 
         scores = {}
-        for ticket in self.ticket_data:
+        stale = []
+        degraded = is_degraded('pinecone')
+        for ticket in self.payload.ticket_summaries:
             try:
                 # Try to get data from cache first
                 cached_data = self._get_cached_ticket_data(ticket.id)
                 if cached_data:
                     scores[ticket.id] = cached_data['score']
+                    if time.time() - cached_data.get('cached_at', 0) < SCORE_SOFT_TTL:
+                        record_score_cache('fresh')
+                        continue
+                    record_score_cache('stale')
+                    stale.append(ticket.id)
+                    # No point queueing refreshes against a dependency that is failing fast
+                    if not degraded:
+                        self._schedule_score_refresh(ticket)
                     continue
 
-                # If not in cache, calculate and cache it
-                score_response, status_code = self.get_score(ticket)
-                if status_code != 200:
-                    self.logger.error(f"Error getting score for ticket {ticket.id}")
+                record_score_cache('miss')
+                if degraded:
                     continue
 
-                score_data = score_response.get_json()
-                ticket_data = {
-                    'score': score_data.get('score', 0),
-                    'status': ticket.status,
-                    'updated_at': ticket.updated_at,
-                    'created_at': ticket.created_at,
-                    'requestor': ticket.requestor,
-                    'assignee': ticket.assignee
-                }
+                # If not in cache, calculate and cache it
+                ticket_data = self._score_ticket(ticket)
                 scores[ticket.id] = ticket_data['score']
-                
-                # Cache the new data
                 self._cache_ticket_data(ticket.id, ticket_data)
 
+            except CircuitOpenError as e:
+                self.logger.warning(f"Skipping score for ticket {ticket.id}: {e}")
+                degraded = True
             except Exception as e:
                 self.logger.error(f"Error processing ticket {ticket.id}: {e}")
                 continue
 
-        return return_response({'scores': scores}), 200
+        return return_response({'scores': scores, 'stale': stale, 'degraded': degraded}), 200
 
     @init_required
+    @profiled
     def get_unsolved_tickets(self) -> Tuple[Response, int]:
         """Get unsolved tickets from cache with pagination"""
         try:
@@ -698,24 +1064,50 @@ class SentimentChecker:
             self.logger.error(f"Error getting unsolved tickets from cache: {e}")
             return return_response({'error': str(e)}), 500
 
+    @init_required
+    def get_aggregates(self) -> Tuple[Response, int]:
+        """
+        Assignees or requesters ranked by the decayed sentiment of their comments, most
+        negative first (order=asc) or most positive first (order=desc), with pagination
+        """
+        try:
+            kind = request.args.get('kind', 'assignee')
+            order = request.args.get('order', 'asc')
+            page = int(request.args.get('page', 1))
+            per_page = int(request.args.get('per_page', 10))
+            if order not in ('asc', 'desc'):
+                raise ValueError(f"Unknown order '{order}', expected asc or desc")
+        except ValueError as e:
+            return return_response({'error': str(e)}), 400
+        try:
+            result = SentimentAggregates(self.redis, self.subdomain).page(kind, page, per_page, ascending=order == 'asc')
+        except ValueError as e:
+            return return_response({'error': str(e)}), 400
+        except Exception as e:
+            self.logger.error(f"Error getting sentiment aggregates: {e}")
+            return return_response({'error': str(e)}), 500
+        return return_response(result), 200
+
     # Health Check
     def health(self):
-        """Health check including Redis"""
+        """Health of Pinecone and Redis as of the background prober's last check"""
         remote_addr = request.headers.get('X-Forwarded-For', request.remote_addr)
-        
-        # Check Pinecone
-        pinecone_service = PineconeService('emotions')
-        check_pinecone = pinecone_service.check_health()
-        
-        # Check Redis
-        redis_healthy = RedisClient.health_check()
-        
-        if not check_pinecone.get('status', {}).get('ready', True):
-            self.logger.error(f"Pinecone health check failed, request remote addr: {remote_addr}")
-            return return_response({'error': 'Pinecone service is not healthy'}), 500
+
+        if is_draining():
+            return return_response({'error': 'Worker is draining'}), 503
+
+        snapshot = get_health_snapshot()
+        freshness = {'checked_at': int(snapshot.checked_at), 'age_seconds': round(snapshot.age, 1), 'stale': snapshot.stale}
+
+        if not snapshot.pinecone_ready:
+            self.logger.error(f"Pinecone health check failed: {snapshot.errors.get('pinecone')}, request remote addr: {remote_addr}")
+            return return_response({'error': 'Pinecone service is not healthy', **freshness}), 500
             
-        if not redis_healthy:
+        if not snapshot.redis_ready:
             self.logger.error(f"Redis health check failed, request remote addr: {remote_addr}")
-            return return_response({'error': 'Redis service is not healthy'}), 500
-            
-        return return_render(f'{self.templates}/health.tmpl', 'Health')
\ No newline at end of file
+            return return_response({'error': 'Redis service is not healthy', **freshness}), 500
+
+        response = return_render(f'{self.templates}/health.tmpl', 'Health', None, '')
+        response.headers['X-Health-Checked-At'] = str(freshness['checked_at'])
+        response.headers['X-Health-Stale'] = str(snapshot.stale).lower()
+        return response
@@ -0,0 +1,284 @@
+"""
+Zendesk webhook ingestion, so comments are scored when they are posted instead of when
+an agent's browser next sends the ticket to analyze-comments.
+
+A trigger (or a ticket.comment_added event subscription) posts each new comment to
+/sentiment-checker/webhook. The request is checked against the webhook's signing secret
+and queued in Redis, then answered straight away. Comments queued for the same ticket
+are merged into one hash, and the ticket is due WEBHOOK_DEBOUNCE_SECONDS after its
+latest event, but never later than WEBHOOK_MAX_DELAY_SECONDS after its first. A burst of
+replies, or a retried delivery, therefore becomes one analysis.
+
+Every worker polls the due set. A due ticket is claimed by exactly one worker, its new
+comments go through the same path as analyze-comments, and its score is recomputed from
+those results and the comments already stored. Comments that fail are queued again,
+up to WEBHOOK_MAX_ATTEMPTS times.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from config.redis_config import RedisClient
+from models import CommentInput, TicketInput
+from .backfill import ticket_from_export
+import base64
+import dotenv, os
+import hashlib
+import hmac
+import json
+import logging
+import threading
+import time
+
+dotenv.load_dotenv()
+logger = logging.getLogger('webhooks')
+
+# Signing secret shown on the webhook in Zendesk admin; a tenant's own secret, set with
+# `flask tickets webhook-secret`, takes precedence
+ZENDESK_WEBHOOK_SECRET = os.getenv("ZENDESK_WEBHOOK_SECRET")
+# Deliveries signed longer ago than this are refused as replays
+WEBHOOK_MAX_SKEW_SECONDS = int(os.getenv("WEBHOOK_MAX_SKEW_SECONDS", 300))
+WEBHOOK_DEBOUNCE_SECONDS = float(os.getenv("WEBHOOK_DEBOUNCE_SECONDS", 5))
+WEBHOOK_MAX_DELAY_SECONDS = float(os.getenv("WEBHOOK_MAX_DELAY_SECONDS", 30))
+WEBHOOK_POLL_INTERVAL = float(os.getenv("WEBHOOK_POLL_INTERVAL", 1))
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", 2))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", 3))
+# Queued comments of a ticket nobody claims (no worker running) are dropped after this
+WEBHOOK_PENDING_TTL = int(os.getenv("WEBHOOK_PENDING_TTL", 86400))
+
+SIGNATURE_HEADER = 'X-Zendesk-Webhook-Signature'
+SIGNATURE_TIMESTAMP_HEADER = 'X-Zendesk-Webhook-Signature-Timestamp'
+DUE_KEY = 'webhook:due'
+
+# Merges one event into a ticket's pending hash and pushes its due time out, atomically.
+# Ticket fields are kept one per hash field, so an event that leaves some out doesn't
+# erase what an earlier one sent.
+# KEYS: pending hash, due zset
+# ARGV: due member, now, debounce (s), max delay (s), ttl (s), attempts, number of ticket
+#       fields n, then n field / JSON value pairs, then comment id / comment JSON pairs
+ENQUEUE_SCRIPT = """
+local now = tonumber(ARGV[2])
+redis.call('HSETNX', KEYS[1], 'first_seen', now)
+local first = tonumber(redis.call('HGET', KEYS[1], 'first_seen'))
+local attempts = tonumber(ARGV[6])
+if attempts > (tonumber(redis.call('HGET', KEYS[1], 'attempts')) or 0) then
+    redis.call('HSET', KEYS[1], 'attempts', attempts)
+end
+local comments = 8 + 2 * tonumber(ARGV[7])
+for i = 8, comments - 1, 2 do
+    redis.call('HSET', KEYS[1], 'ticket:' .. ARGV[i], ARGV[i + 1])
+end
+for i = comments, #ARGV, 2 do
+    redis.call('HSET', KEYS[1], 'comment:' .. ARGV[i], ARGV[i + 1])
+end
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[5]))
+local due = math.min(first + tonumber(ARGV[4]), now + tonumber(ARGV[3]))
+redis.call('ZADD', KEYS[2], due, ARGV[1])
+return tostring(due)
+"""
+
+# Removes and returns up to ARGV[2] members due by ARGV[1], so each is claimed once
+# KEYS: due zset
+CLAIM_SCRIPT = """
+local members = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+if #members > 0 then
+    redis.call('ZREM', KEYS[1], unpack(members))
+end
+return members
+"""
+
+
+def webhook_secret(redis, subdomain: str) -> Optional[str]:
+    """The tenant's signing secret, or the deployment-wide one"""
+    if redis is not None:
+        try:
+            secret = redis.get(f"webhook:secret:{subdomain}")
+            if secret:
+                return secret
+        except Exception as e:
+            logger.error(f"Error reading webhook secret for {subdomain}: {e}")
+    return ZENDESK_WEBHOOK_SECRET
+
+
+def verify_signature(secret: Optional[str], body: bytes, signature: Optional[str], timestamp: Optional[str],
+                     now: Optional[float] = None) -> bool:
+    """
+    Zendesk signs base64(HMAC-SHA256(secret, timestamp + body)) and sends the timestamp
+    alongside; both must match and the timestamp must be recent.
+    """
+    if not secret or not signature or not timestamp:
+        return False
+    try:
+        signed_at = datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return False
+    if abs((now if now is not None else time.time()) - signed_at) > WEBHOOK_MAX_SKEW_SECONDS:
+        return False
+    digest = hmac.new(secret.encode(), timestamp.encode() + body, hashlib.sha256).digest()
+    return hmac.compare_digest(base64.b64encode(digest).decode(), signature)
+
+
+def ticket_from_event(record: Dict[str, Any], received_at: Optional[str] = None) -> TicketInput:
+    """
+    Build a ticket with its new comments from a webhook body. Accepts the trigger payload
+    documented in the README, {"ticket": {...}, "comment": {...}}, and Zendesk's
+    ticket.comment_added event, {"detail": {...}, "event": {"comment": {...}}, "time": ...}.
+    Placeholders Zendesk leaves empty are treated as missing.
+    """
+    if 'detail' in record:
+        ticket = dict(record['detail'])
+        if isinstance(ticket.get('status'), str):
+            ticket['status'] = ticket['status'].lower()
+        comment = dict((record.get('event') or {}).get('comment') or {})
+        comment.setdefault('author_id', (comment.get('author') or {}).get('id'))
+        received_at = record.get('time') or received_at
+    else:
+        ticket = dict(record.get('ticket') or {})
+        comment = dict(record.get('comment') or {})
+    ticket = {key: value for key, value in ticket.items() if value != ''}
+    comments = list(ticket.get('comments') or record.get('comments') or [])
+    if comment.get('id'):
+        comments.append(comment)
+    ticket['comments'] = [
+        dict({key: value for key, value in comment.items() if value != ''},
+             created_at=comment.get('created_at') or received_at)
+        for comment in comments
+    ]
+    return ticket_from_export(ticket)
+
+
+class WebhookQueue:
+    """Pending webhook comments per ticket in Redis, with a due set shared by every worker"""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self._enqueue = redis.register_script(ENQUEUE_SCRIPT)
+        self._claim = redis.register_script(CLAIM_SCRIPT)
+
+    @staticmethod
+    def pending_key(subdomain: str, ticket_id: str) -> str:
+        return f"webhook:pending:{subdomain}:{ticket_id}"
+
+    def enqueue(self, subdomain: str, ticket: TicketInput, attempts: int = 0) -> float:
+        """Merge a ticket's comments into its pending analysis; returns when it is due"""
+        fields = ticket.model_dump(exclude={'comments'}, exclude_none=True)
+        args = [f"{subdomain}:{ticket.id}", time.time(), WEBHOOK_DEBOUNCE_SECONDS, WEBHOOK_MAX_DELAY_SECONDS,
+                WEBHOOK_PENDING_TTL, attempts, len(fields)]
+        for name, value in fields.items():
+            args += [name, json.dumps(value)]
+        for comment in ticket.comments or []:
+            args += [comment.id, comment.model_dump_json(exclude_none=True)]
+        return float(self._enqueue(keys=[self.pending_key(subdomain, ticket.id), DUE_KEY], args=args))
+
+    def claim(self, limit: int, now: Optional[float] = None) -> List[Tuple[str, TicketInput, int]]:
+        """Take up to limit due tickets off the queue, as (subdomain, ticket with its queued comments, attempts)"""
+        members = self._claim(keys=[DUE_KEY], args=[now if now is not None else time.time(), limit])
+        claimed = []
+        for member in members:
+            subdomain, ticket_id = member.rsplit(':', 1)
+            key = self.pending_key(subdomain, ticket_id)
+            pipe = self.redis.pipeline()
+            pipe.hgetall(key)
+            pipe.delete(key)
+            data = pipe.execute()[0]
+            # Empty when the comments were already taken with an earlier claim of the ticket
+            if 'ticket:id' not in data:
+                continue
+            fields = {field[len('ticket:'):]: json.loads(value) for field, value in data.items()
+                      if field.startswith('ticket:')}
+            comments = [CommentInput.model_validate_json(value) for field, value in data.items()
+                        if field.startswith('comment:')]
+            ticket = TicketInput(**fields, comments=comments)
+            claimed.append((subdomain, ticket, int(data.get('attempts', 0))))
+        return claimed
+
+
+class WebhookDispatcher:
+    """
+    Background thread that claims due tickets and analyzes them on a small pool. It only
+    claims as many tickets as the pool has free workers, so the rest stay queued in Redis
+    for whichever worker gets to them first.
+    """
+
+    def __init__(self, handler: Optional[Callable[[str, TicketInput], List[CommentInput]]] = None,
+                 interval: float = WEBHOOK_POLL_INTERVAL, workers: int = WEBHOOK_WORKERS):
+        self.handler = handler
+        self.interval = interval
+        self.workers = workers
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._executor = None
+        self._thread = None
+        self._pid = None
+
+    def start(self) -> None:
+        # Threads don't survive a fork; each worker runs its own dispatcher
+        if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+            return
+        if self.handler is None:
+            from .views import SentimentChecker
+            self.handler = SentimentChecker().analyze_queued_ticket
+        self._stop.clear()
+        self._pid = os.getpid()
+        self._in_flight = 0
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='webhook')
+        self._thread = threading.Thread(target=self._run, name='webhook-dispatcher', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop claiming; tickets being analyzed finish, unclaimed ones stay queued for other workers"""
+        self._stop.set()
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=False)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.dispatch()
+            except Exception as e:
+                logger.error(f"Error dispatching webhook tickets: {e}")
+
+    def dispatch(self) -> int:
+        """Claim due tickets for the free workers; returns how many were started"""
+        with self._lock:
+            free = self.workers - self._in_flight
+        if free <= 0:
+            return 0
+        queue = WebhookQueue(RedisClient.get_instance())
+        claimed = queue.claim(free)
+        for subdomain, ticket, attempts in claimed:
+            with self._lock:
+                self._in_flight += 1
+            self._executor.submit(self._process, queue, subdomain, ticket, attempts)
+        return len(claimed)
+
+    def _process(self, queue: WebhookQueue, subdomain: str, ticket: TicketInput, attempts: int) -> None:
+        try:
+            failed = self.handler(subdomain, ticket)
+        except Exception as e:
+            logger.error(f"Error analyzing webhook ticket {ticket.id} for {subdomain}: {e}")
+            failed = ticket.comments or []
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+        if not failed:
+            return
+        if attempts + 1 >= WEBHOOK_MAX_ATTEMPTS:
+            logger.error(f"Dropping {len(failed)} comments of ticket {ticket.id} for {subdomain} "
+                         f"after {attempts + 1} attempts")
+            return
+        try:
+            queue.enqueue(subdomain, ticket.model_copy(update={'comments': failed}), attempts=attempts + 1)
+        except Exception as e:
+            logger.error(f"Error re-queueing ticket {ticket.id} for {subdomain}: {e}")
+
+
+webhook_dispatcher = WebhookDispatcher()
+
+
+def start_webhook_dispatcher() -> None:
+    webhook_dispatcher.start()
+
+
+def stop_webhook_dispatcher() -> None:
+    webhook_dispatcher.stop()
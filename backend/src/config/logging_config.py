@@ -0,0 +1,130 @@
+import os
+import sys
+import queue
+import random
+import atexit
+import logging
+import threading
+import dotenv
+from datetime import datetime
+from typing import Optional
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+
+dotenv.load_dotenv()
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+FILE_LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+FILE_LOG_LEVEL = os.getenv('FILE_LOG_LEVEL', 'DEBUG').upper()
+# Fraction of per-comment debug/info lines to keep (warnings and errors are never sampled)
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '1.0'))
+LOG_DIR = os.getenv('LOG_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '../logs'))
+
+# Per-comment lines go through this logger so they can be sampled on their own
+COMMENT_LOGGER_NAME = 'sentiment_checker.comments'
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a random fraction of records below WARNING"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = max(0.0, min(rate, 1.0))
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+
+class _LoggerNameFilter(logging.Filter):
+    """Pass records from any of the given logger names (and their children)"""
+
+    def __init__(self, *names: str):
+        super().__init__()
+        self.names = names
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return any(record.name == name or record.name.startswith(f"{name}.") for name in self.names)
+
+
+_lock = threading.Lock()
+_queue_handler: Optional[QueueHandler] = None
+_listener: Optional[QueueListener] = None
+_handlers = []
+
+
+def _build_handlers():
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setLevel(LOG_LEVEL)
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handlers = [stream_handler]
+
+    try:
+        os.makedirs(LOG_DIR, exist_ok=True)
+        log_file = os.path.join(LOG_DIR, f"{datetime.now().strftime('%Y-%m-%d')}.log")
+        file_handler = TimedRotatingFileHandler(log_file, when="midnight", interval=1, backupCount=30)
+        file_handler.setLevel(FILE_LOG_LEVEL)
+        file_handler.setFormatter(logging.Formatter(FILE_LOG_FORMAT))
+        # The file only ever received the utils logger's output; keep it that way
+        file_handler.addFilter(_LoggerNameFilter('sentiment-checker'))
+        handlers.append(file_handler)
+    except OSError as e:
+        print(f"File logging disabled: {e}", file=sys.stderr)
+    return handlers
+
+
+def _start_listener():
+    global _listener
+    _listener = QueueListener(_queue_handler.queue, *_handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def _restart_after_fork():
+    # The listener thread and the queue's locks don't survive fork; give the child its own
+    if _queue_handler is None:
+        return
+    _queue_handler.queue = queue.SimpleQueue()
+    _start_listener()
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            try:
+                _listener.stop()
+            except Exception:
+                pass
+            _listener = None
+
+
+def configure_logging():
+    """
+    Route all log output through a queue so stdout and file writes happen on a
+    background listener thread instead of the request thread.
+
+    Safe to call more than once; only the first call installs handlers.
+    """
+    global _queue_handler, _handlers
+    with _lock:
+        if _queue_handler is not None:
+            return
+        _handlers = _build_handlers()
+        _queue_handler = QueueHandler(queue.SimpleQueue())
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(_queue_handler)
+        root.setLevel(LOG_LEVEL)
+
+        logging.getLogger('sentiment-checker').setLevel(logging.DEBUG)
+        logging.getLogger(COMMENT_LOGGER_NAME).addFilter(SamplingFilter(LOG_SAMPLE_RATE))
+        logging.getLogger('pinecone_plugin_interface').setLevel(logging.CRITICAL)
+
+        _start_listener()
+        atexit.register(stop_logging)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=_restart_after_fork)
@@ -70,6 +70,13 @@ class RedisClient:
 
         return cls._instance
 
+    @classmethod
+    def with_timeouts(cls, timeout: float) -> redis.Redis:
+        """A separate client for the same server whose connects and commands give up after `timeout` seconds"""
+        pool = cls.get_instance().connection_pool
+        kwargs = dict(pool.connection_kwargs, socket_timeout=timeout, socket_connect_timeout=timeout)
+        return redis.Redis(connection_pool=type(pool)(connection_class=pool.connection_class, **kwargs))
+
     @classmethod
     def health_check(cls) -> bool:
         try:
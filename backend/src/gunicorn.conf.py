@@ -0,0 +1,76 @@
+# Gunicorn settings, picked up automatically when gunicorn is started from backend/src:
+#
+#   gunicorn -c gunicorn.conf.py wsgi:app
+#
+# Every setting can be overridden through the environment variables below.
+import multiprocessing
+import os
+import shutil
+import signal
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+
+# 'gthread' (threads, the default) or 'gevent'. The views spend most of their time
+# waiting on Pinecone/OpenAI/Redis, so both models give each worker many requests in flight.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.environ.get('GUNICORN_WORKERS', min(multiprocessing.cpu_count() * 2, 4)))
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 100))
+
+# Import the app once in the master so workers fork with modules, templates and parsed
+# JWT keys already loaded. Network clients are created per worker in post_worker_init.
+# Off by default under gevent, which has to monkey-patch before ssl/threading are imported.
+preload_app = os.environ.get('GUNICORN_PRELOAD', str(worker_class != 'gevent')).lower() == 'true'
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 0))
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+
+# Prometheus multiprocess mode: each worker writes its samples to files here and
+# /metrics aggregates them. Set before workers import prometheus_client.
+_metrics_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR',
+    os.path.join(tempfile.gettempdir(), 'sentiment-checker-metrics')
+)
+
+
+def on_starting(server):
+    # Samples left behind by a previous master would be aggregated forever
+    shutil.rmtree(_metrics_dir, ignore_errors=True)
+    os.makedirs(_metrics_dir, exist_ok=True)
+
+
+def post_worker_init(worker):
+    # Runs in the worker after gevent monkey-patching and app load, before the first request
+    if worker_class == 'gevent':
+        import grpc.experimental.gevent as grpc_gevent
+        grpc_gevent.init_gevent()
+
+    from services.lifecycle import begin_drain, warm_worker
+    warm_worker()
+
+    # On SIGTERM, report unhealthy while in-flight requests finish within graceful_timeout
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def drain(signum, frame):
+        begin_drain()
+        if callable(previous):
+            previous(signum, frame)
+
+    signal.signal(signal.SIGTERM, drain)
+
+
+def worker_exit(server, worker):
+    from services.lifecycle import shutdown_worker
+    shutdown_worker()
+
+
+def child_exit(server, worker):
+    from services.metrics_service import mark_worker_dead
+    mark_worker_dead(worker.pid)
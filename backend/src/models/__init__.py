@@ -1,2 +1,4 @@
 from .zendesk import *
 from .emotions import *
+from .payload import *
+from .metadata import *
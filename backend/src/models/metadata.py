@@ -0,0 +1,91 @@
+from typing import Any, Dict, Optional, Union
+import hashlib
+import msgspec
+
+# Version 1 (unversioned) records store the comment's raw HTML under 'body', so every
+# fetch with metadata carries whole emails. Version 2 keeps a hash of the body instead
+# and records the ticket id; readers accept both until the migration has run.
+METADATA_VERSION = 2
+
+
+class CommentMetadata(msgspec.Struct):
+    """Normalized view of a comment vector's metadata, whatever version it was written as"""
+    version: int
+    emotion_score: Optional[float] = None
+    timestamp: int = 0
+    author_id: Optional[Union[str, int]] = None
+    ticket_id: Optional[str] = None
+    body_hash: Optional[str] = None
+    chunks: int = 1
+    # Encoded per-emotion similarity and match counts, for re-scoring without re-embedding
+    emotion_profile: Optional[str] = None
+    # Only version 1 records still carry the body
+    body: Optional[str] = None
+
+
+def body_hash(body: str) -> str:
+    """Stable pointer to a comment body, for spotting edits without storing the text"""
+    return hashlib.sha256(body.encode('utf-8')).hexdigest()[:32]
+
+
+def build_comment_metadata(ticket_id: Union[str, int], body: str, emotion_score: float, timestamp: int,
+                           author_id: Optional[Union[str, int]] = None, chunks: int = 1,
+                           emotion_profile: Optional[str] = None) -> Dict[str, Any]:
+    """Metadata to upsert with a comment vector, in the current version"""
+    metadata = {
+        'v': METADATA_VERSION,
+        'ticket_id': str(ticket_id),
+        'emotion_score': emotion_score,
+        'timestamp': timestamp,
+        'body_hash': body_hash(body),
+        'chunks': chunks
+    }
+    # Pinecone rejects null metadata values
+    if author_id is not None:
+        metadata['author_id'] = author_id
+    if emotion_profile:
+        metadata['emotion_profile'] = emotion_profile
+    return metadata
+
+
+def parse_comment_metadata(metadata: Optional[Dict[str, Any]], vector_id: Optional[str] = None) -> Optional[CommentMetadata]:
+    """Read version 1 or 2 metadata; the ticket id of old records comes from the '<ticket>#<comment>' vector id"""
+    if not metadata:
+        return None
+    version = int(metadata.get('v', 1))
+    body = metadata.get('body') if version < 2 else None
+    ticket_id = metadata.get('ticket_id')
+    if ticket_id is None and vector_id and '#' in vector_id:
+        ticket_id = vector_id.split('#')[0]
+    score = metadata.get('emotion_score')
+    return CommentMetadata(
+        version=version,
+        emotion_score=float(score) if score is not None else None,
+        # Pinecone returns every number as a float
+        timestamp=int(metadata.get('timestamp') or 0),
+        author_id=metadata.get('author_id'),
+        ticket_id=ticket_id,
+        body_hash=metadata.get('body_hash') or (body_hash(body) if body else None),
+        chunks=int(metadata.get('chunks') or 1),
+        emotion_profile=metadata.get('emotion_profile'),
+        body=body
+    )
+
+
+def upgrade_comment_metadata(metadata: Optional[Dict[str, Any]], vector_id: str) -> Optional[Dict[str, Any]]:
+    """Current-version metadata for an older record, or None if it is already current or unreadable"""
+    parsed = parse_comment_metadata(metadata, vector_id)
+    if parsed is None or parsed.version >= METADATA_VERSION or parsed.emotion_score is None:
+        return None
+    upgraded = {
+        'v': METADATA_VERSION,
+        'ticket_id': parsed.ticket_id,
+        'emotion_score': parsed.emotion_score,
+        'timestamp': parsed.timestamp,
+        'chunks': parsed.chunks
+    }
+    if parsed.body_hash:
+        upgraded['body_hash'] = parsed.body_hash
+    if parsed.author_id is not None:
+        upgraded['author_id'] = parsed.author_id
+    return upgraded
@@ -0,0 +1,111 @@
+from typing import Any, Dict, List, Optional, Union
+from pydantic import BaseModel, TypeAdapter
+from .zendesk import TicketInput
+import msgspec
+
+
+class TicketSummary(msgspec.Struct):
+    """
+    Lightweight view of a ticket decoded straight from the raw request body.
+
+    Only the fields the score endpoints need are declared, so msgspec skips
+    everything else (comments, comment HTML) without materializing it.
+    """
+    id: Union[str, int]
+    status: Optional[str] = None
+    score: Optional[float] = None
+    updated_at: Optional[Union[str, int]] = None
+    created_at: Optional[Union[str, int]] = None
+    requestor: Optional[Dict[str, Any]] = None
+    assignee: Optional[Dict[str, Any]] = None
+
+    def __post_init__(self):
+        self.id = str(self.id)
+
+
+class _SummaryEnvelope(msgspec.Struct):
+    tickets: Optional[List[TicketSummary]] = None
+
+
+class _TokenEnvelope(msgspec.Struct):
+    token: Optional[str] = None
+
+
+class _TicketEnvelope(BaseModel):
+    tickets: Optional[List[TicketInput]] = None
+
+
+_summary_decoder = msgspec.json.Decoder(_SummaryEnvelope)
+_token_decoder = msgspec.json.Decoder(_TokenEnvelope)
+_tickets_adapter = TypeAdapter(List[TicketInput])
+
+
+class RequestPayload:
+    """
+    Request body wrapper that defers ticket parsing until a view asks for it.
+
+    JSON bodies are kept as raw bytes. Each accessor decodes only what it
+    needs the first time it is used and caches the result:
+
+    - token: the auth token, skipping the rest of the document
+    - ticket_summaries: ticket ids, status and timestamps (msgspec)
+    - tickets: full TicketInput models including comments (pydantic, from bytes)
+    - data: the whole body as a dict
+    """
+
+    def __init__(self, raw: bytes = b'', data: Optional[Dict[str, Any]] = None):
+        self.raw = raw
+        self._data = data
+        self._token = None
+        self._token_loaded = False
+        self._tickets = None
+        self._summaries = None
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        if self._data is None:
+            decoded = msgspec.json.decode(self.raw) if self.raw else {}
+            self._data = decoded if isinstance(decoded, dict) else {}
+        return self._data
+
+    @property
+    def token(self) -> Optional[str]:
+        if not self._token_loaded:
+            if self._data is not None or not self.raw:
+                token = self.data.get('token')
+                self._token = token if isinstance(token, str) else None
+            else:
+                self._token = _token_decoder.decode(self.raw).token
+            self._token_loaded = True
+        return self._token
+
+    @property
+    def tickets(self) -> List[TicketInput]:
+        if self._tickets is None:
+            if self._data is None and self.raw:
+                self._tickets = _TicketEnvelope.model_validate_json(self.raw).tickets or []
+            else:
+                self._tickets = _tickets_adapter.validate_python(self.data.get('tickets') or [])
+        return self._tickets
+
+    @property
+    def ticket_summaries(self) -> List[TicketSummary]:
+        if self._summaries is None:
+            if self._tickets is not None:
+                self._summaries = [
+                    TicketSummary(
+                        id=ticket.id,
+                        status=ticket.status,
+                        score=ticket.score,
+                        updated_at=ticket.updated_at,
+                        created_at=ticket.created_at,
+                        requestor=ticket.requestor,
+                        assignee=ticket.assignee
+                    )
+                    for ticket in self._tickets
+                ]
+            elif self._data is None and self.raw:
+                self._summaries = _summary_decoder.decode(self.raw).tickets or []
+            else:
+                self._summaries = msgspec.convert(self.data.get('tickets') or [], List[TicketSummary])
+        return self._summaries
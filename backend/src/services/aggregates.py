@@ -0,0 +1,175 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Union
+import dotenv, os
+import logging
+
+dotenv.load_dotenv()
+logger = logging.getLogger('aggregates')
+
+SENTIMENT_AGGREGATES = os.getenv("SENTIMENT_AGGREGATES", "true").lower() == "true"
+# Time constants of the decayed score and of the short-term mean the trend compares it to
+AGGREGATE_DECAY_DAYS = float(os.getenv("AGGREGATE_DECAY_DAYS", 7))
+AGGREGATE_TREND_DAYS = float(os.getenv("AGGREGATE_TREND_DAYS", 1))
+# Agents and requesters with fewer scored comments stay out of the rankings, so one
+# angry comment doesn't put someone at the top
+AGGREGATE_MIN_COMMENTS = int(os.getenv("AGGREGATE_MIN_COMMENTS", 3))
+AGGREGATE_MAX_PAGE_SIZE = 100
+
+KINDS = ('assignee', 'requester')
+
+# Folds one comment score into an aggregate hash and re-ranks it, atomically.
+# Both decayed means are kept as (numerator, denominator) at the newest comment's time;
+# comments older than that, e.g. from a backfill, are weighted down instead of moving it.
+# KEYS: aggregate hash, ranking zset
+# ARGV: member, score, timestamp, slow time constant (s), fast time constant (s), min comments
+RECORD_SCRIPT = """
+local score = tonumber(ARGV[2])
+local t = tonumber(ARGV[3])
+local slow = tonumber(ARGV[4])
+local fast = tonumber(ARGV[5])
+local h = redis.call('HMGET', KEYS[1], 'count', 'sum', 'ts', 'snum', 'sden', 'fnum', 'fden')
+local count = (tonumber(h[1]) or 0) + 1
+local sum = (tonumber(h[2]) or 0) + score
+local ts = tonumber(h[3]) or t
+local snum = tonumber(h[4]) or 0
+local sden = tonumber(h[5]) or 0
+local fnum = tonumber(h[6]) or 0
+local fden = tonumber(h[7]) or 0
+if t >= ts then
+    local ds = math.exp(-(t - ts) / slow)
+    local df = math.exp(-(t - ts) / fast)
+    snum = snum * ds + score
+    sden = sden * ds + 1
+    fnum = fnum * df + score
+    fden = fden * df + 1
+    ts = t
+else
+    local ws = math.exp(-(ts - t) / slow)
+    local wf = math.exp(-(ts - t) / fast)
+    snum = snum + score * ws
+    sden = sden + ws
+    fnum = fnum + score * wf
+    fden = fden + wf
+end
+local decayed = snum / sden
+redis.call('HSET', KEYS[1], 'count', count, 'sum', sum, 'ts', ts,
+           'snum', snum, 'sden', sden, 'fnum', fnum, 'fden', fden)
+if count >= tonumber(ARGV[6]) then
+    redis.call('ZADD', KEYS[2], decayed, ARGV[1])
+end
+return count
+"""
+
+
+@dataclass
+class Aggregate:
+    id: str
+    count: int
+    mean: float
+    # Time-decayed mean, as of the newest comment
+    decayed_score: float
+    # Short-term mean minus the decayed score: negative when sentiment has recently dropped
+    trend: float
+    last_comment_at: int
+
+    @classmethod
+    def from_hash(cls, id: str, data: Dict[str, str]) -> Optional['Aggregate']:
+        if not data or not data.get('count'):
+            return None
+        count = int(data['count'])
+        decayed = float(data['snum']) / float(data['sden'])
+        recent = float(data['fnum']) / float(data['fden'])
+        return cls(
+            id=id,
+            count=count,
+            mean=float(data['sum']) / count,
+            decayed_score=decayed,
+            trend=recent - decayed,
+            last_comment_at=int(float(data['ts']))
+        )
+
+
+class SentimentAggregates:
+    """
+    Per-assignee and per-requester comment sentiment for a tenant, updated as comments are
+    scored: count, mean, time-decayed score and recent trend in one hash per person, and a
+    sorted set per kind ranking people by decayed score.
+
+    An assignee's aggregate covers the comments on their tickets written by someone else,
+    i.e. how their customers feel; a requester's covers the comments they wrote, or all
+    comments on their tickets when the author isn't known.
+    """
+
+    def __init__(self, redis=None, tenant: Optional[str] = None, enabled: bool = SENTIMENT_AGGREGATES):
+        self.redis = redis
+        self.tenant = tenant
+        self.enabled = enabled and redis is not None
+        # Runs by SHA, loading the script again if Redis has flushed its cache
+        self._record = redis.register_script(RECORD_SCRIPT) if self.enabled else None
+
+    def aggregate_key(self, kind: str, id: str) -> str:
+        return f"{self.tenant}:agg:{kind}:{id}"
+
+    def ranking_key(self, kind: str) -> str:
+        return f"{self.tenant}:agg:{kind}:by_score"
+
+    def record(self, score: float, timestamp: int, assignee_id: Optional[Union[str, int]] = None,
+               requester_id: Optional[Union[str, int]] = None, author_id: Optional[Union[str, int]] = None,
+               pipeline=None) -> None:
+        """Fold one newly scored comment into its assignee's and requester's aggregates"""
+        if not self.enabled or score is None:
+            return
+        targets = []
+        if assignee_id is not None and str(author_id) != str(assignee_id):
+            targets.append(('assignee', str(assignee_id)))
+        if requester_id is not None and (author_id is None or str(author_id) == str(requester_id)):
+            targets.append(('requester', str(requester_id)))
+        for kind, member in targets:
+            try:
+                self._record(keys=[self.aggregate_key(kind, member), self.ranking_key(kind)],
+                             args=[member, float(score), int(timestamp), AGGREGATE_DECAY_DAYS * 86400,
+                                   AGGREGATE_TREND_DAYS * 86400, AGGREGATE_MIN_COMMENTS],
+                             client=pipeline)
+            except Exception as e:
+                # Rankings are a view on the scores; losing one update must not fail the analysis
+                logger.error(f"Error updating {kind} aggregate for {member}: {e}")
+
+    def page(self, kind: str, page: int = 1, per_page: int = 10, ascending: bool = True) -> Dict[str, Any]:
+        """
+        One page of the ranking, most negative first unless ascending is False, with each
+        person's aggregate. Only the page's hashes are read.
+        """
+        if kind not in KINDS:
+            raise ValueError(f"Unknown aggregate kind '{kind}', expected one of {', '.join(KINDS)}")
+        per_page = max(1, min(per_page, AGGREGATE_MAX_PAGE_SIZE))
+        page = max(page, 1)
+        start = (page - 1) * per_page
+        end = start + per_page - 1
+
+        ranking = self.ranking_key(kind)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zcard(ranking)
+        if ascending:
+            pipe.zrange(ranking, start, end)
+        else:
+            pipe.zrevrange(ranking, start, end)
+        total, ids = pipe.execute()
+
+        pipe = self.redis.pipeline(transaction=False)
+        for member in ids:
+            pipe.hgetall(self.aggregate_key(kind, member))
+        aggregates: List[Aggregate] = []
+        for member, data in zip(ids, pipe.execute() if ids else []):
+            aggregate = Aggregate.from_hash(member, data)
+            if aggregate is not None:
+                aggregates.append(aggregate)
+
+        return {
+            'kind': kind,
+            'order': 'asc' if ascending else 'desc',
+            'results': [aggregate.__dict__ for aggregate in aggregates],
+            'total_count': total,
+            'page': page,
+            'per_page': per_page,
+            'has_more': start + per_page < total
+        }
@@ -1,40 +1,181 @@
 from functools import wraps
 from flask import session, request, jsonify, make_response
-from config.redis_config import RedisClient, RedisConfigError
+from config.redis_config import RedisConfigError
 from services.pinecone_service import PineconeService
 from utils import get_subdomain, check_element, return_response, return_render
-from models import TicketInput
+from models import RequestPayload
+from services.metrics_service import bind_labels
+from services.scheduler import PRIORITY_HEADER, bind_priority, request_lane
+from services.tenant_router import get_tenant_redis
+from collections import OrderedDict
+import hashlib
 import jwt
 import os
 import logging
+import threading
+import time
 
 logger = logging.getLogger('auth_service')
 
+ALLOWED_JWT_ALGORITHMS = ('RS256', 'HS256')
+JWT_LEEWAY = 30  # seconds of clock skew tolerated on exp/nbf
+JWT_CACHE_MAX_TTL = int(os.environ.get('JWT_CACHE_MAX_TTL', 3600))
+JWT_CACHE_MAX_SIZE = int(os.environ.get('JWT_CACHE_MAX_SIZE', 10000))
+JWT_KEY_RELOAD_INTERVAL = int(os.environ.get('JWT_KEY_RELOAD_INTERVAL', 30))
+
+
+class JWTKeyStore:
+    """
+    Verification keys parsed once and reused across requests.
+
+    The key comes from ZENDESK_APP_PUBLIC_KEY, or from the file named by
+    ZENDESK_APP_PUBLIC_KEY_FILE. The environment value is compared on every
+    call and the file's mtime at most every JWT_KEY_RELOAD_INTERVAL seconds;
+    keys are re-parsed only when the source actually changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._source = None
+        self._keys = {}
+        self._next_file_check = 0
+        self.version = 0
+
+    def _read_source(self):
+        path = os.environ.get('ZENDESK_APP_PUBLIC_KEY_FILE')
+        if path:
+            now = time.monotonic()
+            if self._source and self._source[0] == path and now < self._next_file_check:
+                return self._source
+            self._next_file_check = now + JWT_KEY_RELOAD_INTERVAL
+            try:
+                mtime = os.stat(path).st_mtime
+                if self._source and self._source[:2] == (path, mtime):
+                    return self._source
+                with open(path) as key_file:
+                    return (path, mtime, key_file.read())
+            except OSError as e:
+                logger.error(f"Error reading {path}: {e}")
+                return self._source
+        key = os.environ.get('ZENDESK_APP_PUBLIC_KEY')
+        if self._source and self._source[2] == key:
+            return self._source
+        return (None, None, key)
+
+    def keys(self):
+        """Return a mapping of algorithm name to prepared key"""
+        source = self._read_source()
+        if source is self._source:
+            return self._keys
+        with self._lock:
+            if source is not self._source:
+                self._keys = self._prepare(source[2])
+                self._source = source
+                self.version += 1
+                verified_token_cache.clear()
+                logger.info(f"Loaded JWT verification keys for algorithms: {sorted(self._keys)}")
+        return self._keys
+
+    @staticmethod
+    def _prepare(raw_key):
+        keys = {}
+        if not raw_key:
+            return keys
+        raw_key = raw_key.replace('\\n', '\n')
+        for algorithm in ALLOWED_JWT_ALGORITHMS:
+            try:
+                keys[algorithm] = jwt.get_algorithm_by_name(algorithm).prepare_key(raw_key)
+            except (jwt.InvalidKeyError, ValueError, TypeError):
+                continue
+        return keys
+
+
+class VerifiedTokenCache:
+    """
+    LRU of successfully verified tokens, keyed by the token's SHA-256 hash.
+
+    Entries expire at the token's exp minus JWT_LEEWAY (capped at
+    JWT_CACHE_MAX_TTL) and are dropped wholesale when the keys are reloaded.
+    """
+
+    def __init__(self, max_size=JWT_CACHE_MAX_SIZE):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.max_size = max_size
+
+    @staticmethod
+    def _hash(token, audience, key_version):
+        return hashlib.sha256(f"{key_version}:{audience}:{token}".encode()).hexdigest()
+
+    def get(self, token, audience, key_version):
+        token_hash = self._hash(token, audience, key_version)
+        with self._lock:
+            entry = self._entries.get(token_hash)
+            if entry is None:
+                return None
+            payload, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[token_hash]
+                return None
+            self._entries.move_to_end(token_hash)
+            return payload
+
+    def put(self, token, audience, key_version, payload):
+        now = time.time()
+        expires_at = now + JWT_CACHE_MAX_TTL
+        if isinstance(payload.get('exp'), (int, float)):
+            expires_at = min(expires_at, payload['exp'] - JWT_LEEWAY)
+        if expires_at <= now:
+            return
+        token_hash = self._hash(token, audience, key_version)
+        with self._lock:
+            self._entries[token_hash] = (payload, expires_at)
+            self._entries.move_to_end(token_hash)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+jwt_key_store = JWTKeyStore()
+verified_token_cache = VerifiedTokenCache()
+
+
+def preload_jwt_keys():
+    """Parse the verification keys at startup so the first login doesn't pay for it"""
+    keys = jwt_key_store.keys()
+    if not keys:
+        logger.warning("No usable ZENDESK_APP_PUBLIC_KEY configured, JWT authentication will fail")
+    return keys
+
+
 def verify_jwt(token):
-    logger.debug(f"Verifying JWT: {token[:10]}...")  # Log first 10 characters of token
     if not token:
         logger.warning(f"Missing token, request remote addr: {request.remote_addr}")
         return 'Missing token'
+    logger.debug("Verifying JWT: %s...", token[:10])  # Log first 10 characters of token
     try:
-        key = os.environ.get('ZENDESK_APP_PUBLIC_KEY')
+        keys = jwt_key_store.keys()
         audience = os.environ.get('ZENDESK_APP_AUD')
-        logger.debug(f"Key: {key[:10]}...")
-        logger.debug(f"Audience: {audience}")
-        if not key or not audience:
+        if not keys or not audience:
             logger.error(f"Missing ZENDESK_APP_PUBLIC_KEY or ZENDESK_APP_AUD in environment variables, request remote addr: {request.remote_addr}")
             return 'Missing ZENDESK_APP_PUBLIC_KEY or ZENDESK_APP_AUD in environment variables'
-        algorithms = ['RS256','HS256']
-        failed = []
-        for algorithm in algorithms:    
-            try:
-                payload = jwt.decode(token, key, algorithms=[algorithm], audience=audience, leeway=30)
-                return payload
-            except jwt.InvalidAlgorithmError as e:
-                logger.warning(f"Invalid algorithm: {str(e)}, request remote addr: {request.remote_addr}")
-                failed.append(algorithm)
-        if failed:
-            logger.warning(f"Failed to verify JWT with algorithms: {failed}, request remote addr: {request.remote_addr}")
-            return f'Failed to verify JWT with algorithms: {failed}'
+
+        key_version = jwt_key_store.version
+        cached = verified_token_cache.get(token, audience, key_version)
+        if cached is not None:
+            return cached
+
+        algorithm = jwt.get_unverified_header(token).get('alg')
+        if algorithm not in keys:
+            logger.warning(f"Unsupported JWT algorithm: {algorithm}, request remote addr: {request.remote_addr}")
+            return f'Failed to verify JWT with algorithm: {algorithm}'
+
+        payload = jwt.decode(token, keys[algorithm], algorithms=[algorithm], audience=audience, leeway=JWT_LEEWAY)
+        verified_token_cache.put(token, audience, key_version, payload)
+        return payload
     except jwt.ExpiredSignatureError:
         logger.warning(f"Token has expired, request remote addr: {request.remote_addr}")
         return 'Token has expired'
@@ -55,13 +196,20 @@ def init_required(f):
                 self.logger.error(f"Error getting subdomain: {error}, request remote addr: {self.remote_addr}")
                 return return_response({'Error in init': error}), 400 
 
+            # Wrap the body; tickets are only decoded when a view asks for them
+            if request.is_json:
+                self.payload = RequestPayload(raw=request.get_data(cache=True))
+            elif request.form:
+                self.payload = RequestPayload(data=request.form.to_dict())
+            elif request.method == 'GET':
+                self.payload = RequestPayload(data=request.args.to_dict())
+            else:
+                self.payload = RequestPayload()
+
             # Check for valid session
             if not session.get('subdomain'):
                 # No session exists - check for token
-                token = None
-                    
-                if check_element(self.data, 'token')[0]:
-                    token = self.data.get('token')
+                token = self.payload.token
                     
                 if not token:
                     self.logger.warning(f"No session or token found for IP: {self.remote_addr}")
@@ -74,39 +222,24 @@ def init_required(f):
                 # Set up Flask session
                 session['subdomain'] = self.subdomain
                 session.permanent = True
-                self.data.pop('token', None)
             elif session['subdomain'] != self.subdomain:
                 session.clear()
                 self.logger.warning(f"Invalid session subdomain, expected {self.subdomain}, got {session['subdomain']}")
                 return return_response({'error': 'Authentication required'}), 401
 
-            if request.is_json:
-                self.data = request.get_json()
-            elif request.form:
-                self.data = request.form.to_dict()
-            elif request.method == 'GET':
-                self.data = request.args.to_dict()
-                self.ticket_data = []  # Empty list for GET requests
-            else:
-                self.data = {}
+            # Only label metrics with tenants that passed authentication
+            bind_labels(request.endpoint, self.subdomain)
+            bind_priority(request_lane(request.endpoint, request.headers.get(PRIORITY_HEADER)), self.subdomain)
 
             # Initialize services
             self.pinecone_service = PineconeService(self.subdomain)
             try:
-                self.redis = RedisClient.get_instance()
+                self.redis = get_tenant_redis(self.subdomain)
             except RedisConfigError as e:
                 self.logger.error(f"Error connecting to Redis: {e}")
                 
             self.cache_ttl = 3600  # 1 hour cache TTL
 
-            self.ticket_data = []
-            if 'tickets' in self.data:
-                for ticket in self.data['tickets']:
-                    self.logger.info(f"Processing ticket: {ticket.get('id')}, request remote addr: {self.remote_addr}")
-                    self.ticket_data.append(TicketInput(**ticket))
-            else:
-                self.logger.warning(f"No tickets found in request, request remote addr: {self.remote_addr}")
-
             return f(self, *args, **kwargs)
         except Exception as e:
             logger.error(f"Error in init_required: {e}")
@@ -0,0 +1,129 @@
+from dataclasses import dataclass
+from typing import List, Sequence
+import numpy as np
+import dotenv, os
+import logging
+import math
+import re
+
+try:
+    import tiktoken
+except ImportError:  # Optional: fall back to a character-based estimate
+    tiktoken = None
+
+dotenv.load_dotenv()
+logger = logging.getLogger('chunking')
+
+# text-embedding-3 models accept 8191 tokens; smaller windows keep each chunk's sentiment local
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", 512))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", 32))
+# Longer texts (log dumps, transcripts) are represented by this many evenly spaced windows
+CHUNK_MAX_CHUNKS = int(os.getenv("CHUNK_MAX_CHUNKS", 16))
+EMBEDDING_POOLING = os.getenv("EMBEDDING_POOLING", "weighted").lower()
+TOKENIZER_ENCODING = os.getenv("TOKENIZER_ENCODING", "cl100k_base")
+
+_WORD_RE = re.compile(r"\S+\s*")
+_encoding = None
+_encoding_loaded = False
+
+
+@dataclass
+class Chunk:
+    text: str
+    tokens: int
+
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        if tiktoken is not None:
+            try:
+                _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+            except Exception as e:
+                # The BPE file is downloaded on first use; without it we estimate
+                logger.error(f"Error loading tokenizer {TOKENIZER_ENCODING}, estimating token counts: {e}")
+    return _encoding
+
+
+def warm_tokenizer() -> None:
+    """Load the BPE ranks (a download unless TIKTOKEN_CACHE_DIR has them) before the first comment"""
+    _get_encoding()
+
+
+def estimate_tokens(text: str) -> int:
+    """Roughly 4 characters per token for English text, as OpenAI documents for its tokenizers"""
+    return math.ceil(len(text) / 4) if text else 0
+
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _windows(length: int, size: int, overlap: int) -> List[range]:
+    step = max(size - overlap, 1)
+    starts = [0]
+    while starts[-1] + size < length:
+        starts.append(starts[-1] + step)
+    return [range(start, min(start + size, length)) for start in starts]
+
+
+def _spread(windows: list, limit: int) -> list:
+    if len(windows) <= limit:
+        return windows
+    picks = np.linspace(0, len(windows) - 1, limit).round().astype(int)
+    return [windows[i] for i in picks]
+
+
+def chunk_text(text: str, max_tokens: int = CHUNK_MAX_TOKENS, overlap: int = CHUNK_OVERLAP_TOKENS,
+               max_chunks: int = CHUNK_MAX_CHUNKS) -> List[Chunk]:
+    """Split text into windows of at most max_tokens, overlapping by `overlap` tokens"""
+    overlap = min(overlap, max_tokens // 2)
+    encoding = _get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return [Chunk(text, len(tokens))]
+        windows = _spread(_windows(len(tokens), max_tokens, overlap), max_chunks)
+        # A window edge can split a multi-byte character; drop the fragment
+        return [Chunk(encoding.decode(tokens[w.start:w.stop], errors="ignore"), len(w)) for w in windows]
+
+    # Without a tokenizer, window over whitespace-separated words with estimated sizes
+    if estimate_tokens(text) <= max_tokens:
+        return [Chunk(text, estimate_tokens(text))]
+    words = _WORD_RE.findall(text)
+    sizes = [estimate_tokens(word) for word in words]
+    chunks = []
+    start = 0
+    while start < len(words):
+        end, total = start, 0
+        while end < len(words) and (total + sizes[end] <= max_tokens or end == start):
+            total += sizes[end]
+            end += 1
+        chunks.append(Chunk(''.join(words[start:end]).strip(), total))
+        if end >= len(words):
+            break
+        # Step back over roughly `overlap` tokens of words for the next window
+        back, carried = end, 0
+        while back > start + 1 and carried + sizes[back - 1] <= overlap:
+            back -= 1
+            carried += sizes[back]
+        start = back
+    return _spread(chunks, max_chunks)
+
+
+def pool_embeddings(vectors: Sequence[Sequence[float]], weights: Sequence[int] = None,
+                    mode: str = EMBEDDING_POOLING) -> List[float]:
+    """Combine chunk embeddings into one unit vector, averaged evenly or by chunk length"""
+    if len(vectors) == 1:
+        return list(vectors[0])
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if mode == "weighted" and weights is not None:
+        pooled = np.average(matrix, axis=0, weights=np.asarray(weights, dtype=np.float32))
+    else:
+        pooled = matrix.mean(axis=0)
+    norm = np.linalg.norm(pooled)
+    return (pooled / norm if norm > 0 else pooled).tolist()
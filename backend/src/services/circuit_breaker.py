@@ -0,0 +1,104 @@
+from typing import Dict
+from services.metrics_service import record_circuit_state
+import dotenv, os
+import logging
+import threading
+import time
+
+dotenv.load_dotenv()
+logger = logging.getLogger('circuit_breaker')
+
+CIRCUIT_BREAKING = os.getenv("CIRCUIT_BREAKING", "true").lower() == "true"
+# Consecutive failed (or slower than CIRCUIT_SLOW_CALL_SECONDS) calls that open the circuit
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5))
+CIRCUIT_SLOW_CALL_SECONDS = float(os.getenv("CIRCUIT_SLOW_CALL_SECONDS", 5))
+# How long an open circuit fails fast before letting one trial call through
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", 30))
+
+CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open"""
+
+    def __init__(self, dependency: str, retry_in: float):
+        super().__init__(f"{dependency} circuit open, retrying in {retry_in:.1f}s")
+        self.dependency = dependency
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Per-worker circuit for one dependency. After `failure_threshold` consecutive
+    failures calls fail fast for `reset_timeout` seconds; then a single trial call
+    is let through and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout: float = CIRCUIT_RESET_SECONDS, slow_call: float = CIRCUIT_SLOW_CALL_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.slow_call = slow_call
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls would be rejected; does not claim the half-open trial"""
+        return self.state == OPEN and time.monotonic() - self._opened_at < self.reset_timeout
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError unless this call may go ahead"""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            now = time.monotonic()
+            if self.state == OPEN:
+                remaining = self.reset_timeout - (now - self._opened_at)
+                if remaining > 0:
+                    raise CircuitOpenError(self.name, remaining)
+                self._set_state(HALF_OPEN)
+            if self._trial_in_flight:
+                raise CircuitOpenError(self.name, 0)
+            self._trial_in_flight = True
+
+    def record(self, success: bool, latency: float = 0.0) -> None:
+        with self._lock:
+            self._trial_in_flight = False
+            if success and latency <= self.slow_call:
+                self.failures = 0
+                if self.state != CLOSED:
+                    logger.info(f"{self.name} circuit closed")
+                    self._set_state(CLOSED)
+                return
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.warning(f"{self.name} circuit opened after {self.failures} failed or slow calls")
+                self._opened_at = time.monotonic()
+                self._set_state(OPEN)
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        record_circuit_state(self.name, state)
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(dependency: str) -> CircuitBreaker:
+    breaker = _breakers.get(dependency)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(dependency, CircuitBreaker(dependency))
+    return breaker
+
+
+def is_degraded(*dependencies: str) -> bool:
+    """Whether any of the named dependencies is currently failing fast in this worker"""
+    return any(get_breaker(dependency).is_open for dependency in dependencies)
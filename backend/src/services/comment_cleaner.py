@@ -0,0 +1,185 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from bs4 import BeautifulSoup as bs
+from services.chunking import count_tokens
+from services.metrics_service import record_comment_cleaning
+import dotenv, os
+import hashlib
+import logging
+import re
+
+dotenv.load_dotenv()
+logger = logging.getLogger('comment_cleaner')
+
+COMMENT_CLEANING = os.getenv("COMMENT_CLEANING", "true").lower() == "true"
+# A trailing line seen this many times at the end of a tenant's comments is treated as signature
+SIGNATURE_MIN_OCCURRENCES = int(os.getenv("SIGNATURE_MIN_OCCURRENCES", 3))
+SIGNATURE_TTL = int(os.getenv("SIGNATURE_TTL", 30 * 24 * 3600))
+SIGNATURE_MAX_LINES = 6
+SIGNATURE_MAX_LINE_LENGTH = 120
+
+# Elements mail clients wrap around the quoted thread
+QUOTE_SELECTORS = (
+    'blockquote',
+    '.gmail_quote', '.gmail_extra', '.gmail_signature',
+    '.yahoo_quoted', '.moz-cite-prefix', '.moz-signature',
+    '#appendonsend', '#divRplyFwdMsg', '[id^="divRplyFwdMsg"]',
+    '.zendesk_quote', '.signature',
+)
+
+# Everything from one of these lines down is earlier history
+REPLY_HEADER_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in (
+    r'^on\b.{0,200}\bwrote:\s*$',
+    r'^le\b.{0,200}\ba écrit\s*:\s*$',
+    r'^am\b.{0,200}\bschrieb\b.{0,100}:\s*$',
+    r'^el\b.{0,200}\bescribió:\s*$',
+    r'^-{2,}\s*original message\s*-{2,}\s*$',
+    r'^-{2,}\s*forwarded message\s*-{2,}\s*$',
+    r'^_{10,}\s*$',
+    r'^from:\s.+$',
+    r'^##-\s*please type your reply above this line\s*-##',
+)]
+# "On Tue, 3 Oct 2023 at 10:02, Jane <jane@example.com>" often wraps before "wrote:"
+WRAPPED_HEADER_START = re.compile(r'^(on|le|am|el)\b.{0,200}$', re.IGNORECASE)
+WRAPPED_HEADER_END = re.compile(r'^.{0,200}\b(wrote|a écrit|schrieb|escribió)\s*:\s*$', re.IGNORECASE)
+# RFC 3676 signature delimiter and the common mobile footers
+SIGNATURE_DELIMITER = re.compile(r'^(--|—|__)\s*$|^sent from my \w+', re.IGNORECASE)
+
+
+@dataclass
+class CleanedComment:
+    text: str
+    original_tokens: int
+    cleaned_tokens: int
+    removed: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(self.original_tokens - self.cleaned_tokens, 0)
+
+
+def _fingerprint(line: str) -> str:
+    normalized = re.sub(r'\W+', ' ', line.lower()).strip()
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:16]
+
+
+class CommentCleaner:
+    """
+    Turns comment HTML into the text worth embedding: drops quoted history, reply headers
+    and signatures. Signatures are learned per tenant from lines that keep reappearing at
+    the end of comments; fingerprints and savings are kept in Redis.
+    """
+
+    def __init__(self, redis=None, tenant: Optional[str] = None, enabled: bool = COMMENT_CLEANING):
+        self.redis = redis
+        self.tenant = tenant
+        self.enabled = enabled
+
+    @property
+    def signatures_key(self) -> str:
+        return f"{self.tenant}:signatures"
+
+    @property
+    def stats_key(self) -> str:
+        return f"{self.tenant}:comment_cleaning"
+
+    def clean(self, html: str) -> CleanedComment:
+        soup = bs(html, 'html.parser')
+        original = ' '.join(soup.get_text().split())
+        if not self.enabled:
+            return CleanedComment(original, count_tokens(original), count_tokens(original))
+
+        removed = {}
+        quote_blocks = 0
+        for element in [element for selector in QUOTE_SELECTORS for element in soup.select(selector)]:
+            # Nested matches are already gone with their parent
+            if not element.decomposed:
+                element.decompose()
+                quote_blocks += 1
+        if quote_blocks:
+            removed['quote_blocks'] = quote_blocks
+
+        lines = [line.strip() for line in soup.get_text('\n').splitlines()]
+        lines = self._strip_history(lines, removed)
+        lines = self._strip_signature(lines, removed)
+
+        text = ' '.join(' '.join(lines).split())
+        if not text:
+            # Nothing but history (e.g. a bare forward): better to embed it than nothing
+            text = original
+            removed = {}
+        cleaned = CleanedComment(text, count_tokens(original), count_tokens(text), removed)
+        self._record(cleaned)
+        return cleaned
+
+    def _strip_history(self, lines: List[str], removed: Dict[str, int]) -> List[str]:
+        kept = []
+        for i, line in enumerate(lines):
+            if line.startswith('>'):
+                removed['quoted_lines'] = removed.get('quoted_lines', 0) + 1
+                continue
+            next_line = next((l for l in lines[i + 1:i + 3] if l), '')
+            if any(pattern.match(line) for pattern in REPLY_HEADER_PATTERNS) or (
+                    WRAPPED_HEADER_START.match(line) and not line.endswith('.') and WRAPPED_HEADER_END.match(next_line)):
+                if any(kept):
+                    removed['reply_header'] = 1
+                    removed['history_lines'] = sum(1 for l in lines[i:] if l)
+                    break
+                # A header on the first line means the new text is below it (bottom-posting)
+                continue
+            kept.append(line)
+        return kept
+
+    def _strip_signature(self, lines: List[str], removed: Dict[str, int]) -> List[str]:
+        for i, line in enumerate(lines):
+            if i and SIGNATURE_DELIMITER.match(line) and any(lines[:i]):
+                removed['signature_lines'] = sum(1 for l in lines[i:] if l)
+                return lines[:i]
+
+        tail = [i for i in range(len(lines) - 1, -1, -1) if lines[i]][:SIGNATURE_MAX_LINES]
+        tail = [i for i in tail if len(lines[i]) <= SIGNATURE_MAX_LINE_LENGTH]
+        if not tail or self.redis is None or not self.tenant:
+            return lines
+
+        fingerprints = [_fingerprint(lines[i]) for i in tail]
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hmget(self.signatures_key, fingerprints)
+            for fingerprint in fingerprints:
+                pipe.hincrby(self.signatures_key, fingerprint, 1)
+            pipe.expire(self.signatures_key, SIGNATURE_TTL)
+            counts = pipe.execute()[0]
+        except Exception as e:
+            logger.error(f"Error reading signature fingerprints for {self.tenant}: {e}")
+            return lines
+
+        # Walk up from the last line while lines are known signature lines
+        cut = len(lines)
+        for i, count in zip(tail, counts):
+            if int(count or 0) + 1 < SIGNATURE_MIN_OCCURRENCES:
+                break
+            cut = i
+        if cut < len(lines) and any(lines[:cut]):
+            removed['signature_lines'] = sum(1 for l in lines[cut:] if l)
+            return lines[:cut]
+        return lines
+
+    def _record(self, cleaned: CleanedComment) -> None:
+        record_comment_cleaning(cleaned.original_tokens, cleaned.cleaned_tokens, cleaned.removed)
+        if self.redis is None or not self.tenant:
+            return
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hincrby(self.stats_key, 'comments', 1)
+            pipe.hincrby(self.stats_key, 'original_tokens', cleaned.original_tokens)
+            pipe.hincrby(self.stats_key, 'cleaned_tokens', cleaned.cleaned_tokens)
+            for section, count in cleaned.removed.items():
+                pipe.hincrby(self.stats_key, section, count)
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"Error recording comment cleaning stats for {self.tenant}: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        stats = {key: int(value) for key, value in (self.redis.hgetall(self.stats_key) or {}).items()}
+        stats['tokens_saved'] = max(stats.get('original_tokens', 0) - stats.get('cleaned_tokens', 0), 0)
+        return stats
@@ -0,0 +1,184 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from openai import OpenAI
+from services.chunking import count_tokens
+from services.rate_limiter import EMBEDDING_REQUESTS, EMBEDDING_TOKENS, get_guard
+import numpy as np
+import dotenv, os
+import logging
+import re
+import threading
+
+dotenv.load_dotenv()
+logger = logging.getLogger('embedding_service')
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai").lower()
+OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+OPENAI_EMBEDDING_BATCH_SIZE = int(os.getenv("OPENAI_EMBEDDING_BATCH_SIZE", 256))
+# Shorter vectors from the same model (text-embedding-3 supports any size up to 1536); unset keeps full size
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", 0)) or None
+LOCAL_EMBEDDING_MODEL_PATH = os.getenv("LOCAL_EMBEDDING_MODEL_PATH")
+LOCAL_EMBEDDING_BATCH_SIZE = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", 64))
+LOCAL_EMBEDDING_WORKERS = int(os.getenv("LOCAL_EMBEDDING_WORKERS", min(os.cpu_count() or 1, 4)))
+
+# Vectors written before backends were pluggable live in un-suffixed namespaces
+DEFAULT_BACKEND_NAME = "openai"
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+def backend_namespace(base: Optional[str], backend_name: str) -> Optional[str]:
+    """The Pinecone namespace holding `backend_name`'s vectors for `base` (a tenant or 'emotions')"""
+    if not base or backend_name == DEFAULT_BACKEND_NAME:
+        return base
+    return f"{base}__{backend_name}"
+
+
+def openai_backend_name(model: str, dimensions: Optional[int] = None) -> str:
+    name = DEFAULT_BACKEND_NAME if model == "text-embedding-3-small" else f"openai-{model}"
+    if dimensions:
+        name = f"{name}-d{dimensions}"
+    return name
+
+
+def reduce_dimensions(vector, dimensions: int) -> np.ndarray:
+    """
+    Truncate and re-normalize, which is what the API's `dimensions` parameter does for
+    text-embedding-3 models, so re-projected vectors match freshly embedded ones
+    """
+    truncated = np.asarray(vector, dtype=np.float32)[..., :dimensions]
+    norms = np.linalg.norm(truncated, axis=-1, keepdims=True)
+    return np.divide(truncated, norms, out=np.zeros_like(truncated), where=norms > 0)
+
+
+class EmbeddingBackend:
+    """Turns text into vectors. Vectors from different backends must never share a namespace."""
+    name: str = ""
+    dimension: int = 0
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        raise NotImplementedError
+
+    def embed_one(self, text: str) -> List[float]:
+        return self.embed([text])[0]
+
+    def warm(self) -> None:
+        pass
+
+    def namespace(self, base: Optional[str]) -> Optional[str]:
+        """The Pinecone namespace holding this backend's vectors for `base` (a tenant or 'emotions')"""
+        return backend_namespace(base, self.name)
+
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    FULL_DIMENSION = 1536
+
+    def __init__(self, client=None, model: str = OPENAI_EMBEDDING_MODEL, batch_size: int = OPENAI_EMBEDDING_BATCH_SIZE,
+                 dimensions: Optional[int] = EMBEDDING_DIMENSIONS):
+        # Retries happen in the 'openai' guard, where they are coordinated with the rate limiter
+        self.client = client or OpenAI(max_retries=0)
+        self.model = model
+        self.batch_size = batch_size
+        self.dimensions = dimensions if dimensions and dimensions < self.FULL_DIMENSION else None
+        self.dimension = self.dimensions or self.FULL_DIMENSION
+        self.name = openai_backend_name(model, self.dimensions)
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        options = {"dimensions": self.dimensions} if self.dimensions else {}
+        vectors = []
+        for i in range(0, len(texts), self.batch_size):
+            batch = texts[i:i + self.batch_size]
+            tokens = sum(count_tokens(text) for text in batch)
+            response = get_guard('openai').call(
+                lambda: self.client.embeddings.create(model=self.model, input=batch, **options),
+                [(EMBEDDING_REQUESTS, 1), (EMBEDDING_TOKENS, tokens)]
+            )
+            vectors.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+        return vectors
+
+    def warm(self) -> None:
+        if os.getenv("OPENAI_API_KEY"):
+            self.client.models.retrieve(self.model)
+
+
+class LocalEmbeddingBackend(EmbeddingBackend):
+    """
+    Static token-embedding model evaluated on the CPU with NumPy: a text's vector is the
+    (optionally weighted) sum of its token vectors, L2-normalized.
+
+    The model file is an .npz with `vocab` (str array), `embeddings` (float32, vocab x dim)
+    and optionally `weights` (float32 per token, e.g. IDF). Batches are split across a small
+    thread pool; NumPy releases the GIL for the gather and reduce.
+    """
+
+    def __init__(self, model_path: str, batch_size: int = LOCAL_EMBEDDING_BATCH_SIZE,
+                 workers: int = LOCAL_EMBEDDING_WORKERS):
+        if not model_path or not os.path.exists(model_path):
+            raise ValueError(f"LOCAL_EMBEDDING_MODEL_PATH does not point at a model file: {model_path}")
+        with np.load(model_path, allow_pickle=False) as model:
+            vocab = model["vocab"].tolist()
+            self._matrix = np.ascontiguousarray(model["embeddings"], dtype=np.float32)
+            self._weights = np.asarray(model["weights"], dtype=np.float32) if "weights" in model.files else None
+        self._vocab = {token: i for i, token in enumerate(vocab)}
+        self._unknown = self._vocab.get("[UNK]")
+        self.dimension = int(self._matrix.shape[1])
+        self.batch_size = batch_size
+        self.name = f"local-{os.path.splitext(os.path.basename(model_path))[0]}"
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embedding") if workers > 1 else None
+        logger.info(f"Loaded local embedding model {self.name}: {len(vocab)} tokens x {self.dimension} dims")
+
+    def _token_ids(self, text: str) -> List[int]:
+        ids = []
+        for token in _TOKEN_RE.findall(text.lower()):
+            index = self._vocab.get(token, self._unknown)
+            if index is not None:
+                ids.append(index)
+        return ids
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        token_ids = [self._token_ids(text) for text in texts]
+        lengths = np.fromiter((len(ids) for ids in token_ids), dtype=np.int64, count=len(texts))
+        out = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        present = lengths > 0
+        if present.any():
+            flat = np.fromiter((i for ids in token_ids for i in ids), dtype=np.int64, count=int(lengths.sum()))
+            rows = self._matrix[flat]
+            if self._weights is not None:
+                rows *= self._weights[flat, None]
+            starts = np.concatenate(([0], np.cumsum(lengths[present])[:-1]))
+            out[present] = np.add.reduceat(rows, starts, axis=0)
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        np.divide(out, norms, out=out, where=norms > 0)
+        return out
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if self._pool and len(batches) > 1:
+            results = list(self._pool.map(self._embed_batch, batches))
+        else:
+            results = [self._embed_batch(batch) for batch in batches]
+        return [row.tolist() for result in results for row in result]
+
+
+_backend = None
+_backend_pid = None
+_backend_lock = threading.Lock()
+
+
+def create_embedding_backend(name: str = EMBEDDING_BACKEND) -> EmbeddingBackend:
+    if name == "openai":
+        return OpenAIEmbeddingBackend()
+    if name == "local":
+        return LocalEmbeddingBackend(LOCAL_EMBEDDING_MODEL_PATH)
+    raise ValueError(f"Unknown EMBEDDING_BACKEND: {name}")
+
+
+def get_embedding_backend() -> EmbeddingBackend:
+    """The configured backend, created once per process (thread pools don't survive a fork)"""
+    global _backend, _backend_pid
+    if _backend_pid != os.getpid():
+        with _backend_lock:
+            if _backend_pid != os.getpid():
+                _backend = create_embedding_backend()
+                _backend_pid = os.getpid()
+    return _backend
@@ -0,0 +1,134 @@
+from typing import Dict, List, Optional
+import numpy as np
+import dotenv, os
+import logging
+import threading
+import time
+
+dotenv.load_dotenv()
+logger = logging.getLogger('emotion_index')
+
+# 'off' queries Pinecone for every comment; 'float16' or 'int8' keep a compact copy of the
+# emotion reference set in each worker and score comments against it in-process
+EMOTION_INDEX_MODE = os.getenv("EMOTION_INDEX_MODE", "off").lower()
+EMOTION_INDEX_REFRESH_SECONDS = int(os.getenv("EMOTION_INDEX_REFRESH_SECONDS", 3600))
+
+
+class QuantizedEmotionIndex:
+    """
+    Cosine top-k over the emotion reference vectors, held as float16 or as int8 with a
+    per-vector scale. Returns matches shaped like Pinecone's (`score`, `metadata`).
+    """
+
+    def __init__(self, ids: List[str], values, metadata: List[dict], mode: str = "int8"):
+        if mode not in ("int8", "float16"):
+            raise ValueError(f"Unknown EMOTION_INDEX_MODE: {mode}")
+        vectors = np.asarray(values, dtype=np.float32).reshape(len(ids), -1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+        if mode == "int8":
+            peak = np.abs(vectors).max(axis=1)
+            self.scales = np.where(peak > 0, peak / 127.0, 1.0).astype(np.float32)
+            self.vectors = np.round(vectors / self.scales[:, None]).astype(np.int8)
+        else:
+            self.scales = None
+            self.vectors = vectors.astype(np.float16)
+        self.ids = list(ids)
+        self.metadata = metadata
+        self.mode = mode
+        self.dimension = vectors.shape[1] if len(ids) else 0
+        self.loaded_at = time.time()
+
+    @property
+    def nbytes(self) -> int:
+        return self.vectors.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def query(self, vector, top_k: int = 10) -> List[dict]:
+        if not self.ids:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+        scores = (self.vectors @ query).astype(np.float32, copy=False)
+        if self.scales is not None:
+            scores *= self.scales
+        k = min(top_k, len(self.ids))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [{"id": self.ids[i], "score": float(scores[i]), "metadata": self.metadata[i]} for i in top]
+
+
+_indexes: Dict[str, QuantizedEmotionIndex] = {}
+_indexes_lock = threading.Lock()
+# Background reloads in progress, by namespace
+_refreshes: Dict[str, threading.Thread] = {}
+
+
+def load_emotion_index(pinecone_service, namespace: str, mode: str = EMOTION_INDEX_MODE) -> QuantizedEmotionIndex:
+    """Read every reference vector in `namespace` and build the in-process index"""
+    ordered = []
+    # Each page is fetched while the next one is being listed
+    for ids in pinecone_service.iter_vector_ids(namespace=namespace):
+        records = pinecone_service.fetch_vectors(ids, namespace=namespace, include_values=True)
+        ordered.extend(records[id] for id in ids if id in records)
+    index = QuantizedEmotionIndex(
+        [record["id"] for record in ordered],
+        [list(record["values"]) for record in ordered],
+        [dict(record["metadata"] or {}) for record in ordered],
+        mode
+    )
+    logger.info(f"Loaded {len(index)} emotion vectors from {namespace} as {mode} ({index.nbytes} bytes)")
+    return index
+
+
+def get_emotion_index(pinecone_service) -> Optional[QuantizedEmotionIndex]:
+    """
+    The worker's copy for the service's emotions namespace, or None when the mode is off.
+    Only the first load blocks; a stale copy keeps being served while a thread reloads it.
+    """
+    if EMOTION_INDEX_MODE == "off":
+        return None
+    namespace = pinecone_service.emotions_namespace
+    index = _indexes.get(namespace)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(namespace)
+            if index is None:
+                index = _indexes[namespace] = load_emotion_index(pinecone_service, namespace)
+    elif time.time() - index.loaded_at > EMOTION_INDEX_REFRESH_SECONDS:
+        _schedule_refresh(pinecone_service, namespace)
+    return index
+
+
+def _schedule_refresh(pinecone_service, namespace: str) -> None:
+    if not _indexes_lock.acquire(blocking=False):
+        return
+    try:
+        # Threads don't survive a fork, so a reload started in the parent doesn't count here
+        refresh = _refreshes.get(namespace)
+        if refresh is not None and refresh.is_alive():
+            return
+        refresh = threading.Thread(target=_refresh, args=(pinecone_service, namespace),
+                                   name='emotion-index-refresh', daemon=True)
+        _refreshes[namespace] = refresh
+        refresh.start()
+    finally:
+        _indexes_lock.release()
+
+
+def _refresh(pinecone_service, namespace: str) -> None:
+    try:
+        _indexes[namespace] = load_emotion_index(pinecone_service, namespace)
+    except Exception as e:
+        # Keep serving the copy we have; try again after another refresh period
+        logger.error(f"Error refreshing emotion index {namespace}: {e}")
+        _indexes[namespace].loaded_at = time.time()
+
+
+def warm_emotion_index():
+    from services.pinecone_service import PineconeService
+    get_emotion_index(PineconeService())
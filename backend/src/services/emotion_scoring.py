@@ -0,0 +1,107 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from models import emotions
+import numpy as np
+import json
+
+# Match metadata keys that are not emotion flags
+NON_EMOTION_KEYS = ('text', 'timestamp')
+
+# emotion name -> (summed similarity of the reference matches showing it, number of such matches)
+EmotionProfile = Dict[str, Tuple[float, int]]
+
+
+def emotion_profile(matches: Sequence[Any]) -> EmotionProfile:
+    """
+    Accumulate a comment's nearest emotion references per emotion. Emotions missing from
+    the weights table are kept too, so adding one later can be applied by re-scoring.
+    """
+    sums: Dict[str, float] = {}
+    counts: Dict[str, int] = {}
+    for match in matches:
+        for emotion_name, emotion_present in match['metadata'].items():
+            if emotion_name in NON_EMOTION_KEYS or not emotion_present:
+                continue
+            sums[emotion_name] = sums.get(emotion_name, 0.0) + float(match['score'])
+            counts[emotion_name] = counts.get(emotion_name, 0) + 1
+    return {name: (sums[name], counts[name]) for name in sums}
+
+
+def score_profile(profile: EmotionProfile) -> float:
+    """Weighted mean of the profile's known emotions, in [-10, 10]"""
+    total = 0.0
+    count = 0
+    for emotion_name, (similarity, matched) in profile.items():
+        if emotion_name in emotions:
+            total += emotions[emotion_name].score * similarity
+            count += matched
+    return max(min(total / count, 10), -10) if count else 0
+
+
+def encode_profile(profile: EmotionProfile) -> str:
+    """Pinecone metadata values can't be nested, so the profile is stored as compact JSON"""
+    return json.dumps({name: [round(similarity, 6), matched] for name, (similarity, matched) in profile.items()},
+                      separators=(',', ':'), sort_keys=True)
+
+
+def decode_profile(encoded: Optional[str]) -> Optional[EmotionProfile]:
+    if not encoded:
+        return None
+    try:
+        return {name: (float(values[0]), int(values[1])) for name, values in json.loads(encoded).items()}
+    except (ValueError, TypeError, IndexError, AttributeError):
+        return None
+
+
+def profile_matrices(profiles: Sequence[EmotionProfile], names: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """(similarity, count) matrices of shape (comments, emotions) over the given emotion names"""
+    column = {name: i for i, name in enumerate(names)}
+    similarity = np.zeros((len(profiles), len(names)), dtype=np.float64)
+    counts = np.zeros((len(profiles), len(names)), dtype=np.float64)
+    for row, profile in enumerate(profiles):
+        for name, (summed, matched) in profile.items():
+            i = column.get(name)
+            if i is not None:
+                similarity[row, i] = summed
+                counts[row, i] = matched
+    return similarity, counts
+
+
+def rescore(similarity: np.ndarray, counts: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """score_profile for every row at once"""
+    matched = counts.sum(axis=1)
+    scores = np.divide(similarity @ weights, matched, out=np.zeros(len(matched)), where=matched > 0)
+    return np.clip(scores, -10, 10)
+
+
+def current_weights() -> Tuple[List[str], np.ndarray]:
+    names = list(emotions)
+    return names, np.array([emotions[name].score for name in names], dtype=np.float64)
+
+
+def ticket_scores(ticket_ids: Sequence[str], timestamps: Sequence[float], scores: Sequence[float],
+                  lambda_factor: float = 1.0) -> Dict[str, float]:
+    """
+    Ticket scores from comment scores, as analyze-comments computes them, for all tickets at
+    once: an exponentially time-decayed mean, replaced by the newest comment's score when
+    that differs from it by more than the standard deviation, scaled to [-1, 1].
+    """
+    if not len(ticket_ids):
+        return {}
+    tickets, ticket_index = np.unique(np.asarray(ticket_ids), return_inverse=True)
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    scores = np.asarray(scores, dtype=np.float64)
+    # Group by ticket, newest comment first within each
+    order = np.lexsort((-timestamps, ticket_index))
+    ticket_index, timestamps, scores = ticket_index[order], timestamps[order], scores[order]
+    starts = np.flatnonzero(np.r_[True, ticket_index[1:] != ticket_index[:-1]])
+    sizes = np.diff(np.r_[starts, len(scores)])
+
+    newest = np.repeat(timestamps[starts], sizes)
+    weights = np.exp(-lambda_factor * (newest - timestamps) / (24 * 3600))
+    weighted = np.add.reduceat(weights * scores, starts) / np.add.reduceat(weights, starts)
+    mean = np.add.reduceat(scores, starts) / sizes
+    std = np.sqrt(np.maximum(np.add.reduceat(scores * scores, starts) / sizes - mean * mean, 0))
+    most_recent = scores[starts]
+    result = np.where(np.abs(most_recent - weighted) > std, most_recent, weighted)
+    result = np.clip(result / 10, -1, 1)
+    return dict(zip(tickets[ticket_index[starts]].tolist(), result.tolist()))
@@ -0,0 +1,167 @@
+from dataclasses import dataclass, field, replace
+from typing import Dict
+from config.redis_config import RedisClient
+from services.pinecone_service import PineconeService
+from services.tenant_router import DEFAULT_REDIS_SHARD, tenant_router
+import dotenv, os
+import logging
+import threading
+import time
+
+dotenv.load_dotenv()
+logger = logging.getLogger('health_prober')
+
+# How often each worker re-checks Pinecone and Redis and re-reads the index stats
+HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", 15))
+# A snapshot older than this is reported stale and refreshed inline by the next reader
+HEALTH_STALE_AFTER = float(os.getenv("HEALTH_STALE_AFTER", 60))
+# A namespace missing from the snapshot is re-checked live at most this often, so a
+# tenant's first vectors are seen without waiting for the next probe
+NAMESPACE_RECHECK_SECONDS = float(os.getenv("NAMESPACE_RECHECK_SECONDS", 5))
+
+
+@dataclass
+class HealthSnapshot:
+    pinecone_ready: bool = False
+    redis_ready: bool = False
+    # namespace -> vector count, from describe_index_stats
+    namespaces: Dict[str, int] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+    checked_at: float = 0.0
+    stats_at: float = 0.0
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.checked_at
+
+    @property
+    def stale(self) -> bool:
+        return self.age > HEALTH_STALE_AFTER
+
+
+class HealthProber:
+    """
+    Background thread that keeps one HealthSnapshot per worker current, so health
+    checks and namespace lookups are answered from memory instead of calling Pinecone.
+    """
+
+    def __init__(self, interval: float = HEALTH_PROBE_INTERVAL):
+        self.interval = interval
+        self.snapshot = HealthSnapshot()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def start(self) -> None:
+        # Threads don't survive a fork; each worker runs its own prober
+        if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+            return
+        self.probe()
+        self._stop.clear()
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='health-prober', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.probe()
+
+    def probe(self, blocking: bool = True) -> HealthSnapshot:
+        """
+        Check every dependency once and publish the result as the new snapshot. Without
+        blocking, a probe already in progress elsewhere is not repeated.
+        """
+        if not self._lock.acquire(blocking=blocking):
+            return self.snapshot
+        try:
+            snapshot = HealthSnapshot(namespaces=self.snapshot.namespaces, stats_at=self.snapshot.stats_at)
+            service = None
+            try:
+                service = PineconeService()
+                description = service.check_health()
+                # Vectors of the wrong size fail every upsert and query, so the worker isn't ready
+                service.check_dimension(description)
+                snapshot.pinecone_ready = bool(description.get('status', {}).get('ready', True))
+            except Exception as e:
+                snapshot.errors['pinecone'] = str(e)
+                logger.error(f"Pinecone health probe failed: {e}")
+            if service is not None:
+                try:
+                    snapshot.namespaces = self._read_namespaces(service)
+                    snapshot.stats_at = time.time()
+                except Exception as e:
+                    # Keep the last known counts; they change slowly
+                    snapshot.errors['index_stats'] = str(e)
+                    logger.error(f"Index stats probe failed: {e}")
+            snapshot.redis_ready = RedisClient.health_check()
+            if not snapshot.redis_ready:
+                snapshot.errors['redis'] = 'ping failed'
+            for shard in tenant_router.redis_shards:
+                if shard == DEFAULT_REDIS_SHARD:
+                    continue
+                try:
+                    tenant_router.redis(shard).ping()
+                except Exception as e:
+                    snapshot.redis_ready = False
+                    snapshot.errors[f'redis:{shard}'] = str(e)
+                    logger.error(f"Redis shard {shard} health probe failed: {e}")
+            snapshot.checked_at = time.time()
+            self.snapshot = snapshot
+            return snapshot
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def _read_namespaces(service: PineconeService) -> Dict[str, int]:
+        """Vector counts per namespace across every index tenants are placed on"""
+        counts: Dict[str, int] = {}
+        for index_name in tenant_router.indexes:
+            index_service = service if index_name == service.index_name else PineconeService(index_name=index_name)
+            stats = index_service.describe_index_stats()
+            for namespace, summary in stats.get('namespaces', {}).items():
+                counts[namespace] = counts.get(namespace, 0) + int(summary.get('vector_count', 0))
+        return counts
+
+    def get_snapshot(self) -> HealthSnapshot:
+        snapshot = self.snapshot
+        if snapshot.stale:
+            # Prober not running here (dev server) or stuck; one reader refreshes, the rest use what there is
+            snapshot = self.probe(blocking=False)
+        return snapshot
+
+    def namespace_count(self, namespace: str) -> int:
+        """Vector count for a namespace, re-read live when the snapshot doesn't have it yet"""
+        snapshot = self.get_snapshot()
+        count = snapshot.namespaces.get(namespace, 0)
+        if count or time.time() - snapshot.stats_at < NAMESPACE_RECHECK_SECONDS:
+            return count
+        if not self._lock.acquire(blocking=False):
+            return count
+        try:
+            namespaces = self._read_namespaces(PineconeService())
+            self.snapshot = replace(self.snapshot, namespaces=namespaces, stats_at=time.time())
+            return namespaces.get(namespace, 0)
+        except Exception as e:
+            logger.error(f"Error re-reading index stats: {e}")
+            return count
+        finally:
+            self._lock.release()
+
+
+health_prober = HealthProber()
+
+
+def start_health_prober() -> None:
+    health_prober.start()
+
+
+def stop_health_prober() -> None:
+    health_prober.stop()
+
+
+def get_health_snapshot() -> HealthSnapshot:
+    return health_prober.get_snapshot()
@@ -0,0 +1,55 @@
+from typing import Callable, List
+import logging
+import threading
+import time
+
+logger = logging.getLogger('lifecycle')
+
+_warmups: List[Callable[[], None]] = []
+_shutdowns: List[Callable[[], None]] = []
+_draining = threading.Event()
+
+
+def register_warmup(fn: Callable[[], None]) -> Callable[[], None]:
+    """Run fn once in each worker before it serves traffic. Usable as a decorator."""
+    if fn not in _warmups:
+        _warmups.append(fn)
+    return fn
+
+
+def register_shutdown(fn: Callable[[], None]) -> Callable[[], None]:
+    """Run fn when the worker exits (stop background threads, flush buffers)"""
+    if fn not in _shutdowns:
+        _shutdowns.append(fn)
+    return fn
+
+
+def warm_worker() -> None:
+    """Create this process's clients and in-memory state before the first request"""
+    for fn in _warmups:
+        start = time.perf_counter()
+        try:
+            fn()
+            logger.info(f"Warmed {fn.__module__}.{fn.__name__} in {time.perf_counter() - start:.3f}s")
+        except Exception as e:
+            # A cold client is slower, not broken; keep starting up
+            logger.error(f"Warmup {fn.__module__}.{fn.__name__} failed: {e}")
+
+
+def begin_drain() -> None:
+    """Stop advertising health so the load balancer routes new traffic elsewhere"""
+    if not _draining.is_set():
+        logger.info("Worker draining")
+        _draining.set()
+
+
+def is_draining() -> bool:
+    return _draining.is_set()
+
+
+def shutdown_worker() -> None:
+    for fn in reversed(_shutdowns):
+        try:
+            fn()
+        except Exception as e:
+            logger.error(f"Shutdown {fn.__module__}.{fn.__name__} failed: {e}")
@@ -0,0 +1,195 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, Optional, Tuple
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, multiprocess
+)
+import logging
+import os
+import time
+
+logger = logging.getLogger('metrics_service')
+
+# With several gunicorn workers each process writes its samples to files in this
+# directory and /metrics aggregates them. It must be set before this module is imported.
+MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+STAGE_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+
+STAGE_LATENCY = Histogram(
+    'sentiment_checker_stage_seconds',
+    'Latency of analysis pipeline stages',
+    ['stage', 'endpoint', 'tenant'],
+    buckets=STAGE_BUCKETS
+)
+STAGE_CALLS = Counter(
+    'sentiment_checker_stage_calls',
+    'Analysis pipeline stage invocations by outcome',
+    ['stage', 'endpoint', 'tenant', 'outcome']
+)
+COMMENT_TOKENS = Counter(
+    'sentiment_checker_comment_tokens',
+    'Estimated comment tokens before (original) and after (embedded) quote and signature stripping',
+    ['tenant', 'kind']
+)
+COMMENT_SECTIONS_REMOVED = Counter(
+    'sentiment_checker_comment_sections_removed',
+    'Quoted blocks, reply history and signature lines stripped from comments',
+    ['tenant', 'section']
+)
+COMMENT_CHUNKS = Histogram(
+    'sentiment_checker_comment_chunks',
+    'Token windows each embedded comment was split into',
+    ['tenant'],
+    buckets=(1, 2, 4, 8, 16, 32)
+)
+RATE_LIMIT_WAIT = Counter(
+    'sentiment_checker_rate_limit_wait_seconds',
+    'Time calls spent waiting for cluster-wide provider quota',
+    ['dependency']
+)
+SCHEDULER_WAIT = Histogram(
+    'sentiment_checker_scheduler_wait_seconds',
+    'Time OpenAI and Pinecone calls waited for quota and a concurrency slot, by priority lane',
+    ['dependency', 'lane'],
+    buckets=STAGE_BUCKETS
+)
+DEPENDENCY_RETRIES = Counter(
+    'sentiment_checker_dependency_retries',
+    'Retried OpenAI and Pinecone calls by reason',
+    ['dependency', 'reason']
+)
+CONCURRENCY_LIMIT = Gauge(
+    'sentiment_checker_concurrency_limit',
+    'Adaptive in-flight call limit per dependency, summed over live workers',
+    ['dependency'],
+    multiprocess_mode='livesum'
+)
+CIRCUIT_STATE = Gauge(
+    'sentiment_checker_circuit_state',
+    'Dependency circuit breaker state (0 closed, 1 half-open, 2 open), worst over live workers',
+    ['dependency'],
+    multiprocess_mode='livemax'
+)
+SCORE_CACHE = Counter(
+    'sentiment_checker_score_cache',
+    'get-scores cache lookups by result (fresh, stale, miss) and background refreshes',
+    ['tenant', 'result']
+)
+WEBHOOK_EVENTS = Counter(
+    'sentiment_checker_webhook_events',
+    'Zendesk webhook deliveries by outcome (queued, ignored, invalid, rejected)',
+    ['tenant', 'outcome']
+)
+
+_labels: ContextVar[Tuple[str, str]] = ContextVar('metric_labels', default=('none', 'none'))
+# Seconds per stage for the request being profiled; None, so nothing is collected, otherwise
+_stage_times: ContextVar[Optional[Dict[str, float]]] = ContextVar('stage_times', default=None)
+
+
+def bind_labels(endpoint: Optional[str], tenant: Optional[str]) -> None:
+    """Set the endpoint and tenant labels for stages recorded in the current context"""
+    _labels.set((endpoint or 'none', tenant or 'none'))
+
+
+def current_labels() -> Tuple[str, str]:
+    return _labels.get()
+
+
+@contextmanager
+def collect_stage_times():
+    """Also total the time of each stage recorded in the block, including on pools that copy the context"""
+    times: Dict[str, float] = {}
+    token = _stage_times.set(times)
+    try:
+        yield times
+    finally:
+        _stage_times.reset(token)
+
+
+@contextmanager
+def track_stage(stage: str):
+    """Time a block and record it under the current endpoint and tenant labels"""
+    endpoint, tenant = _labels.get()
+    start = time.perf_counter()
+    outcome = 'ok'
+    try:
+        yield
+    except Exception:
+        outcome = 'error'
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_LATENCY.labels(stage, endpoint, tenant).observe(elapsed)
+        STAGE_CALLS.labels(stage, endpoint, tenant, outcome).inc()
+        times = _stage_times.get()
+        if times is not None:
+            times[stage] = times.get(stage, 0.0) + elapsed
+
+
+def timed_stage(stage: str):
+    """Decorator form of track_stage"""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            with track_stage(stage):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_comment_cleaning(original_tokens: int, cleaned_tokens: int, removed: Dict[str, int]) -> None:
+    tenant = _labels.get()[1]
+    COMMENT_TOKENS.labels(tenant, 'original').inc(original_tokens)
+    COMMENT_TOKENS.labels(tenant, 'embedded').inc(cleaned_tokens)
+    for section, count in removed.items():
+        COMMENT_SECTIONS_REMOVED.labels(tenant, section).inc(count)
+
+
+def record_comment_chunks(chunks: int) -> None:
+    COMMENT_CHUNKS.labels(_labels.get()[1]).observe(chunks)
+
+
+def record_rate_limit_wait(dependency: str, seconds: float) -> None:
+    RATE_LIMIT_WAIT.labels(dependency).inc(seconds)
+
+
+def record_scheduler_wait(dependency: str, lane: str, seconds: float) -> None:
+    SCHEDULER_WAIT.labels(dependency, lane).observe(seconds)
+
+
+def record_dependency_retry(dependency: str, reason: str) -> None:
+    DEPENDENCY_RETRIES.labels(dependency, reason).inc()
+
+
+def record_concurrency_limit(dependency: str, limit: float) -> None:
+    CONCURRENCY_LIMIT.labels(dependency).set(limit)
+
+
+def record_circuit_state(dependency: str, state: str) -> None:
+    CIRCUIT_STATE.labels(dependency).set({'closed': 0, 'half_open': 1, 'open': 2}.get(state, 0))
+
+
+def record_score_cache(result: str) -> None:
+    SCORE_CACHE.labels(_labels.get()[1], result).inc()
+
+
+def record_webhook_event(outcome: str) -> None:
+    WEBHOOK_EVENTS.labels(_labels.get()[1], outcome).inc()
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Return the Prometheus text exposition for this process, or all workers in multiprocess mode"""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_worker_dead(pid: int) -> None:
+    """Drop a dead worker's live gauges; called from the gunicorn child_exit hook"""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
@@ -1,31 +1,121 @@
 from pinecone.grpc import PineconeGRPC as Pinecone
-from openai import OpenAI
+from concurrent.futures import Future, ThreadPoolExecutor
+import contextvars
 import dotenv, os
+import threading
 from datetime import datetime
+from services.chunking import chunk_text, pool_embeddings
+from services.embedding_service import get_embedding_backend
+from services.metrics_service import timed_stage
+from services.rate_limiter import GuardedIndex
+from services.tenant_router import PINECONE_INDEX_NAME, tenant_index, tenant_router
 import logging
 
 dotenv.load_dotenv()
 logger = logging.getLogger('pinecone_service')
 
+# Concurrent list and fetch calls one request may make when it reads many tickets
+PINECONE_READ_WORKERS = int(os.getenv("PINECONE_READ_WORKERS", 8))
+# Most ids a single fetch call takes
+FETCH_BATCH_SIZE = 1000
+# Most ids list_paginated returns per page
+LIST_PAGE_SIZE = 100
+
+
+class IndexDimensionError(Exception):
+    """The index stores vectors of another size than the embedding backend produces"""
+
+
 class PineconeService:
-    def __init__(self, subdomain=None):
-        self.pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-        self.index = self.pc.Index(os.getenv("PINECONE_INDEX_NAME"))
-        self.namespace = subdomain
-        self.openai_client = OpenAI()
+    # Clients are created once per process and shared by every instance. gRPC
+    # channels must not cross a fork, so they are rebuilt when the pid changes.
+    _clients_lock = threading.Lock()
+    _clients_pid = None
+    _pc = None
+    _index = None
+    _indexes = {}
+
+    def __init__(self, subdomain=None, index_name=None):
+        self._ensure_clients()
+        self.pc = PineconeService._pc
+        # A tenant's vectors are in the index the tenant router places it on
+        self.index_name = index_name or (tenant_index(subdomain) if subdomain else PINECONE_INDEX_NAME)
+        # Every data-plane call shares the cluster-wide quota and retries throttling with backoff
+        self.index = GuardedIndex(self._get_index(self.index_name))
+        # Emotion reference vectors are stored once, in the default index
+        self.emotions_index = self.index if self.index_name == PINECONE_INDEX_NAME else GuardedIndex(PineconeService._index)
+        self.embedder = get_embedding_backend()
+        self.subdomain = subdomain
+        self.namespace = self.embedder.namespace(subdomain)
+
+    @property
+    def emotions_namespace(self):
+        """Emotion reference vectors embedded with the same backend as this tenant's comments"""
+        return self.embedder.namespace('emotions')
+
+    def _index_for(self, namespace):
+        return self.emotions_index if namespace == self.emotions_namespace else self.index
+
+    @classmethod
+    def _ensure_clients(cls):
+        if cls._clients_pid == os.getpid():
+            return
+        with cls._clients_lock:
+            if cls._clients_pid != os.getpid():
+                pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+                cls._index = pc.Index(PINECONE_INDEX_NAME)
+                cls._indexes = {PINECONE_INDEX_NAME: cls._index}
+                cls._pc = pc
+                cls._clients_pid = os.getpid()
+
+    @classmethod
+    def _get_index(cls, name):
+        index = cls._indexes.get(name)
+        if index is None:
+            with cls._clients_lock:
+                index = cls._indexes.get(name)
+                if index is None:
+                    index = cls._pc.Index(name)
+                    cls._indexes = dict(cls._indexes, **{name: index})
+        return index
+
+    @classmethod
+    def warm(cls):
+        """Open the gRPC channel and load the embedding backend before the first request needs them"""
+        cls._ensure_clients()
+        cls._index.describe_index_stats()
+        get_embedding_backend().warm()
+        service = cls()
+        for index_name in tenant_router.indexes:
+            service.check_dimension(service.pc.describe_index(index_name))
     
     def describe_index_stats(self):
         return self.index.describe_index_stats()
 
 
+    @timed_stage('embedding')
     def get_embedding(self, text):
-        response = self.openai_client.embeddings.create(
-            model="text-embedding-3-small",
-            input=text
-        )
-        return response.data[0].embedding
+        return self.embedder.embed_one(text)
+
+
+    @timed_stage('embedding')
+    def get_chunked_embedding(self, text):
+        """
+        Embed text of any length: split it into token windows, embed them in one batched
+        call and pool the results. Returns (vector, number of chunks).
+        """
+        chunks = chunk_text(text)
+        vectors = self.embedder.embed([chunk.text for chunk in chunks])
+        return pool_embeddings(vectors, [chunk.tokens for chunk in chunks]), len(chunks)
+
 
+    @timed_stage('embedding')
+    def get_embeddings(self, texts):
+        """Embed several texts in as few backend calls as possible, preserving order"""
+        return self.embedder.embed(list(texts))
 
+
+    @timed_stage('upsert')
     def upsert_vector(self, id, vector, metadata):
         upsert_response = self.index.upsert(
             vectors=[
@@ -41,7 +131,7 @@ class PineconeService:
 
 
     def query_vectors(self, vector, top_k=10, namespace=None, include_metadata=False, include_values=False):
-        query_response = self.index.query(
+        query_response = self._index_for(namespace).query(
             vector=vector,
             top_k=top_k,
             namespace=namespace,
@@ -53,7 +143,7 @@ class PineconeService:
 
     def get_comment_ids(self, ticket_id):
         query_response = self.index.query(
-            vector=[0] * 1536,  # Dummy vector, we're only interested in metadata
+            vector=[0] * self.embedder.dimension,  # Dummy vector, we're only interested in metadata
             filter={"ticket_id": ticket_id},
             top_k=10000,
             include_metadata=True,
@@ -66,7 +156,7 @@ class PineconeService:
         start_timestamp = int(datetime.fromisoformat(start_date).timestamp())
         end_timestamp = int(datetime.fromisoformat(end_date).timestamp())
         query_response = self.index.query(
-            vector=[0] * 1536,  # Dummy vector, we're only interested in metadata
+            vector=[0] * self.embedder.dimension,  # Dummy vector, we're only interested in metadata
             filter={"timestamp": {"$gte": start_timestamp, "$lte": end_timestamp}},
             top_k=10000,
             include_metadata=True,
@@ -76,51 +166,75 @@ class PineconeService:
         return [match.id for match in query_response.matches]
 
 
-    def list_ticket_vectors(self, ticket_id=None):
-        vectors = []
-        prefix = ""
-        pagination_token = None
-        if ticket_id:
-            prefix = f"{ticket_id}#"
-        response = self.index.list_paginated(prefix=prefix, namespace=self.namespace)
-        vectors.extend(response.vectors)
-        while response.pagination and len(vectors) < 1000: # Cap total number of vectors to 1000
-            try:
-                response = self.index.list_paginated(
-                    prefix=ticket_id,
-                    namespace=self.namespace,
-                    pagination_token=pagination_token
-                )
-                vectors.extend(response.vectors)
-            except Exception as e:
-                logger.error(f"Error listing vectors: {e}")
-                break
-            if not response.pagination:
-                break  
-
-            pagination_token = response.pagination.next
-        return vectors
+    def iter_vector_ids(self, prefix="", namespace=None, prefetch=True):
+        """
+        Yield the ids under a prefix a page at a time, as list_paginated returns them. With
+        prefetch, the next page is requested on a background thread while the caller works
+        on the current one; a scan never holds more than two pages.
+        """
+        namespace = namespace or self.namespace
+        pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pinecone-list') if prefetch else None
 
+        def request(pagination_token):
+            if pool is not None:
+                return pool.submit(contextvars.copy_context().run, self._list_page, prefix, namespace, pagination_token)
+            future = Future()
+            future.set_result(self._list_page(prefix, namespace, pagination_token))
+            return future
+
+        try:
+            future = request(None)
+            while future is not None:
+                response = future.result()
+                pagination_token = response.pagination.next if response.pagination else None
+                future = request(pagination_token) if pagination_token else None
+                ids = [vector.id for vector in response.vectors]
+                if ids:
+                    yield ids
+        finally:
+            # Also reached when the caller stops early: drop the page in flight
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+
+    @timed_stage('pinecone_list')
+    def _list_page(self, prefix, namespace, pagination_token):
+        return self._index_for(namespace).list_paginated(prefix=prefix, namespace=namespace, limit=LIST_PAGE_SIZE,
+                                         pagination_token=pagination_token)
 
-    def list_ticket_ids(self):
-        pagination_token = None
-        vectors = []
-        while True:
-            response = self.index.list_paginated(prefix="", namespace=self.namespace, pagination_token=pagination_token)
-            vectors.extend(response.vectors)
-            if not response.pagination:
-                break
-            pagination_token = response.pagination.next
-        return vectors
 
+    def list_ticket_vectors(self, ticket_id):
+        """Ids of a ticket's comment vectors. Tickets rarely span a second page, so nothing is prefetched."""
+        return [id for page in self.iter_vector_ids(f"{ticket_id}#", prefetch=False) for id in page]
 
-    def fetch_vectors(self, vector_ids, namespace=None, include_metadata=True, include_values=False):
+
+    def list_ticket_vector_ids(self, ticket_ids, max_workers=PINECONE_READ_WORKERS):
+        """Comment vector ids per ticket, listing the tickets concurrently"""
+        ticket_ids = [str(ticket_id) for ticket_id in ticket_ids]
+        listed = self._map_concurrently(self.list_ticket_vectors, ticket_ids, max_workers)
+        return dict(zip(ticket_ids, listed))
+
+
+    @staticmethod
+    def _map_concurrently(fn, items, max_workers):
+        if len(items) <= 1 or max_workers <= 1:
+            return [fn(item) for item in items]
+        # Each task runs in a copy of the caller's context, so stage metrics keep the endpoint and tenant labels
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(items)), thread_name_prefix='pinecone-read') as pool:
+            futures = [pool.submit(contextvars.copy_context().run, fn, item) for item in items]
+            return [future.result() for future in futures]
+
+
+    @timed_stage('pinecone_fetch')
+    def fetch_vectors(self, vector_ids, namespace=None, include_metadata=True, include_values=False,
+                      max_workers=PINECONE_READ_WORKERS):
         vectors = {}
         if not namespace:
             namespace = self.namespace
-        for i in range(0, len(vector_ids), 1000):
-            batch = vector_ids[i:i+1000]
-            fetch_response = self.index.fetch(ids=[str(id) for id in batch], namespace=namespace)
+        batches = [vector_ids[i:i + FETCH_BATCH_SIZE] for i in range(0, len(vector_ids), FETCH_BATCH_SIZE)]
+        index = self._index_for(namespace)
+        fetch = lambda batch: index.fetch(ids=[str(id) for id in batch], namespace=namespace)
+        for fetch_response in self._map_concurrently(fetch, batches, max_workers):
             for id, vector in fetch_response.vectors.items():
                 vectors[id] = {
                     "id": id,
@@ -130,10 +244,20 @@ class PineconeService:
         return vectors
 
 
+    @timed_stage('pinecone_fetch')
     def fetch_vector(self, vector_id, namespace=None):
-        fetch_response = self.index.fetch(ids=[vector_id], namespace=namespace)
+        fetch_response = self._index_for(namespace).fetch(ids=[vector_id], namespace=namespace)
         return fetch_response.vectors[vector_id]
 
 
     def check_health(self):
         return self.pc.describe_index(self.index.name)
+
+
+    def check_dimension(self, description=None):
+        """Raise IndexDimensionError unless the index, described by describe_index, fits the embedding backend"""
+        description = description or self.pc.describe_index(self.index_name)
+        dimension = description.get('dimension')
+        if dimension and int(dimension) != self.embedder.dimension:
+            raise IndexDimensionError(f"Index {description.get('name')} has dimension {dimension}, but embedding "
+                                      f"backend {self.embedder.name} produces {self.embedder.dimension}")
@@ -0,0 +1,233 @@
+"""
+Opt-in profiling of individual requests, for finding where the Python time goes when
+a tenant reports slowness.
+
+A view wrapped with @profiled is profiled when either:
+- the request carries X-Profile-Request with the value of PROFILE_TOKEN, or
+- a random draw falls under the sample rate for its tenant, set with
+  `flask profiling enable` or for everyone with PROFILE_SAMPLE_RATE.
+
+A profiled request is run under cProfile, written as <name>.pstats. A thread also
+samples its stack every PROFILE_SAMPLE_INTERVAL seconds, written as <name>.collapsed
+for flame graph tools. <name>.json has the wall and CPU time, and the time spent in
+each pipeline stage. Recent profiles are indexed in Redis for GET /profiles.
+
+When nothing is enabled, a request costs one header lookup and a dict lookup. The
+tenant rates are re-read from Redis at most every PROFILE_RATES_REFRESH seconds.
+"""
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Dict, List, Optional, Tuple
+from flask import request
+from config.logging_config import LOG_DIR
+from config.redis_config import RedisClient
+from services.metrics_service import collect_stage_times, current_labels
+import cProfile
+import dotenv, os
+import hmac
+import json
+import logging
+import random
+import re
+import socket
+import sys
+import threading
+import time
+
+dotenv.load_dotenv()
+logger = logging.getLogger('profiler')
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(LOG_DIR, 'profiles'))
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+# Fraction of requests profiled for tenants without their own rate
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", 0.005))
+PROFILE_RATES_REFRESH = float(os.getenv("PROFILE_RATES_REFRESH", 10))
+# Profile files kept per worker directory, and entries kept in the Redis index
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", 200))
+PROFILE_MAX_RECENT = int(os.getenv("PROFILE_MAX_RECENT", 100))
+
+PROFILE_HEADER = 'X-Profile-Request'
+RATES_KEY = 'profiling:rates'
+RECENT_KEY = 'profiling:recent'
+# Rate hash field applying to every tenant
+ALL_TENANTS = '*'
+PROFILE_SUFFIXES = ('.pstats', '.collapsed', '.json')
+
+_rates: Dict[str, float] = {}
+_rates_loaded_at = 0.0
+_rates_lock = threading.Lock()
+_sequence = 0
+
+
+def set_sample_rate(redis, tenant: Optional[str], rate: float, seconds: int) -> None:
+    """Profile a fraction of a tenant's requests, or every tenant's, for the next `seconds`"""
+    redis.hset(RATES_KEY, tenant or ALL_TENANTS, f"{rate}:{time.time() + seconds}")
+
+
+def clear_sample_rate(redis, tenant: Optional[str]) -> None:
+    redis.hdel(RATES_KEY, tenant or ALL_TENANTS)
+
+
+def _sample_rate(tenant: str) -> float:
+    global _rates, _rates_loaded_at
+    now = time.monotonic()
+    if now - _rates_loaded_at > PROFILE_RATES_REFRESH and _rates_lock.acquire(blocking=False):
+        try:
+            _rates_loaded_at = now
+            rates = {}
+            for field, value in RedisClient.get_instance().hgetall(RATES_KEY).items():
+                rate, expires_at = value.split(':')
+                if float(expires_at) > time.time():
+                    rates[field] = float(rate)
+            _rates = rates
+        except Exception as e:
+            logger.debug(f"Error reading profiling rates: {e}")
+        finally:
+            _rates_lock.release()
+    rates = _rates
+    return rates.get(tenant, rates.get(ALL_TENANTS, PROFILE_SAMPLE_RATE))
+
+
+def _should_profile(tenant: str) -> bool:
+    token = request.headers.get(PROFILE_HEADER)
+    if token and PROFILE_TOKEN:
+        return hmac.compare_digest(token, PROFILE_TOKEN)
+    rate = _sample_rate(tenant)
+    return rate > 0 and random.random() < rate
+
+
+class StackSampler:
+    """Counts one thread's stacks every `interval` seconds, in collapsed (flame graph) form"""
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        sampler = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None or self.thread_id == sampler:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            stack = ';'.join(reversed(names))
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def collapsed(self) -> str:
+        return ''.join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+
+def _profile_name(endpoint: str, tenant: str) -> str:
+    global _sequence
+    _sequence += 1
+    safe = lambda value: re.sub(r'[^A-Za-z0-9_.-]', '_', value)
+    return f"{time.strftime('%Y%m%dT%H%M%S')}-{safe(tenant)}-{safe(endpoint)}-{os.getpid()}-{_sequence}"
+
+
+def _status(response: Any) -> Optional[int]:
+    if isinstance(response, tuple) and len(response) > 1 and isinstance(response[1], int):
+        return response[1]
+    return getattr(response, 'status_code', None)
+
+
+def _write_profile(name: str, profile: cProfile.Profile, sampler: StackSampler, summary: Dict[str, Any]) -> None:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, name)
+    profile.dump_stats(f"{path}.pstats")
+    with open(f"{path}.collapsed", 'w') as collapsed:
+        collapsed.write(sampler.collapsed())
+    with open(f"{path}.json", 'w') as summary_file:
+        json.dump(summary, summary_file, indent=2)
+
+    # Oldest first: the names start with the time
+    names = sorted(entry[:-len('.json')] for entry in os.listdir(PROFILE_DIR) if entry.endswith('.json'))
+    for old in names[:max(0, len(names) - PROFILE_MAX_FILES)]:
+        for suffix in PROFILE_SUFFIXES:
+            try:
+                os.remove(os.path.join(PROFILE_DIR, old + suffix))
+            except OSError:
+                pass
+
+    try:
+        pipe = RedisClient.get_instance().pipeline(transaction=False)
+        pipe.lpush(RECENT_KEY, json.dumps(summary))
+        pipe.ltrim(RECENT_KEY, 0, PROFILE_MAX_RECENT - 1)
+        pipe.execute()
+    except Exception as e:
+        logger.error(f"Error indexing profile {name}: {e}")
+
+
+@contextmanager
+def profile_request(endpoint: str, tenant: str):
+    """Profile the enclosed block and write its files; yields the summary, filled in on exit"""
+    name = _profile_name(endpoint, tenant)
+    summary: Dict[str, Any] = {'name': name, 'endpoint': endpoint, 'tenant': tenant,
+                               'host': socket.gethostname(), 'pid': os.getpid(), 'started_at': time.time()}
+    profile = cProfile.Profile()
+    sampler = StackSampler(threading.get_ident())
+    wall, cpu = time.perf_counter(), time.thread_time()
+    sampler.start()
+    try:
+        with collect_stage_times() as stages:
+            profile.enable()
+            try:
+                yield summary
+            finally:
+                profile.disable()
+    finally:
+        sampler.stop()
+        summary['wall_ms'] = (time.perf_counter() - wall) * 1000
+        # CPU time of the request thread; work on Pinecone read pools shows up in the stages only
+        summary['cpu_ms'] = (time.thread_time() - cpu) * 1000
+        summary['stages_ms'] = {stage: seconds * 1000 for stage, seconds in sorted(stages.items())}
+        summary['samples'] = sum(sampler.stacks.values())
+        try:
+            _write_profile(name, profile, sampler, summary)
+            logger.info(f"Profiled {endpoint} for {tenant}: {summary['wall_ms']:.1f}ms wall, "
+                        f"{summary['cpu_ms']:.1f}ms CPU, written to {name}")
+        except Exception as e:
+            logger.error(f"Error writing profile {name}: {e}")
+
+
+def profiled(f):
+    """Profile the view when this request is selected; place it below init_required so the tenant is known"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        endpoint, tenant = current_labels()
+        if not _should_profile(tenant):
+            return f(*args, **kwargs)
+        with profile_request(endpoint, tenant) as summary:
+            response = f(*args, **kwargs)
+            summary['status'] = _status(response)
+        return response
+    return decorated_function
+
+
+def recent_profiles(limit: int = PROFILE_MAX_RECENT) -> List[Dict[str, Any]]:
+    """Summaries of the latest profiles across the cluster, newest first"""
+    return [json.loads(entry) for entry in RedisClient.get_instance().lrange(RECENT_KEY, 0, limit - 1)]
+
+
+def profile_file(filename: str) -> Optional[Tuple[str, str]]:
+    """(directory, file name) of a profile file written by this worker's host, if there is one"""
+    name, suffix = os.path.splitext(filename)
+    if suffix not in PROFILE_SUFFIXES or os.path.basename(filename) != filename:
+        return None
+    if not os.path.exists(os.path.join(PROFILE_DIR, filename)):
+        return None
+    return PROFILE_DIR, filename
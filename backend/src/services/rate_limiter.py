@@ -0,0 +1,369 @@
+from typing import Callable, Dict, List, Optional, Tuple
+from config.redis_config import RedisClient
+from services.circuit_breaker import CIRCUIT_BREAKING, CircuitBreaker, get_breaker
+from services.metrics_service import (
+    record_concurrency_limit, record_dependency_retry, record_rate_limit_wait, record_scheduler_wait
+)
+from services.scheduler import (
+    BACKFILL, INTERACTIVE, LANE_CONCURRENCY_SHARE, LANE_RATE_RESERVE, LANES, TENANT_QUOTA_SHARE, current_priority
+)
+import dotenv, os
+import logging
+import random
+import threading
+import time
+
+dotenv.load_dotenv()
+logger = logging.getLogger('rate_limiter')
+
+RATE_LIMITING = os.getenv("RATE_LIMITING", "true").lower() == "true"
+# Provider quotas shared by every worker; 0 disables a bucket
+OPENAI_EMBEDDING_RPM = int(os.getenv("OPENAI_EMBEDDING_RPM", 3000))
+OPENAI_EMBEDDING_TPM = int(os.getenv("OPENAI_EMBEDDING_TPM", 1000000))
+PINECONE_OPS_PER_SECOND = int(os.getenv("PINECONE_OPS_PER_SECOND", 100))
+# Longest a call waits for quota before failing instead; bulk ingestion can afford to wait longer
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", 30))
+BACKFILL_RATE_LIMIT_MAX_WAIT = float(os.getenv("BACKFILL_RATE_LIMIT_MAX_WAIT", 300))
+# The limiter's own Redis connection gives up quickly, then calls skip the limiter for a while
+RATE_LIMIT_REDIS_TIMEOUT = float(os.getenv("RATE_LIMIT_REDIS_TIMEOUT", 0.25))
+RATE_LIMIT_BYPASS_SECONDS = float(os.getenv("RATE_LIMIT_BYPASS_SECONDS", 15))
+
+RETRY_ATTEMPTS = int(os.getenv("DEPENDENCY_RETRY_ATTEMPTS", 4))
+RETRY_BASE_DELAY = float(os.getenv("DEPENDENCY_RETRY_BASE_DELAY", 0.25))
+RETRY_MAX_DELAY = float(os.getenv("DEPENDENCY_RETRY_MAX_DELAY", 8))
+
+# Per-worker concurrency bounds for the AIMD limiter, and the latency above which it backs off
+CONCURRENCY_MIN = int(os.getenv("DEPENDENCY_CONCURRENCY_MIN", 1))
+CONCURRENCY_MAX = int(os.getenv("DEPENDENCY_CONCURRENCY_MAX", 32))
+CONCURRENCY_LATENCY_TARGET = {
+    'openai': float(os.getenv("OPENAI_LATENCY_TARGET", 2.0)),
+    'pinecone': float(os.getenv("PINECONE_LATENCY_TARGET", 0.5)),
+}
+
+# Refill every bucket to now, then take `cost` from each only if all of them have it
+# without dropping below their reserve, the part kept for higher-priority lanes.
+# Returns 0 when granted, otherwise the milliseconds until the scarcest bucket will have enough.
+# ARGV per key: refill rate (tokens/ms), capacity, cost, reserve. The clock is Redis's so all workers agree.
+TOKEN_BUCKET_SCRIPT = """
+local now = redis.call('TIME')
+local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local wait = 0
+local levels = {}
+local costs = {}
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[(i - 1) * 4 + 1])
+    local capacity = tonumber(ARGV[(i - 1) * 4 + 2])
+    local reserve = tonumber(ARGV[(i - 1) * 4 + 4])
+    local cost = math.min(tonumber(ARGV[(i - 1) * 4 + 3]), capacity - reserve)
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now_ms
+    tokens = math.min(capacity, tokens + math.max(0, now_ms - ts) * rate)
+    if tokens - reserve < cost then
+        wait = math.max(wait, (cost + reserve - tokens) / rate)
+    end
+    levels[i] = tokens
+    costs[i] = cost
+end
+if wait > 0 then
+    return math.ceil(wait)
+end
+for i, key in ipairs(KEYS) do
+    redis.call('HSET', key, 'tokens', tostring(levels[i] - costs[i]), 'ts', now_ms)
+    redis.call('PEXPIRE', key, 120000)
+end
+return 0
+"""
+
+
+class RateLimitTimeout(Exception):
+    """Raised when quota did not free up within RATE_LIMIT_MAX_WAIT"""
+    pass
+
+
+class TokenBucket:
+    """One cluster-wide bucket: `per_second` tokens refill continuously up to `capacity`"""
+
+    def __init__(self, name: str, per_second: float, capacity: Optional[float] = None, shared: bool = True):
+        self.name = name
+        self.key = f"ratelimit:{name}"
+        self.per_ms = per_second / 1000.0
+        self.capacity = capacity or per_second
+        # Lane reserves apply to the provider's own buckets, not to per-tenant slices of them
+        self.shared = shared
+
+    def for_tenant(self, tenant: str, share: float) -> 'TokenBucket':
+        """A tenant's slice of this bucket, refilling at `share` of its rate"""
+        return TokenBucket(f"{self.name}:tenant:{tenant}", self.per_ms * 1000.0 * share, self.capacity * share,
+                           shared=False)
+
+
+class RedisRateLimiter:
+    """Takes tokens from one or more TokenBuckets atomically, waiting until they are available"""
+
+    def __init__(self, redis=None):
+        self._redis = redis
+        self._client = None
+        self._client_pid = None
+        self._script = None
+        self._bypass_until = 0.0
+
+    @property
+    def redis(self):
+        if self._redis is not None:
+            return self._redis
+        if self._client is None or self._client_pid != os.getpid():
+            self._client = RedisClient.with_timeouts(RATE_LIMIT_REDIS_TIMEOUT)
+            self._client_pid = os.getpid()
+            self._script = None
+        return self._client
+
+    def acquire(self, buckets: List[Tuple[TokenBucket, float]], dependency: str,
+                max_wait: float = RATE_LIMIT_MAX_WAIT, reserve: float = 0.0) -> float:
+        """
+        Block until every (bucket, cost) is granted, leaving `reserve` (a fraction of
+        capacity) in each shared bucket. Returns seconds waited.
+        """
+        buckets = [(bucket, cost) for bucket, cost in buckets if bucket.per_ms > 0 and cost > 0]
+        if not buckets or time.monotonic() < self._bypass_until:
+            return 0.0
+        keys = [bucket.key for bucket, _ in buckets]
+        args = [
+            value for bucket, cost in buckets
+            for value in (bucket.per_ms, bucket.capacity, cost, bucket.capacity * reserve if bucket.shared else 0)
+        ]
+        start = time.monotonic()
+        while True:
+            try:
+                # Read first: a new client (after a fork) needs the script registered on it
+                client = self.redis
+                if self._script is None:
+                    self._script = client.register_script(TOKEN_BUCKET_SCRIPT)
+                wait_ms = int(self._script(keys=keys, args=args))
+            except Exception as e:
+                # The limiter protects the providers; losing Redis should not stop traffic, nor
+                # make every call wait on a connect first
+                if time.monotonic() >= self._bypass_until:
+                    logger.error(f"Rate limiter unavailable for {dependency}, "
+                                 f"continuing without it for {RATE_LIMIT_BYPASS_SECONDS:g}s: {e}")
+                self._bypass_until = time.monotonic() + RATE_LIMIT_BYPASS_SECONDS
+                return time.monotonic() - start
+            if wait_ms <= 0:
+                waited = time.monotonic() - start
+                if waited:
+                    record_rate_limit_wait(dependency, waited)
+                return waited
+            if time.monotonic() - start + wait_ms / 1000.0 > max_wait:
+                raise RateLimitTimeout(f"{dependency} quota not available within {max_wait}s")
+            # Jitter so workers woken together don't collide on the same refill
+            time.sleep(wait_ms / 1000.0 * random.uniform(1.0, 1.25))
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Per-worker cap on in-flight calls to a dependency, adjusted by AIMD: +1/limit per
+    success under the latency target, x0.5 on throttling (at most once per second),
+    x0.9 when calls run slower than the target.
+
+    Calls are admitted by lane: a lane may only start a call while the worker's
+    in-flight count is under its share of the limit, and never while a higher lane
+    has calls waiting. Among waiting tenants of a lane, the one with the fewest calls
+    in flight goes first.
+    """
+
+    def __init__(self, name: str, initial: int = 8, minimum: int = CONCURRENCY_MIN, maximum: int = CONCURRENCY_MAX,
+                 latency_target: float = 1.0):
+        self.name = name
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+        # lane -> tenant -> calls waiting / in flight
+        self._waiting: Dict[str, Dict[Optional[str], int]] = {lane: {} for lane in LANES}
+        self._tenant_in_flight: Dict[str, Dict[Optional[str], int]] = {lane: {} for lane in LANES}
+
+    def _admissible(self, lane: str, tenant: Optional[str]) -> bool:
+        if self.in_flight >= max(1, int(self.limit * LANE_CONCURRENCY_SHARE.get(lane, 1.0))):
+            return False
+        if any(self._waiting[higher] for higher in LANES[:LANES.index(lane)]):
+            return False
+        running = self._tenant_in_flight[lane]
+        mine = running.get(tenant, 0)
+        return all(mine <= running.get(other, 0) for other in self._waiting[lane] if other != tenant)
+
+    def acquire(self, lane: str = INTERACTIVE, tenant: Optional[str] = None) -> float:
+        """Block until a call may start in `lane`. Returns seconds waited."""
+        if lane not in LANES:
+            lane = INTERACTIVE
+        start = time.monotonic()
+        with self._condition:
+            if not self._admissible(lane, tenant):
+                waiting = self._waiting[lane]
+                waiting[tenant] = waiting.get(tenant, 0) + 1
+                try:
+                    while not self._admissible(lane, tenant):
+                        self._condition.wait()
+                finally:
+                    waiting[tenant] -= 1
+                    if not waiting[tenant]:
+                        del waiting[tenant]
+            self.in_flight += 1
+            running = self._tenant_in_flight[lane]
+            running[tenant] = running.get(tenant, 0) + 1
+        return time.monotonic() - start
+
+    def release(self, latency: float, throttled: bool = False, lane: str = INTERACTIVE,
+                tenant: Optional[str] = None) -> None:
+        if lane not in LANES:
+            lane = INTERACTIVE
+        with self._condition:
+            self.in_flight -= 1
+            running = self._tenant_in_flight[lane]
+            running[tenant] -= 1
+            if not running[tenant]:
+                del running[tenant]
+            now = time.monotonic()
+            if throttled:
+                if now - self._last_decrease > 1.0:
+                    self.limit = max(self.minimum, self.limit * 0.5)
+                    self._last_decrease = now
+            elif latency > self.latency_target:
+                if now - self._last_decrease > 1.0:
+                    self.limit = max(self.minimum, self.limit * 0.9)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            record_concurrency_limit(self.name, self.limit)
+            self._condition.notify_all()
+
+
+def is_throttled(error: Exception) -> bool:
+    """429 from OpenAI or Pinecone REST, RESOURCE_EXHAUSTED from Pinecone gRPC"""
+    status = getattr(error, 'status_code', None) or getattr(error, 'status', None)
+    if status == 429:
+        return True
+    code = getattr(error, 'code', None)
+    if callable(code):
+        try:
+            return getattr(code(), 'name', '') == 'RESOURCE_EXHAUSTED'
+        except Exception:
+            pass
+    text = str(error)
+    return '(429)' in text or 'RESOURCE_EXHAUSTED' in text or 'Too Many Requests' in text
+
+
+def is_transient(error: Exception) -> bool:
+    """Failures worth retrying besides throttling: overloaded or briefly unreachable services"""
+    status = getattr(error, 'status_code', None) or getattr(error, 'status', None)
+    if status in (500, 502, 503, 504):
+        return True
+    code = getattr(error, 'code', None)
+    if callable(code):
+        try:
+            return getattr(code(), 'name', '') in ('UNAVAILABLE', 'DEADLINE_EXCEEDED')
+        except Exception:
+            pass
+    return type(error).__name__ in ('APIConnectionError', 'APITimeoutError', 'InternalServerError')
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    try:
+        return float(headers.get('retry-after')) if headers and headers.get('retry-after') else None
+    except (TypeError, ValueError):
+        return None
+
+
+class DependencyGuard:
+    """Circuit breaking, quota, concurrency and retries for every call to one external dependency"""
+
+    def __init__(self, name: str, limiter: RedisRateLimiter, concurrency: AdaptiveConcurrencyLimiter,
+                 breaker: CircuitBreaker, attempts: int = RETRY_ATTEMPTS):
+        self.name = name
+        self.limiter = limiter
+        self.concurrency = concurrency
+        self.breaker = breaker
+        self.attempts = attempts
+
+    def call(self, fn: Callable, buckets: List[Tuple[TokenBucket, float]] = ()):
+        lane, tenant = current_priority()
+        buckets = list(buckets)
+        if lane != INTERACTIVE and tenant and TENANT_QUOTA_SHARE < 1:
+            # One tenant's bulk work may not take the whole quota from the others
+            buckets += [(bucket.for_tenant(tenant, TENANT_QUOTA_SHARE), cost) for bucket, cost in buckets]
+        max_wait = BACKFILL_RATE_LIMIT_MAX_WAIT if lane == BACKFILL else RATE_LIMIT_MAX_WAIT
+        for attempt in range(self.attempts):
+            waited = 0.0
+            if RATE_LIMITING:
+                waited = self.limiter.acquire(buckets, self.name, max_wait, LANE_RATE_RESERVE.get(lane, 0.0))
+            # Checked every attempt so an opening circuit also cuts retries short. After the
+            # quota wait, so a claimed half-open trial always reaches record() below.
+            if CIRCUIT_BREAKING:
+                self.breaker.before_call()
+            waited += self.concurrency.acquire(lane, tenant)
+            record_scheduler_wait(self.name, lane, waited)
+            start = time.monotonic()
+            throttled = False
+            failed = False
+            try:
+                return fn()
+            except Exception as e:
+                throttled = is_throttled(e)
+                # Other errors (bad request, not found) mean the dependency is up and answering
+                failed = throttled or is_transient(e)
+                if not failed or attempt == self.attempts - 1:
+                    raise
+                reason = 'throttled' if throttled else 'transient'
+                # Full jitter, unless the provider told us how long to wait
+                delay = _retry_after(e) or random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+                logger.warning(f"{self.name} call {reason} ({e}); retry {attempt + 1} in {delay:.2f}s")
+                record_dependency_retry(self.name, reason)
+            finally:
+                latency = time.monotonic() - start
+                self.concurrency.release(latency, throttled, lane, tenant)
+                if CIRCUIT_BREAKING:
+                    self.breaker.record(not failed, latency)
+            time.sleep(delay)
+
+
+_limiter = RedisRateLimiter()
+_guards: Dict[str, DependencyGuard] = {}
+_guards_lock = threading.Lock()
+
+EMBEDDING_REQUESTS = TokenBucket('openai:embedding:requests', OPENAI_EMBEDDING_RPM / 60.0, OPENAI_EMBEDDING_RPM / 6.0)
+EMBEDDING_TOKENS = TokenBucket('openai:embedding:tokens', OPENAI_EMBEDDING_TPM / 60.0, OPENAI_EMBEDDING_TPM / 6.0)
+PINECONE_OPS = TokenBucket('pinecone:ops', PINECONE_OPS_PER_SECOND, PINECONE_OPS_PER_SECOND)
+
+
+def get_guard(dependency: str) -> DependencyGuard:
+    guard = _guards.get(dependency)
+    if guard is None:
+        with _guards_lock:
+            guard = _guards.setdefault(dependency, DependencyGuard(
+                dependency,
+                _limiter,
+                AdaptiveConcurrencyLimiter(dependency, latency_target=CONCURRENCY_LATENCY_TARGET.get(dependency, 1.0)),
+                get_breaker(dependency)
+            ))
+    return guard
+
+
+class GuardedIndex:
+    """Pinecone index whose data-plane calls go through the 'pinecone' guard, one op each"""
+    GUARDED = ('upsert', 'query', 'fetch', 'list_paginated', 'update', 'delete', 'describe_index_stats')
+
+    def __init__(self, index):
+        self._index = index
+
+    def __getattr__(self, name):
+        attribute = getattr(self._index, name)
+        if name not in self.GUARDED or not callable(attribute):
+            return attribute
+
+        def guarded(*args, **kwargs):
+            return get_guard('pinecone').call(lambda: attribute(*args, **kwargs), [(PINECONE_OPS, 1)])
+        return guarded
@@ -0,0 +1,74 @@
+"""
+Priority lanes for calls to OpenAI and Pinecone.
+
+Every request or background job runs in a lane: interactive (an agent looking at a
+ticket), background (BackgroundApp refreshes, NavBar sweeps, stale-score refreshes)
+or backfill (bulk ingestion). The lane and tenant are bound to the context like the
+metric labels, and the dependency guards in services/rate_limiter read them to:
+
+- keep part of each provider quota for higher lanes: a lane may only take tokens
+  while the bucket stays above its reserve
+- cap the share of a worker's in-flight calls a lane may hold, and always admit
+  waiting calls from higher lanes first
+- within a lane, admit the waiting tenant with the fewest calls in flight first, and
+  hold each tenant's bulk work to a share of the provider quota across the cluster
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+import dotenv, os
+
+dotenv.load_dotenv()
+
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+BACKFILL = 'backfill'
+# Highest priority first
+LANES = (INTERACTIVE, BACKGROUND, BACKFILL)
+
+# Fraction of every provider bucket a lane must leave untouched
+LANE_RATE_RESERVE: Dict[str, float] = {
+    INTERACTIVE: 0.0,
+    BACKGROUND: float(os.getenv("BACKGROUND_RATE_RESERVE", 0.25)),
+    BACKFILL: float(os.getenv("BACKFILL_RATE_RESERVE", 0.5)),
+}
+# Fraction of a worker's adaptive in-flight limit a lane may occupy
+LANE_CONCURRENCY_SHARE: Dict[str, float] = {
+    INTERACTIVE: 1.0,
+    BACKGROUND: float(os.getenv("BACKGROUND_CONCURRENCY_SHARE", 0.75)),
+    BACKFILL: float(os.getenv("BACKFILL_CONCURRENCY_SHARE", 0.5)),
+}
+# Most of a provider quota one tenant's background and backfill calls may use, cluster-wide
+TENANT_QUOTA_SHARE = float(os.getenv("TENANT_QUOTA_SHARE", 0.5))
+
+# Endpoints whose calls are bulk work unless the client says otherwise
+BACKGROUND_ENDPOINTS = ('sentiment-checker.get_scores', 'sentiment-checker.get_ticket_count')
+PRIORITY_HEADER = 'X-Analysis-Priority'
+
+_priority: ContextVar[Tuple[str, Optional[str]]] = ContextVar('priority', default=(INTERACTIVE, None))
+
+
+def bind_priority(lane: str, tenant: Optional[str]) -> None:
+    """Set the lane and tenant for dependency calls made in the current context"""
+    _priority.set((lane if lane in LANES else BACKGROUND, tenant))
+
+
+def current_priority() -> Tuple[str, Optional[str]]:
+    return _priority.get()
+
+
+@contextmanager
+def priority_scope(lane: str, tenant: Optional[str] = None):
+    """Run a block in another lane, keeping the current tenant unless one is given"""
+    token = _priority.set((lane, tenant if tenant is not None else _priority.get()[1]))
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def request_lane(endpoint: Optional[str], header: Optional[str]) -> str:
+    """The lane a request asked for in its priority header, or its endpoint's default"""
+    if header and header.lower() in LANES:
+        return header.lower()
+    return BACKGROUND if endpoint in BACKGROUND_ENDPOINTS else INTERACTIVE
@@ -0,0 +1,81 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+import dotenv, os
+import logging
+import threading
+
+dotenv.load_dotenv()
+logger = logging.getLogger('score_refresher')
+
+# Cached scores older than this are served as-is and recomputed in the background
+SCORE_SOFT_TTL = int(os.getenv("SCORE_SOFT_TTL", 300))
+# One worker in the cluster refreshes a given ticket at a time; the lock expires if it dies mid-refresh
+SCORE_REFRESH_LOCK_TTL = int(os.getenv("SCORE_REFRESH_LOCK_TTL", 60))
+SCORE_REFRESH_WORKERS = int(os.getenv("SCORE_REFRESH_WORKERS", 2))
+# Past this many queued refreshes per worker, stale scores are served without scheduling more
+SCORE_REFRESH_MAX_PENDING = int(os.getenv("SCORE_REFRESH_MAX_PENDING", 100))
+
+_executor = None
+_executor_pid = None
+_pending = 0
+_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor, _executor_pid
+    # Threads don't survive a fork; each worker starts its own pool
+    if _executor_pid != os.getpid():
+        with _lock:
+            if _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(max_workers=SCORE_REFRESH_WORKERS, thread_name_prefix='score-refresh')
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def schedule_refresh(redis, lock_key: str, fn: Callable, *args) -> bool:
+    """
+    Run fn(*args) on the refresh pool unless another worker already holds lock_key
+    or the pool is backed up. Returns whether the refresh was queued.
+    """
+    global _pending
+    if redis is None:
+        return False
+    with _lock:
+        if _pending >= SCORE_REFRESH_MAX_PENDING:
+            return False
+        _pending += 1
+    try:
+        if not redis.set(lock_key, os.getpid(), nx=True, ex=SCORE_REFRESH_LOCK_TTL):
+            _done()
+            return False
+        _get_executor().submit(_run, redis, lock_key, fn, *args)
+        return True
+    except Exception as e:
+        _done()
+        logger.error(f"Error scheduling refresh {lock_key}: {e}")
+        return False
+
+
+def _done() -> None:
+    global _pending
+    with _lock:
+        _pending -= 1
+
+
+def _run(redis, lock_key: str, fn: Callable, *args) -> None:
+    try:
+        fn(*args)
+    except Exception as e:
+        logger.error(f"Background refresh {lock_key} failed: {e}")
+    finally:
+        _done()
+        try:
+            redis.delete(lock_key)
+        except Exception:
+            pass  # expires on its own
+
+
+def shutdown_refresher() -> None:
+    """Drop queued refreshes on exit; the stale entries are picked up again by the next read"""
+    if _executor is not None and _executor_pid == os.getpid():
+        _executor.shutdown(wait=False, cancel_futures=True)
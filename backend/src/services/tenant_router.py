@@ -0,0 +1,164 @@
+"""
+Placement of tenants on Pinecone indexes and Redis shards.
+
+A subdomain's comment vectors live in one index, and its keys ({subdomain}:...) in one
+Redis shard. The route for a subdomain is its pin if it has one, otherwise a consistent
+hash of the subdomain over the configured indexes and shards. Adding an index or shard
+therefore re-homes only about 1/N of the unpinned tenants. Pins come from
+TENANT_SHARD_OVERRIDES, for the largest tenants, or are set in Redis by
+`flask shards pin` and `flask shards migrate`.
+
+The connection configured by REDIS_URL (or REDIS_HOST/REDIS_PORT) is the shard named
+'default'. It also holds the cluster-wide state: provider quotas, the webhook queue,
+profiling switches and the pins themselves. Emotion reference vectors are kept once,
+in PINECONE_INDEX_NAME.
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from config.redis_config import RedisClient, RedisConfigError
+import bisect
+import dotenv, os
+import hashlib
+import json
+import logging
+import redis
+import threading
+import time
+
+dotenv.load_dotenv()
+logger = logging.getLogger('tenant_router')
+
+PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME")
+DEFAULT_REDIS_SHARD = 'default'
+# Further indexes tenants are spread over, comma-separated, in addition to PINECONE_INDEX_NAME
+PINECONE_INDEXES = [PINECONE_INDEX_NAME] + [
+    name.strip() for name in os.getenv("PINECONE_INDEXES", "").split(',')
+    if name.strip() and name.strip() != PINECONE_INDEX_NAME
+]
+# Further Redis shards as name=url pairs, comma-separated, in addition to 'default'
+REDIS_SHARDS: Dict[str, Optional[str]] = {DEFAULT_REDIS_SHARD: None}
+REDIS_SHARDS.update(
+    (pair.split('=', 1)[0].strip(), pair.split('=', 1)[1].strip())
+    for pair in os.getenv("REDIS_SHARDS", "").split(',') if '=' in pair
+)
+# Fixed routes for large tenants, e.g. {"bigcorp": {"index": "sentiment-2", "redis": "b"}}
+TENANT_SHARD_OVERRIDES: Dict[str, Dict[str, str]] = json.loads(os.getenv("TENANT_SHARD_OVERRIDES") or "{}")
+# Points per index or shard on the hash ring; more points spread tenants more evenly
+TENANT_RING_REPLICAS = int(os.getenv("TENANT_RING_REPLICAS", 64))
+# How often each worker re-reads the pins, so a migration's new route is picked up
+TENANT_ROUTES_REFRESH = float(os.getenv("TENANT_ROUTES_REFRESH", 30))
+
+ROUTES_KEY = 'tenant_shards'
+
+
+@dataclass(frozen=True)
+class TenantRoute:
+    index: str
+    redis: str
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+
+class HashRing:
+    """Consistent hashing of keys onto named nodes"""
+
+    def __init__(self, nodes: List[str], replicas: int = TENANT_RING_REPLICAS):
+        points = sorted((_hash(f"{node}#{i}"), node) for node in nodes for i in range(replicas))
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node(self, key: str) -> str:
+        return self._nodes[bisect.bisect(self._hashes, _hash(key)) % len(self._nodes)]
+
+
+class TenantRouter:
+    def __init__(self, indexes: List[str] = PINECONE_INDEXES, redis_shards: Dict[str, Optional[str]] = REDIS_SHARDS,
+                 overrides: Dict[str, Dict[str, str]] = TENANT_SHARD_OVERRIDES):
+        self.indexes = list(indexes)
+        self.redis_shards = dict(redis_shards)
+        self.overrides = dict(overrides)
+        self._index_ring = HashRing(self.indexes)
+        self._redis_ring = HashRing(list(self.redis_shards))
+        self._pins: Dict[str, Dict[str, str]] = {}
+        self._pins_loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._clients: Dict[str, redis.Redis] = {}
+        self._clients_pid = None
+
+    @property
+    def sharded(self) -> bool:
+        return len(self.indexes) > 1 or len(self.redis_shards) > 1
+
+    def hashed(self, subdomain: str) -> TenantRoute:
+        """Where the ring places a subdomain, ignoring pins"""
+        return TenantRoute(self._index_ring.node(subdomain), self._redis_ring.node(subdomain))
+
+    def route(self, subdomain: str) -> TenantRoute:
+        if not self.sharded and not self.overrides:
+            return TenantRoute(self.indexes[0], DEFAULT_REDIS_SHARD)
+        hashed = self.hashed(subdomain)
+        pin = dict(self.overrides.get(subdomain) or {})
+        pin.update(self.pins().get(subdomain) or {})
+        redis_shard = pin.get('redis', hashed.redis)
+        if redis_shard not in self.redis_shards:
+            logger.error(f"{subdomain} is pinned to unknown Redis shard '{redis_shard}', using '{hashed.redis}'")
+            redis_shard = hashed.redis
+        return TenantRoute(pin.get('index', hashed.index), redis_shard)
+
+    def pins(self) -> Dict[str, Dict[str, str]]:
+        """Pins set in Redis, re-read at most every TENANT_ROUTES_REFRESH seconds"""
+        now = time.monotonic()
+        if now - self._pins_loaded_at > TENANT_ROUTES_REFRESH and self._lock.acquire(blocking=False):
+            try:
+                self._pins_loaded_at = now
+                self._pins = {subdomain: json.loads(pin)
+                              for subdomain, pin in RedisClient.get_instance().hgetall(ROUTES_KEY).items()}
+            except Exception as e:
+                # Keep routing with the pins we have
+                logger.error(f"Error reading tenant pins: {e}")
+            finally:
+                self._lock.release()
+        return self._pins
+
+    def pin(self, subdomain: str, index: str, redis_shard: str) -> None:
+        if redis_shard not in self.redis_shards:
+            raise ValueError(f"Unknown Redis shard '{redis_shard}', expected one of {', '.join(self.redis_shards)}")
+        RedisClient.get_instance().hset(ROUTES_KEY, subdomain, json.dumps({'index': index, 'redis': redis_shard}))
+        self._pins_loaded_at = 0.0
+
+    def unpin(self, subdomain: str) -> None:
+        RedisClient.get_instance().hdel(ROUTES_KEY, subdomain)
+        self._pins_loaded_at = 0.0
+
+    def redis(self, shard: str = DEFAULT_REDIS_SHARD) -> redis.Redis:
+        """Client for a shard, created once per process"""
+        if shard == DEFAULT_REDIS_SHARD:
+            return RedisClient.get_instance()
+        if self._clients_pid != os.getpid():
+            self._clients = {}
+            self._clients_pid = os.getpid()
+        client = self._clients.get(shard)
+        if client is None:
+            if shard not in self.redis_shards:
+                raise RedisConfigError(f"Unknown Redis shard '{shard}'")
+            try:
+                client = redis.Redis.from_url(self.redis_shards[shard], decode_responses=True)
+            except Exception as e:
+                raise RedisConfigError(f"Failed to parse the URL of Redis shard '{shard}': {e}")
+            self._clients[shard] = client
+        return client
+
+
+tenant_router = TenantRouter()
+
+
+def tenant_index(subdomain: str) -> str:
+    """Name of the Pinecone index holding a tenant's comment vectors"""
+    return tenant_router.route(subdomain).index
+
+
+def get_tenant_redis(subdomain: str) -> redis.Redis:
+    """Redis client for the shard holding a tenant's keys"""
+    return tenant_router.redis(tenant_router.route(subdomain).redis)
@@ -2,19 +2,11 @@ from datetime import datetime
 from flask import Request, Response, jsonify, make_response, render_template, request
 from functools import wraps
 from typing import Optional, Tuple, Dict, Callable, List
-from logging.handlers import TimedRotatingFileHandler
 import logging
 import os
 
-# Set up logging
-log_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '../logs')
-os.makedirs(log_dir, exist_ok=True)
-log_file = os.path.join(log_dir, f"{datetime.now().strftime('%Y-%m-%d')}.log")
+# Handlers (stdout and the rotating log file) are installed by config.logging_config
 logger = logging.getLogger('sentiment-checker')
-logger.setLevel(logging.DEBUG)
-file_handler = TimedRotatingFileHandler(log_file, when="midnight", interval=1, backupCount=30)
-file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-logger.addHandler(file_handler)
 
 def get_subdomain(request: Request) -> Tuple[Optional[str], Optional[Tuple[Dict[str, str], int]]]:
     """
@@ -209,7 +209,7 @@ const BackgroundApp: React.FC<BackgroundAppProps> = ({ zafClient, originalQueryS
         }))
       };
 
-      await analyzeComments(zafClient, ticketInput);
+      await analyzeComments(zafClient, ticketInput, 'background');
       debugLog(`[BackgroundApp] processTicket Processed ticket ${ticket.id}`);
     } catch (error) {
       errorLog(`[BackgroundApp] processTicket Error processing ticket ${ticket.id}:`, error);
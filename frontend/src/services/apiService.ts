@@ -65,12 +65,16 @@ function validateCommentRequestBody(body: any): { tickets: TicketData[] } {
 
 type ApiRequestType = 'TICKET' | 'SYSTEM';
 
+// Lane the backend schedules the request's OpenAI/Pinecone calls in; agent-facing views stay interactive
+export type AnalysisPriority = 'interactive' | 'background';
+
 async function makeApiRequest(
   zafClient: any, 
   endpoint: string, 
   method: string, 
   body?: any,
-  requestType: ApiRequestType = 'TICKET'
+  requestType: ApiRequestType = 'TICKET',
+  priority?: AnalysisPriority
 ) {
   const context = await zafClient.context();
   const subdomain = context.account.subdomain;
@@ -103,6 +107,7 @@ async function makeApiRequest(
   const headers: Record<string, string> = {
     ...(method === 'POST' ? { 'Content-Type': 'application/json' } : {}),
     'X-Zendesk-Subdomain': subdomain,
+    ...(priority ? { 'X-Analysis-Priority': priority } : {}),
   };
 
   const fetchOptions: RequestInit = {
@@ -174,10 +179,14 @@ export async function getTicketVectorCountData(zafClient: any): Promise<any> {
   return data;
 }
 
-export async function analyzeComments(zafClient: any, ticketData: TicketData): Promise<TicketResponse> {
+export async function analyzeComments(
+  zafClient: any,
+  ticketData: TicketData,
+  priority: AnalysisPriority = 'interactive'
+): Promise<TicketResponse> {
   debugLog('Analyzing comments for ticket:', ticketData.id, ticketData);
 
-  const response = await makeApiRequest(zafClient, '/analyze-comments', 'POST', { tickets: [ticketData] });
+  const response = await makeApiRequest(zafClient, '/analyze-comments', 'POST', { tickets: [ticketData] }, 'TICKET', priority);
   warnLog('analyzeComments response:', response);
   warnLog('ticketData:', ticketData);
   